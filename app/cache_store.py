@@ -0,0 +1,65 @@
+"""
+本地缓存模块 - cache.db 的统一读写入口
+
+cache.db 是一个 shelve（dbm）文件，新分支名历史、提交通知、预检结果、cherry-pick 任务、
+GitLab 用户目录与用户/项目 id 等都保存在其中。dbm 文件不支持多个线程同时打开写入，
+否则可能丢失写入甚至损坏文件，因此进程内的所有读写都经由这里，由同一把锁串行化。
+读写失败时记录日志并返回默认值，缓存不可用不影响调用方的功能。
+"""
+import logging
+import shelve
+from contextlib import contextmanager
+from threading import RLock
+from typing import Any, Callable, Iterator
+
+CACHE_FILE = 'cache.db'
+
+logger = logging.getLogger(__name__)
+_lock = RLock()
+
+
+@contextmanager
+def open_cache(path: str = CACHE_FILE, writeback: bool = False) -> Iterator[shelve.Shelf]:
+    """在进程级锁内打开缓存文件；打开或读写失败时抛出异常，由调用方处理"""
+    with _lock:
+        with shelve.open(path, writeback=writeback) as db:
+            yield db
+
+
+def read_cache(key: str, default: Any = None, path: str = CACHE_FILE) -> Any:
+    """读取一项，不存在或读取失败时返回 default"""
+    try:
+        with open_cache(path) as db:
+            return db.get(key, default)
+    except Exception:
+        logger.exception('读取缓存 %s 失败（%s）', key, path)
+        return default
+
+
+def write_cache(key: str, value: Any, path: str = CACHE_FILE) -> bool:
+    """写入一项，返回是否成功"""
+    try:
+        with open_cache(path) as db:
+            db[key] = value
+        return True
+    except Exception:
+        logger.exception('写入缓存 %s 失败（%s）', key, path)
+        return False
+
+
+def update_cache(key: str, update: Callable[[Any], Any], default: Any = None, path: str = CACHE_FILE) -> bool:
+    """
+    在锁内读出一项，交给 update 修改后写回，返回是否成功
+
+    用于多个对象共用一项的情况（如按 GitLab 地址区分的记录），避免并发的读-改-写互相覆盖。
+
+    Args:
+        update: 参数为当前值（不存在时为 default），返回新值
+    """
+    try:
+        with open_cache(path) as db:
+            db[key] = update(db.get(key, default))
+        return True
+    except Exception:
+        logger.exception('更新缓存 %s 失败（%s）', key, path)
+        return False
@@ -0,0 +1,340 @@
+"""
+Cherry-pick 预检模块 - 不触碰工作区，模拟把一组提交依次应用到目标分支
+
+git >= 2.40 时使用 git merge-tree --write-tree --merge-base 在内存中完成三方合并，
+只写入对象，不创建 worktree；更老的 git 回退到池化的稀疏检出临时 worktree 中逐个 cherry-pick --no-commit。
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.dry_run_cache import DryRunCache, get_dry_run_cache
+from app.git_object_reader import get_object_reader
+from app.git_runner import git_version, run_git
+from app.worktree_pool import WorktreePoolError, changed_paths, get_worktree_pool
+
+# --merge-base 选项从 2.40 开始可与 --write-tree 一起使用
+MERGE_TREE_MIN_VERSION = (2, 40)
+# 从 2.44 开始 --merge-base 模式下两侧可以直接传树，无需为中间状态创建提交
+MERGE_TREE_TREES_MIN_VERSION = (2, 44)
+
+# 模拟过程中创建临时提交使用的身份，避免依赖用户的 user.name / user.email 配置
+DRY_RUN_IDENTITY = {
+    'GIT_AUTHOR_NAME': 'quick-merge-request',
+    'GIT_AUTHOR_EMAIL': 'dry-run@localhost',
+    'GIT_COMMITTER_NAME': 'quick-merge-request',
+    'GIT_COMMITTER_EMAIL': 'dry-run@localhost',
+}
+
+# 多目标并行预检的默认并发数（同一仓库的 git 进程数另受 git_runner 限制）
+MAX_PARALLEL_DRY_RUNS = 4
+
+STATUS_CLEAN = 'clean'
+STATUS_CONFLICT = 'conflict'
+STATUS_EMPTY = 'empty'
+STATUS_ERROR = 'error'
+
+
+def supports_merge_tree() -> bool:
+    """当前 git 是否支持基于 merge-tree 的预检"""
+    return git_version() >= MERGE_TREE_MIN_VERSION
+
+
+def _outcome(commit_hash: str, status: str, conflict_files: Optional[List[str]] = None,
+             message: str = '') -> dict:
+    return {'hash': commit_hash, 'status': status, 'conflict_files': conflict_files or [], 'message': message}
+
+
+def summarize(outcomes: List[dict], engine: str, target_sha: Optional[str] = None) -> dict:
+    """
+    将逐提交结果汇总为预检结果
+
+    Returns:
+        {'success': True, 'engine', 'target_sha', 'results': 逐提交结果,
+         'conflicts': [短哈希], 'empty_commits': [短哈希]}
+    """
+    return {
+        'success': True,
+        'engine': engine,
+        'target_sha': target_sha,
+        'results': outcomes,
+        'conflicts': [o['hash'][:8] for o in outcomes if o['status'] == STATUS_CONFLICT],
+        'empty_commits': [o['hash'][:8] for o in outcomes if o['status'] == STATUS_EMPTY],
+    }
+
+
+def _parse_merge_tree_output(stdout: bytes):
+    """解析 merge-tree --write-tree -z --name-only --no-messages 的输出，返回 (树, 冲突文件列表)"""
+    tokens = stdout.split(b'\0')
+    tree = tokens[0].decode('ascii', errors='replace').strip()
+    files = []
+    for token in tokens[1:]:
+        if not token:
+            # 冲突文件列表以空 token 结束
+            break
+        path = token.decode('utf-8', errors='replace')
+        if path not in files:
+            files.append(path)
+    return tree, files
+
+
+class DryRunError(Exception):
+    """预检无法进行（目标不存在、无法创建 worktree 等）"""
+
+
+def _simulate_merge_tree(repo_path: str, commit_hashes: List[str], state_commit: Optional[str],
+                         state_tree: str) -> Tuple[List[dict], List[tuple]]:
+    """
+    从给定的模拟状态开始，用 merge-tree 依次模拟提交
+
+    每个提交 C 以 C^ 为合并基础与当前状态做三方合并：无冲突时结果树成为下一个提交的起点，
+    结果树与当前树相同即为空提交；冲突提交不计入状态，后续提交仍基于冲突前的状态模拟。
+
+    Args:
+        state_commit: 当前状态对应的提交；git 支持直接传树时不需要，可为 None
+        state_tree: 当前状态的树
+
+    Returns:
+        (逐提交结果, 每个提交之后的 (state_commit, state_tree))
+    """
+    reader = get_object_reader(repo_path)
+    pass_trees = git_version() >= MERGE_TREE_TREES_MIN_VERSION
+    if pass_trees:
+        state_commit = None
+    outcomes = []
+    states = []
+    for commit_hash in commit_hashes:
+        outcome = None
+        commit = reader.read_commit(commit_hash)
+        if commit is None:
+            outcome = _outcome(commit_hash, STATUS_ERROR, message='找不到提交')
+        elif len(commit['parents']) != 1:
+            reason = '合并提交' if commit['parents'] else '根提交'
+            outcome = _outcome(commit_hash, STATUS_ERROR, message=f'{reason}无法直接 cherry-pick')
+        else:
+            result = run_git(
+                ['merge-tree', '--write-tree', '-z', '--name-only', '--no-messages',
+                 f'--merge-base={commit["parents"][0]}', state_tree if pass_trees else state_commit,
+                 commit['hash']],
+                repo_path,
+                binary=True
+            )
+            tree, files = _parse_merge_tree_output(result.stdout)
+            if result.returncode not in (0, 1):
+                outcome = _outcome(commit_hash, STATUS_ERROR, message=result.stderr.strip())
+            elif result.returncode == 1:
+                outcome = _outcome(commit_hash, STATUS_CONFLICT, files)
+            elif tree == state_tree:
+                outcome = _outcome(commit_hash, STATUS_EMPTY)
+            else:
+                outcome = _outcome(commit_hash, STATUS_CLEAN)
+                state_tree = tree
+                if not pass_trees:
+                    commit_result = run_git(
+                        ['commit-tree', tree, '-p', state_commit, '-m', f'dry-run {commit_hash}'],
+                        repo_path,
+                        env=DRY_RUN_IDENTITY
+                    )
+                    if not commit_result.ok:
+                        raise DryRunError(f'无法创建临时提交: {commit_result.stderr.strip()}')
+                    state_commit = commit_result.stdout.strip()
+        outcomes.append(outcome)
+        states.append((state_commit, state_tree))
+    return outcomes, states
+
+
+def dry_run_merge_tree(repo_path: str, target: str, commit_hashes: List[str]) -> dict:
+    """
+    使用 git merge-tree 模拟 cherry-pick，不创建 worktree
+
+    Args:
+        repo_path: 仓库目录
+        target: 目标分支或任意提交名
+        commit_hashes: 按应用顺序（从旧到新）排列的提交
+
+    Returns:
+        参见 summarize
+
+    Raises:
+        DryRunError: 目标分支不存在或无法创建临时提交
+    """
+    target_commit = get_object_reader(repo_path).read_commit(target)
+    if target_commit is None:
+        raise DryRunError(f'找不到目标分支 {target}')
+    outcomes, _ = _simulate_merge_tree(repo_path, commit_hashes, target_commit['hash'], target_commit['tree'])
+    return summarize(outcomes, 'merge-tree', target_commit['hash'])
+
+
+def dry_run_worktree(repo_path: str, target: str, commit_hashes: List[str]) -> dict:
+    """
+    在池化的临时 worktree 中逐个 cherry-pick --no-commit 模拟（老版本 git 的回退路径）
+
+    无冲突的提交会以临时身份提交，使后续提交基于它继续模拟；参数、返回值和异常同 dry_run_merge_tree。
+    """
+    try:
+        # 只检出这些提交改动过的目录
+        sparse_paths = changed_paths(repo_path, commit_hashes)
+        with get_worktree_pool(repo_path).lease(target, sparse_paths) as temp_dir:
+            return _simulate_worktree(temp_dir, commit_hashes)
+    except WorktreePoolError as e:
+        raise DryRunError(str(e))
+
+
+def _simulate_worktree(temp_dir: str, commit_hashes: List[str]) -> dict:
+    """在已借出的 worktree 中逐个模拟，返回 summarize 的结果"""
+    target_sha = run_git(['rev-parse', 'HEAD'], temp_dir).stdout.strip()
+    outcomes = []
+    for commit_hash in commit_hashes:
+        result = run_git(['cherry-pick', '--no-commit', commit_hash], temp_dir, timeout=30)
+        if not result.ok:
+            conflict_files = run_git(['diff', '--name-only', '--diff-filter=U'], temp_dir).stdout.split('\n')
+            conflict_files = [f for f in conflict_files if f]
+            if conflict_files:
+                outcomes.append(_outcome(commit_hash, STATUS_CONFLICT, conflict_files))
+            else:
+                outcomes.append(_outcome(commit_hash, STATUS_ERROR, message=result.stderr.strip()))
+            run_git(['cherry-pick', '--abort'], temp_dir, timeout=10)
+            run_git(['reset', '--hard', 'HEAD'], temp_dir, timeout=10)
+            continue
+
+        if run_git(['diff', '--cached', '--quiet', 'HEAD'], temp_dir).ok:
+            # 没有更改，说明提交内容已存在
+            outcomes.append(_outcome(commit_hash, STATUS_EMPTY))
+            run_git(['reset', '--hard', 'HEAD'], temp_dir, timeout=10)
+            continue
+
+        outcomes.append(_outcome(commit_hash, STATUS_CLEAN))
+        run_git(['commit', '--no-verify', '-q', '-m', f'dry-run {commit_hash}'], temp_dir, env=DRY_RUN_IDENTITY)
+
+    return summarize(outcomes, 'worktree', target_sha)
+
+
+def _run_with_cache(repo_path: str, target: str, commit_hashes: List[str], use_merge_tree: bool,
+                    cache: DryRunCache) -> dict:
+    """先查缓存，只模拟缓存前缀之后的提交，再把新结果写回缓存"""
+    reader = get_object_reader(repo_path)
+    target_commit = reader.read_commit(target)
+    if target_commit is None:
+        raise DryRunError(f'找不到目标分支 {target}')
+    target_sha = target_commit['hash']
+
+    cached, last_entry = cache.lookup(target_sha, commit_hashes)
+    engine = 'merge-tree' if use_merge_tree else 'worktree'
+    if len(cached) == len(commit_hashes):
+        result = summarize(cached, engine, target_sha)
+        result['cached'] = len(cached)
+        return result
+
+    # merge-tree 可以从缓存前缀的模拟状态继续；状态提交可能已被 gc，需确认仍然存在
+    start = None
+    if use_merge_tree:
+        if last_entry is None:
+            start = (target_sha, target_commit['tree'])
+        elif last_entry['state_tree'] and (
+                git_version() >= MERGE_TREE_TREES_MIN_VERSION
+                or (last_entry['state_commit'] and reader.object_info(last_entry['state_commit']))):
+            start = (last_entry['state_commit'], last_entry['state_tree'])
+
+    if start is not None:
+        remaining = commit_hashes[len(cached):]
+        outcomes, states = _simulate_merge_tree(repo_path, remaining, *start)
+        cache.store(target_sha, commit_hashes, cached + outcomes,
+                    [(None, None)] * len(cached) + states)
+        outcomes = cached + outcomes
+    else:
+        cached = []
+        if use_merge_tree:
+            outcomes, states = _simulate_merge_tree(repo_path, commit_hashes, target_sha, target_commit['tree'])
+        else:
+            outcomes = dry_run_worktree(repo_path, target_sha, commit_hashes)['results']
+            states = [(None, None)] * len(outcomes)
+        cache.store(target_sha, commit_hashes, outcomes, states)
+
+    result = summarize(outcomes, engine, target_sha)
+    result['cached'] = len(cached)
+    return result
+
+
+def run_dry_run(repo_path: str, target: str, commit_hashes: List[str], use_merge_tree: Optional[bool] = None,
+                use_cache: bool = True) -> dict:
+    """
+    预检把 commit_hashes（从旧到新）依次 cherry-pick 到 target 的结果
+
+    Args:
+        repo_path: 仓库目录
+        target: 目标分支
+        commit_hashes: 按应用顺序排列的提交
+        use_merge_tree: 是否使用 merge-tree，默认按 git 版本自动选择
+        use_cache: 是否使用预检缓存（按提交列表和目标 tip 命中）
+
+    Returns:
+        成功时参见 summarize，另含 cached（来自缓存的提交数）；失败时为 {'success': False, 'error': 错误信息}
+    """
+    if use_merge_tree is None:
+        use_merge_tree = supports_merge_tree()
+    try:
+        if use_cache:
+            return _run_with_cache(repo_path, target, commit_hashes, use_merge_tree, get_dry_run_cache())
+        if use_merge_tree:
+            return dry_run_merge_tree(repo_path, target, commit_hashes)
+        return dry_run_worktree(repo_path, target, commit_hashes)
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+def run_dry_run_many(repo_path: str, targets: List[str], commit_hashes: List[str],
+                     max_workers: int = MAX_PARALLEL_DRY_RUNS,
+                     on_result: Optional[Callable[[str, dict], None]] = None) -> Dict[str, dict]:
+    """
+    对多个目标分支并行执行预检
+
+    Args:
+        repo_path: 仓库目录
+        targets: 目标分支列表
+        commit_hashes: 按应用顺序排列的提交
+        max_workers: 同时预检的目标数上限
+        on_result: 每个目标完成时在工作线程中回调 (target, result)
+
+    Returns:
+        {目标分支: run_dry_run 的结果}
+    """
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        return {}
+    # 先确定引擎，避免各线程重复探测 git 版本
+    use_merge_tree = supports_merge_tree()
+
+    def _check(target):
+        result = run_dry_run(repo_path, target, commit_hashes, use_merge_tree)
+        if on_result is not None:
+            on_result(target, result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets))),
+                            thread_name_prefix='dry-run') as executor:
+        results = list(executor.map(_check, targets))
+    return dict(zip(targets, results))
+
+
+def rank_targets(results: Dict[str, dict]) -> List[dict]:
+    """
+    将多目标预检结果整理为摘要行，按冲突数、空提交数升序排列（最干净的在前），失败的排在最后
+
+    Returns:
+        [{'target', 'success', 'conflicts', 'empty_commits', 'errors', 'error'}]
+    """
+    rows = []
+    for target, result in results.items():
+        if not result.get('success'):
+            rows.append({'target': target, 'success': False, 'conflicts': 0, 'empty_commits': 0,
+                         'errors': 0, 'error': result.get('error', '未知错误')})
+            continue
+        rows.append({
+            'target': target,
+            'success': True,
+            'conflicts': len(result['conflicts']),
+            'empty_commits': len(result['empty_commits']),
+            'errors': sum(1 for o in result['results'] if o['status'] == STATUS_ERROR),
+            'error': '',
+        })
+    rows.sort(key=lambda r: (not r['success'], r['conflicts'], r['errors'], r['empty_commits'], r['target']))
+    return rows
@@ -0,0 +1,663 @@
+"""
+Cherry-pick 执行模块 - 在池化的临时 worktree 中把提交依次应用到目标分支并推送
+
+整批提交一次交给 git cherry-pick 的 sequencer 处理，而不是每个提交启动一个进程；
+sequencer 停下时（冲突或提交内容已存在）根据 CHERRY_PICK_HEAD 和 sequencer/todo 判断停在哪个提交。
+执行过程不依赖 Qt，通过回调报告输出和进度，由界面层放到后台线程中运行。
+"""
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Callable, Dict, List, Optional
+
+from app.git_refs import RefStore, RefStoreError, find_git_dirs, get_ref_store
+from app.cherry_pick_jobs import get_job_store
+from app.git_runner import run_git, run_git_streaming
+from app.worktree_pool import MAX_POOL_SIZE, WorktreePool, WorktreePoolError, changed_paths, get_worktree_pool
+
+# 单个提交的执行状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_APPLIED = 'applied'
+STATUS_SKIPPED = 'skipped'
+STATUS_CONFLICT = 'conflict'
+STATUS_CANCELLED = 'cancelled'
+
+# cherry-pick 每应用一个提交输出的摘要行，如 "[main 1a2b3c4] message"
+_COMMIT_LINE_RE = re.compile(r'^\[.+ [0-9a-f]{7,}\] ')
+# 冲突解决后 --continue 不打开编辑器，沿用原提交信息
+_CONTINUE_ENV = {'GIT_EDITOR': 'true'}
+# push --progress 的进度行，如 "Writing objects:  45% (9/20)"
+_PUSH_PROGRESS_RE = re.compile(r'^([A-Z][a-z]+ objects):\s+(\d+)%')
+# 多目标并行执行的默认并发数，与 worktree 池大小一致
+MAX_PARALLEL_TARGETS = MAX_POOL_SIZE
+
+
+def push_branches(repo_path: str, branches: List[str],
+                  on_output: Optional[Callable[[str], None]] = None,
+                  on_progress: Optional[Callable[[str, int], None]] = None):
+    """
+    用一次 git push --atomic 推送多个本地分支并设置上游，要么全部更新要么全部不更新
+
+    Args:
+        repo_path: 仓库目录（或其任一 worktree）
+        branches: 本地分支名
+        on_output: 非进度的输出行
+        on_progress: 进度回调 (阶段, 百分比)
+
+    Returns:
+        GitResult
+    """
+    def on_line(line):
+        match = _PUSH_PROGRESS_RE.match(line)
+        if match:
+            if on_progress is not None:
+                on_progress(match.group(1), int(match.group(2)))
+            # 进度行只记录完成的那一次
+            if not line.rstrip().endswith('done.'):
+                return
+        if on_output is not None:
+            on_output(line)
+
+    refspecs = [f'refs/heads/{branch}:refs/heads/{branch}' for branch in branches]
+    return run_git_streaming(['push', '--atomic', '--progress', '-u', 'origin', *refspecs], repo_path, on_line)
+
+
+class CherryPickJob:
+    """
+    一次 cherry-pick 执行
+
+    回调都在执行 run() / resume() / abort() 的线程中调用：
+    - on_output(text): 一行日志
+    - on_progress(index, total, commit, status): 第 index 个提交（从 0 开始）的状态变化
+    - on_push_progress(stage, percent): 推送进度，如 ('Writing objects', 45)
+
+    keep_empty 决定内容已存在的提交如何处理，在启动 sequencer 前确定：
+    True 时传 --allow-empty --keep-redundant-commits 原样保留为空提交，
+    False（默认）时 sequencer 会在这些提交处停下，随即 --skip 跳过。
+    auto_push 为 False 时成功后不推送，由调用方把多个分支合并为一次推送（见 push_branches）。
+
+    遇到冲突时 run() 返回 paused=True 的结果并保留 worktree，
+    在 worktree 中解决冲突后调用 resume() 继续，或调用 abort() 放弃。
+
+    cancel() 可在任意线程调用，立即终止正在运行的 cherry-pick，不再推送，并把目标分支恢复到执行前的位置。
+
+    执行过程记录在任务存储中（见 cherry_pick_jobs），程序中途退出后可用 from_record() 重建任务，
+    再调用 recover() 从上次完成的提交继续。
+    """
+
+    def __init__(self, repo_path: str, target_branch: str, commits: List[dict],
+                 on_output: Optional[Callable[[str], None]] = None,
+                 on_progress: Optional[Callable[[int, int, dict, str], None]] = None,
+                 keep_empty: bool = False, auto_push: bool = True,
+                 on_push_progress: Optional[Callable[[str, int], None]] = None,
+                 source_branch: str = '', job_id: Optional[str] = None):
+        self.repo_path = os.path.abspath(repo_path)
+        self.source_branch = source_branch
+        self.target_branch = target_branch
+        self.commits = commits
+        self.on_output = on_output
+        self.on_progress = on_progress
+        self.keep_empty = keep_empty
+        self.auto_push = auto_push
+        self.on_push_progress = on_push_progress
+        self._pool: Optional[WorktreePool] = None
+        self.worktree_dir: Optional[str] = None
+        self.start_sha: Optional[str] = None
+        self.statuses: List[str] = []
+        self.paused = False
+        self.conflict_files: List[str] = []
+        # 下一个尚未确认结果的提交
+        self._position = 0
+        self._cancel_event = Event()
+        self.job_id = job_id or uuid.uuid4().hex
+        self.store = get_job_store()
+
+    @classmethod
+    def from_record(cls, record: dict, **callbacks) -> 'CherryPickJob':
+        """由持久化的任务记录重建任务，callbacks 为 on_output 等回调"""
+        job = cls(record['repo_path'], record['target_branch'], record['commits'],
+                  keep_empty=record.get('keep_empty', False), source_branch=record.get('source_branch', ''),
+                  job_id=record['id'], **callbacks)
+        job.statuses = list(record['statuses'])
+        job.worktree_dir = record.get('worktree')
+        job.start_sha = record.get('start_sha')
+        job.paused = record.get('paused', False)
+        job._position = record.get('position', 0)
+        return job
+
+    def _completed_count(self) -> int:
+        """从头开始已确认应用或跳过的提交数"""
+        count = 0
+        while count < len(self.statuses) and self.statuses[count] in (STATUS_APPLIED, STATUS_SKIPPED):
+            count += 1
+        return count
+
+    def _persist(self):
+        """保存任务进度，程序中途退出后可以继续"""
+        self.store.save({
+            'id': self.job_id,
+            'repo_path': self.repo_path,
+            'source_branch': self.source_branch,
+            'target_branch': self.target_branch,
+            'commits': self.commits,
+            'keep_empty': self.keep_empty,
+            'statuses': list(self.statuses),
+            'position': self._completed_count(),
+            'worktree': self.worktree_dir,
+            'start_sha': self.start_sha,
+            'paused': self.paused,
+        })
+
+    def cancel(self):
+        """请求停止：终止正在运行的 sequencer，随后由 restore_target() 恢复目标分支"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def _log(self, text: str):
+        if self.on_output is not None:
+            self.on_output(text)
+
+    def _progress(self, index: int, status: str):
+        if index < len(self.statuses):
+            self.statuses[index] = status
+        if status in (STATUS_APPLIED, STATUS_SKIPPED, STATUS_CONFLICT):
+            self._persist()
+        if self.on_progress is not None:
+            self.on_progress(index, len(self.commits), self.commits[index], status)
+
+    def _run_logged(self, args: List[str], cwd: str):
+        """执行命令并把输出逐行写入日志"""
+        return run_git_streaming(args, cwd, self._log)
+
+    def _result(self, success: bool, pushed: bool = False, error: str = '') -> dict:
+        return {
+            'success': success,
+            'cancelled': self.cancelled and not success,
+            'paused': self.paused,
+            'worktree': self.worktree_dir if self.paused else None,
+            'conflict_files': list(self.conflict_files),
+            'pushed': pushed,
+            'applied': self.statuses.count(STATUS_APPLIED),
+            'skipped': self.statuses.count(STATUS_SKIPPED),
+            'statuses': list(self.statuses),
+            'error': error,
+        }
+
+    def prepare_worktree(self) -> bool:
+        """从 worktree 池借出一个 worktree 并检出目标分支"""
+        # 检查目标分支是否存在于本地或远程
+        self._log(f'--- 检查目标分支: {self.target_branch} ---')
+        refs = get_ref_store(self.repo_path).refs()
+
+        # 确定检出方式；目标分支可能已在其他工作区检出，与原先 worktree add -f 一样忽略该限制
+        if f'refs/heads/{self.target_branch}' in refs:
+            start_point = f'refs/heads/{self.target_branch}'
+            checkout_cmd = ['checkout', '--ignore-other-worktrees', self.target_branch]
+            self._log(f'使用本地分支: {self.target_branch}\n')
+        elif f'refs/remotes/origin/{self.target_branch}' in refs:
+            start_point = f'refs/remotes/origin/{self.target_branch}'
+            checkout_cmd = ['checkout', '-b', self.target_branch, '--track', f'origin/{self.target_branch}']
+            self._log(f'从远程创建分支: origin/{self.target_branch}\n')
+        else:
+            self._log(f'\n找不到目标分支: {self.target_branch}')
+            return False
+
+        # 只检出这批提交改动过的目录
+        sparse_paths = changed_paths(self.repo_path, [commit['hash'] for commit in self.commits])
+        try:
+            self.worktree_dir = self.pool.acquire(start_point, sparse_paths)
+        except WorktreePoolError as e:
+            self._log(f'\n准备 worktree 失败: {e}')
+            return False
+        self._log(f'--- 使用 worktree: {self.worktree_dir} ---')
+
+        result = self._run_logged(checkout_cmd, self.worktree_dir)
+        if not result.ok:
+            self._log(f'\n检出目标分支失败！错误代码: {result.returncode}')
+            return False
+
+        # 验证 worktree 中的分支
+        current_branch, self.start_sha = RefStore(self.worktree_dir).head()
+        self._log(f'Worktree 当前分支: {current_branch}\n')
+        return True
+
+    def _set_status(self, index: int, status: str):
+        if self.statuses[index] != status:
+            self._progress(index, status)
+
+    def _advance_to(self, index: int):
+        """index 之前尚未确认的提交都已应用"""
+        for i in range(self._position, index):
+            if self.statuses[i] in (STATUS_PENDING, STATUS_RUNNING, STATUS_CONFLICT):
+                self._set_status(i, STATUS_APPLIED)
+        self._position = max(self._position, index)
+
+    def _on_sequencer_line(self, line: str):
+        self._log(line)
+        if _COMMIT_LINE_RE.match(line) and self._position < len(self.commits):
+            self._set_status(self._position, STATUS_APPLIED)
+            self._position += 1
+            if self._position < len(self.commits):
+                self._set_status(self._position, STATUS_RUNNING)
+
+    def _run_sequencer(self, args: List[str]):
+        """执行一次 cherry-pick 子命令，边输出边推进进度"""
+        if self._position < len(self.commits):
+            self._set_status(self._position, STATUS_RUNNING)
+        return run_git_streaming(args, self.worktree_dir, self._on_sequencer_line, env=_CONTINUE_ENV,
+                                 stop=self._cancel_event)
+
+    def _cherry_pick_head(self) -> str:
+        """冲突或提交变空时 CHERRY_PICK_HEAD 指向停下的提交，其他情况下为空"""
+        try:
+            git_dir, _ = find_git_dirs(self.worktree_dir)
+            with open(os.path.join(git_dir, 'CHERRY_PICK_HEAD'), encoding='utf-8') as f:
+                return f.read().strip()
+        except (RefStoreError, OSError):
+            return ''
+
+    def _stopped_index(self) -> Optional[int]:
+        """sequencer 停下时所在的提交序号，没有进行中的 cherry-pick 时返回 None"""
+        try:
+            git_dir, _ = find_git_dirs(self.worktree_dir)
+        except RefStoreError:
+            return None
+        hashes = [commit['hash'] for commit in self.commits]
+
+        stopped = self._cherry_pick_head()
+        for index in range(self._position, len(hashes)):
+            if hashes[index] == stopped:
+                return index
+
+        # 其他原因停下（如工作区文件会被覆盖）时，todo 中剩余的第一项就是停下的提交
+        try:
+            with open(os.path.join(git_dir, 'sequencer', 'todo'), encoding='utf-8') as f:
+                todo = [line.split()[1] for line in f if line.startswith('pick ')]
+        except (OSError, IndexError):
+            return None
+        index = len(hashes) - len(todo)
+        if todo and 0 <= index < len(hashes) and hashes[index].startswith(todo[0]):
+            return index
+        return None
+
+    def _unmerged_files(self) -> List[str]:
+        result = run_git(['diff', '--name-only', '--diff-filter=U'], self.worktree_dir)
+        return [f for f in result.stdout.split('\n') if f]
+
+    def _mark_cancelled(self):
+        for index in range(self._position, len(self.commits)):
+            if self.statuses[index] != STATUS_APPLIED:
+                self.statuses[index] = STATUS_CANCELLED
+
+    def _drive(self, args: List[str]) -> dict:
+        """执行 sequencer 命令，处理空提交停顿，直到全部应用、遇到冲突或失败"""
+        result = self._run_sequencer(args)
+        while not result.ok:
+            if self.cancelled:
+                # 进程已被终止，停在哪里都不再重要，由 _finish() 恢复目标分支
+                break
+            stopped = self._stopped_index()
+            if stopped is None:
+                self._log(f'Cherry-pick 失败！错误代码: {result.returncode}')
+                return self._result(False, error='cherry-pick 失败')
+            self._advance_to(stopped)
+            commit = self.commits[stopped]
+
+            self.conflict_files = self._unmerged_files()
+            if self.conflict_files:
+                # 真正的冲突，需要手动处理
+                self._set_status(stopped, STATUS_CONFLICT)
+                self.paused = True
+                # 解决冲突时需要看到冲突文件所在目录的完整内容
+                self.pool.expand(self.worktree_dir, self.conflict_files)
+                self._log(f'\n{commit["hash"][:8]} 存在冲突: {", ".join(self.conflict_files)}')
+                self._log(f'请在 {self.worktree_dir} 中解决冲突并 git add 后继续，或放弃本次操作。')
+                return self._result(False, error=f'{commit["hash"][:8]} 存在冲突')
+
+            # 只有 git 报告提交变空（内容已存在）时才跳过；合并提交缺少 -m、工作区文件会被覆盖等都是失败
+            if self._cherry_pick_head() != commit['hash'] or 'empty' not in result.stdout:
+                self._log(f'Cherry-pick 在 {commit["hash"][:8]} 处停止，错误代码: {result.returncode}')
+                return self._result(False, error='cherry-pick 失败')
+
+            self._set_status(stopped, STATUS_SKIPPED)
+            self._position = stopped + 1
+            self._log(f'⚠️ {commit["hash"][:8]} 内容已存在，自动跳过（--skip）\n')
+            if self.cancelled:
+                break
+            result = self._run_sequencer(['cherry-pick', '--skip'])
+        else:
+            self._advance_to(len(self.commits))
+        return self._finish()
+
+    def _finish(self) -> dict:
+        """全部提交处理完后推送；已取消时恢复目标分支"""
+        if self.cancelled:
+            self._mark_cancelled()
+            self.restore_target()
+            return self._result(False, error='已取消')
+
+        self._log(f'\n--- 完成！成功 cherry-pick 了 {self.statuses.count(STATUS_APPLIED)} 个提交 ---')
+        if not self.auto_push:
+            return self._result(True)
+        pushed = self.push()
+        return self._result(pushed, pushed=pushed, error='' if pushed else '推送失败')
+
+    def push(self) -> bool:
+        self._log('\n--- 正在推送到远程仓库 ---')
+        result = push_branches(self.repo_path, [self.target_branch], self._log, self.on_push_progress)
+        if result.ok:
+            self._log('\n--- 推送成功！---')
+            return True
+        self._log(f'\n--- 推送失败！错误代码: {result.returncode} ---')
+        return False
+
+    def restore_target(self):
+        """取消时把目标分支恢复到执行前的位置"""
+        if not self.start_sha:
+            return
+        self._log(f'\n--- 已取消，恢复目标分支到 {self.start_sha[:8]} ---')
+        if self.worktree_dir:
+            if not run_git(['cherry-pick', '--abort'], self.worktree_dir).ok:
+                # 被终止的 sequencer 状态可能不完整，无法 --abort 时直接丢弃
+                run_git(['cherry-pick', '--quit'], self.worktree_dir)
+            run_git(['reset', '--hard', self.start_sha], self.worktree_dir)
+        else:
+            # 持久化任务的 worktree 已不存在，直接移动分支
+            run_git(['update-ref', '-m', 'cherry-pick: cancelled', f'refs/heads/{self.target_branch}',
+                     self.start_sha], self.repo_path)
+
+    def cleanup_worktree(self):
+        """把 worktree 归还到池中"""
+        if self.worktree_dir:
+            self._log('\n--- 归还 worktree ---')
+            self.pool.release(self.worktree_dir)
+            self._log('清理完成！')
+            self.worktree_dir = None
+
+    def _guarded(self, step: Callable[[], dict]) -> dict:
+        """执行一个阶段；冲突暂停时保存任务，其他情况结束后都归还 worktree 并删除任务记录"""
+        self.paused = False
+        self.conflict_files = []
+        try:
+            return step()
+        except Exception as e:
+            self._log(f'\n执行出错: {e}')
+            self.paused = False
+            return self._result(False, error=str(e))
+        finally:
+            if self.paused:
+                self._persist()
+            else:
+                self.cleanup_worktree()
+                self.store.remove(self.job_id)
+
+    def run(self) -> dict:
+        """
+        执行全部步骤：准备 worktree → 一次 cherry-pick 整批提交 → 推送 → 清理
+
+        Returns:
+            {'success', 'cancelled', 'paused', 'worktree', 'conflict_files', 'pushed',
+             'applied', 'skipped', 'statuses', 'error'}
+        """
+        self.statuses = [STATUS_PENDING] * len(self.commits)
+        self._position = 0
+
+        def step():
+            if self.cancelled:
+                self._mark_cancelled()
+                return self._result(False, error='已取消')
+            if not self.prepare_worktree():
+                return self._result(False, error='创建 worktree 失败')
+            self._persist()
+            args = ['cherry-pick']
+            if self.keep_empty:
+                args += ['--allow-empty', '--keep-redundant-commits']
+            self._log(f'--- Cherry-pick {len(self.commits)} 个提交 ---')
+            return self._drive(args + [commit['hash'] for commit in self.commits])
+
+        return self._guarded(step)
+
+    def resume(self) -> dict:
+        """冲突解决后继续（cherry-pick --continue），返回值同 run()"""
+        if not self.paused:
+            return self._result(False, error='没有等待继续的 cherry-pick')
+        self._log('\n--- 继续 cherry-pick ---')
+        return self._guarded(lambda: self._drive(['cherry-pick', '--continue']))
+
+    @property
+    def pool(self) -> WorktreePool:
+        """任务使用的 worktree 池，首次使用时获取；工作区已关闭时抛出 WorktreePoolError"""
+        if self._pool is None:
+            self._pool = get_worktree_pool(self.repo_path)
+        return self._pool
+
+    def _reattach_worktree(self) -> bool:
+        """接管任务原来的 worktree；已不存在时重新借出一个并检出目标分支（其中已包含应用过的提交）"""
+        if self.worktree_dir and os.path.isdir(self.worktree_dir) and (
+                self.pool.owns(self.worktree_dir) or self.pool.adopt(self.worktree_dir)):
+            branch, _ = RefStore(self.worktree_dir).head()
+            if branch == self.target_branch:
+                self._log(f'--- 使用原 worktree: {self.worktree_dir} ---')
+                return True
+            self.cleanup_worktree()
+        self.worktree_dir = None
+        start_sha = self.start_sha
+        prepared = self.prepare_worktree()
+        self.start_sha = start_sha or self.start_sha
+        return prepared
+
+    def _reconcile_applied(self):
+        """
+        以目标分支上实际新增的提交数校正进度
+
+        提交可能在 git 写入后、进度保存前中断，此时分支上的提交比记录的多，多出的依次记为已应用。
+        """
+        position = self._completed_count()
+        for index in range(position, len(self.statuses)):
+            self.statuses[index] = STATUS_PENDING
+        counted = run_git(['rev-list', '--count', f'{self.start_sha}..HEAD'], self.worktree_dir)
+        if counted.ok and counted.stdout.strip().isdigit():
+            extra = int(counted.stdout.strip()) - self.statuses[:position].count(STATUS_APPLIED)
+            while extra > 0 and position < len(self.statuses):
+                self.statuses[position] = STATUS_APPLIED
+                position += 1
+                extra -= 1
+        self._position = position
+
+    def recover(self) -> dict:
+        """
+        程序重启后继续 from_record() 重建的任务，返回值同 run()
+
+        停在冲突处的任务：冲突已解决则 --continue，否则继续暂停；
+        中途退出的任务：丢弃未完成的 sequencer 状态，从第一个未完成的提交重新开始。
+        """
+        was_paused = self.paused
+
+        def step():
+            self._log(f'--- 恢复未完成的 cherry-pick: {self.target_branch} ---')
+            if not self._reattach_worktree():
+                return self._result(False, error='无法恢复 worktree')
+
+            if was_paused and self._stopped_index() is not None:
+                self._position = self._completed_count()
+                self.conflict_files = self._unmerged_files()
+                if self.conflict_files:
+                    self.paused = True
+                    self._log(f'仍有未解决的冲突: {", ".join(self.conflict_files)}')
+                    self._log(f'请在 {self.worktree_dir} 中解决冲突并 git add 后继续，或放弃本次操作。')
+                    return self._result(False, error='仍有未解决的冲突')
+                return self._drive(['cherry-pick', '--continue'])
+
+            run_git(['cherry-pick', '--quit'], self.worktree_dir)
+            run_git(['reset', '--hard', 'HEAD'], self.worktree_dir)
+            self._reconcile_applied()
+            self._persist()
+            args = ['cherry-pick']
+            if self.keep_empty:
+                args += ['--allow-empty', '--keep-redundant-commits']
+            remaining = [commit['hash'] for commit in self.commits[self._position:]]
+            if not remaining:
+                return self._finish()
+            self._log(f'--- 已完成 {self._position} 个，继续 cherry-pick 剩余 {len(remaining)} 个提交 ---')
+            return self._drive(args + remaining)
+
+        return self._guarded(step)
+
+    def abort(self) -> dict:
+        """放弃暂停中的执行，把目标分支恢复到执行前的位置，返回值同 run()"""
+        self.cancel()
+
+        def step():
+            # 重启后放弃持久化的任务时，先接管它原来的 worktree
+            if self.worktree_dir and not self.pool.owns(self.worktree_dir):
+                if not (os.path.isdir(self.worktree_dir) and self.pool.adopt(self.worktree_dir)):
+                    self.worktree_dir = None
+            self._mark_cancelled()
+            self.restore_target()
+            return self._result(False, error='已取消')
+
+        return self._guarded(step)
+
+
+class FanOutJob:
+    """
+    把同一批提交并行应用到多个目标分支，每个目标一个 CherryPickJob
+
+    多目标模式下无法逐个交互解决冲突：某个目标遇到冲突时放弃该目标并恢复分支，其他目标不受影响。
+    所有目标结束后，成功的分支用一次 git push --atomic 推送，要么全部更新要么全部不更新。
+    回调在工作线程中调用：
+    - on_output(target, text): 一行日志，推送阶段 target 为 None
+    - on_progress(target, index, total, commit, status): 单个提交的状态变化
+    - on_target_finished(target, result): 一个目标的 cherry-pick 结束（尚未推送），result 同 CherryPickJob.run()
+    - on_push_progress(stage, percent): 推送进度
+    """
+
+    def __init__(self, repo_path: str, target_branches: List[str], commits: List[dict],
+                 max_workers: int = MAX_PARALLEL_TARGETS,
+                 on_output: Optional[Callable[[str, str], None]] = None,
+                 on_progress: Optional[Callable[[str, int, int, dict, str], None]] = None,
+                 on_target_finished: Optional[Callable[[str, dict], None]] = None,
+                 on_push_progress: Optional[Callable[[str, int], None]] = None):
+        self.repo_path = repo_path
+        self.target_branches = list(dict.fromkeys(target_branches))
+        self.commits = commits
+        self.max_workers = max(1, max_workers)
+        self.on_output = on_output
+        self.on_progress = on_progress
+        self.on_target_finished = on_target_finished
+        self.on_push_progress = on_push_progress
+        self._jobs: Dict[str, CherryPickJob] = {}
+        self._lock = Lock()
+        self._cancel_event = Event()
+
+    def cancel(self):
+        """取消尚未开始的目标，并请求正在执行的目标停止"""
+        self._cancel_event.set()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def _run_target(self, target: str) -> dict:
+        job = CherryPickJob(
+            self.repo_path, target, self.commits,
+            on_output=(lambda text: self.on_output(target, text)) if self.on_output else None,
+            on_progress=(lambda index, total, commit, status: self.on_progress(target, index, total, commit, status))
+            if self.on_progress else None,
+            auto_push=False
+        )
+        with self._lock:
+            self._jobs[target] = job
+        if self.cancelled:
+            job.cancel()
+
+        result = job.run()
+        if result['paused']:
+            # 冲突留待单目标模式处理，这里恢复分支并归还 worktree
+            job.abort()
+            result = dict(result, paused=False, worktree=None)
+
+        if self.on_target_finished is not None:
+            self.on_target_finished(target, result)
+        return result
+
+    def run(self) -> dict:
+        """
+        执行全部目标
+
+        Returns:
+            summarize_fan_out 的结果
+        """
+        if not self.target_branches:
+            return summarize_fan_out({})
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.target_branches)),
+                                thread_name_prefix='cherry-pick') as executor:
+            results = dict(zip(self.target_branches, executor.map(self._run_target, self.target_branches)))
+
+        ready = [target for target, result in results.items() if result['success']]
+        if ready and self.cancelled:
+            self._restore_targets(ready, results)
+        elif ready:
+            self._push_targets(ready, results)
+        return summarize_fan_out(results)
+
+    def _log(self, text: str):
+        if self.on_output is not None:
+            self.on_output(None, text)
+
+    def _restore_targets(self, targets: List[str], results: Dict[str, dict]):
+        """推送前被取消：把已应用的分支恢复到执行前的位置"""
+        for target in targets:
+            start_sha = self._jobs[target].start_sha
+            self._log(f'--- 已取消，恢复 {target} 到 {start_sha[:8]} ---')
+            run_git(['update-ref', '-m', 'cherry-pick: cancelled', f'refs/heads/{target}', start_sha],
+                    self.repo_path)
+            results[target] = dict(results[target], success=False, cancelled=True, error='已取消')
+
+    def _push_targets(self, targets: List[str], results: Dict[str, dict]):
+        """一次原子推送所有成功的分支"""
+        self._log(f'\n--- 正在推送 {len(targets)} 个分支（atomic）---')
+        push = push_branches(self.repo_path, targets, self._log, self.on_push_progress)
+        if push.ok:
+            self._log('\n--- 推送成功！---')
+            for target in targets:
+                results[target] = dict(results[target], pushed=True)
+            return
+        self._log(f'\n--- 推送失败！错误代码: {push.returncode}，所有分支均未更新 ---')
+        for target in targets:
+            results[target] = dict(results[target], success=False, error='推送失败')
+
+
+def summarize_fan_out(results: Dict[str, dict]) -> dict:
+    """
+    汇总多目标执行结果
+
+    Returns:
+        {'success': 全部目标成功, 'succeeded', 'conflicted', 'failed', 'cancelled': 目标分支列表,
+         'applied', 'skipped': 所有目标合计的提交数, 'results': {目标分支: 单目标结果}}
+    """
+    summary = {'succeeded': [], 'conflicted': [], 'failed': [], 'cancelled': [],
+               'applied': 0, 'skipped': 0, 'results': results}
+    for target, result in results.items():
+        if result['success']:
+            summary['succeeded'].append(target)
+            summary['applied'] += result['applied']
+            summary['skipped'] += result['skipped']
+        elif STATUS_CONFLICT in result['statuses']:
+            summary['conflicted'].append(target)
+        elif result['cancelled']:
+            summary['cancelled'].append(target)
+        else:
+            summary['failed'].append(target)
+    summary['success'] = bool(results) and len(summary['succeeded']) == len(results)
+    return summary
@@ -0,0 +1,78 @@
+"""
+Cherry-pick 任务持久化模块 - 记录执行中的 cherry-pick，程序关闭或崩溃后可以从上次完成的提交继续
+
+记录保存在 cache.db 中，每个任务一条：
+{'id', 'repo_path', 'source_branch', 'target_branch', 'commits', 'keep_empty', 'statuses',
+ 'position': 下一个尚未确认结果的提交序号, 'worktree': 使用中的 worktree 路径,
+ 'start_sha': 执行前目标分支的位置, 'paused': 是否停在冲突处, 'updated_at'}
+任务正常结束（成功、失败、取消）时删除记录；只有冲突暂停或中途退出的任务会留下来。
+"""
+import os
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Set
+
+from app.cache_store import CACHE_FILE, read_cache, write_cache
+
+CACHE_KEY = 'cherry_pick_jobs'
+
+
+class CherryPickJobStore:
+    """线程安全的任务记录存储"""
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        self._lock = Lock()
+        self._records: Optional[Dict[str, dict]] = None
+
+    def _load(self) -> Dict[str, dict]:
+        if self._records is None:
+            self._records = dict(read_cache(CACHE_KEY, {}, self.path))
+        return self._records
+
+    def _save(self):
+        write_cache(CACHE_KEY, self._records, self.path)
+
+    def save(self, record: dict):
+        """新增或更新一条记录（按 id）"""
+        with self._lock:
+            records = self._load()
+            records[record['id']] = dict(record, updated_at=time.time())
+            self._save()
+
+    def remove(self, job_id: str):
+        with self._lock:
+            records = self._load()
+            if records.pop(job_id, None) is not None:
+                self._save()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._load().get(job_id)
+            return dict(record) if record is not None else None
+
+    def jobs_for(self, repo_path: str) -> List[dict]:
+        """仓库中未完成的任务，最近更新的在前"""
+        repo_path = os.path.abspath(repo_path)
+        with self._lock:
+            records = [dict(r) for r in self._load().values() if r['repo_path'] == repo_path]
+        return sorted(records, key=lambda r: r.get('updated_at', 0), reverse=True)
+
+    def worktree_paths(self) -> Set[str]:
+        """所有未完成任务占用的 worktree，清理遗留 worktree 时需要保留"""
+        with self._lock:
+            return {os.path.normcase(os.path.abspath(r['worktree']))
+                    for r in self._load().values() if r.get('worktree')}
+
+
+_default_store: Optional[CherryPickJobStore] = None
+_default_store_lock = Lock()
+
+
+def get_job_store() -> CherryPickJobStore:
+    """进程内共享的任务记录存储"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CherryPickJobStore()
+        return _default_store
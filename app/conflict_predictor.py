@@ -0,0 +1,124 @@
+"""
+冲突预测模块 - 按文件重叠粗略估计 cherry-pick 的冲突风险，在真正的预检完成前给出提示
+
+对每个待应用的提交，比较它改动的文件与目标分支自合并基础以来改动的文件：
+- none：没有共同文件，不会产生内容冲突
+- overlap：两边修改了同一文件，可能自动合并，也可能冲突
+- likely：一边删除另一边修改，或两边新增了同一路径，几乎一定冲突
+
+只启动两个 git 进程（diff --name-status 和 log --name-status），不读取文件内容，通常在毫秒级完成。
+"""
+from typing import Dict, List
+
+from app.git_runner import run_git
+
+RISK_NONE = 'none'
+RISK_OVERLAP = 'overlap'
+RISK_LIKELY = 'likely'
+
+
+class PredictionError(Exception):
+    """无法计算文件重叠"""
+
+
+def _parse_name_status(tokens: List[str]) -> Dict[str, str]:
+    """解析 -z --name-status 的 [状态, 路径, 状态, 路径, ...]，返回 {路径: 状态字母}"""
+    changes = {}
+    for i in range(0, len(tokens) - 1, 2):
+        status = tokens[i].strip()
+        if status:
+            changes[tokens[i + 1]] = status[0]
+    return changes
+
+
+def target_changes(repo_path: str, target: str, base_commit: str) -> Dict[str, str]:
+    """
+    目标分支自与 base_commit 的合并基础以来改动的文件
+
+    Returns:
+        {路径: 状态字母（A/M/D/T）}
+
+    Raises:
+        PredictionError: 找不到目标分支、没有共同历史等
+    """
+    result = run_git(['diff', '-z', '--name-status', '--no-renames', f'{base_commit}...{target}'], repo_path)
+    if not result.ok:
+        raise PredictionError(result.stderr.strip() or f'git diff 失败，错误代码: {result.returncode}')
+    return _parse_name_status(result.stdout.split('\0'))
+
+
+def commit_changes(repo_path: str, commit_hashes: List[str]) -> Dict[str, Dict[str, str]]:
+    """
+    每个提交改动的文件（相对第一个父提交）
+
+    Returns:
+        {提交哈希: {路径: 状态字母}}
+
+    Raises:
+        PredictionError: git 命令失败
+    """
+    if not commit_hashes:
+        return {}
+    result = run_git(['log', '-z', '--no-walk=unsorted', '--no-renames', '--name-status', '--format=commit %H',
+                      *commit_hashes], repo_path)
+    if not result.ok:
+        raise PredictionError(result.stderr.strip() or f'git log 失败，错误代码: {result.returncode}')
+
+    # 输出形如 "commit <hash>\0\nM\0path\0A\0path\0commit <hash>\0..."
+    changes: Dict[str, Dict[str, str]] = {}
+    current: List[str] = []
+    commit_hash = None
+    for token in result.stdout.split('\0'):
+        token = token.lstrip('\n')
+        if token.startswith('commit ') and len(current) % 2 == 0:
+            if commit_hash is not None:
+                changes[commit_hash] = _parse_name_status(current)
+            commit_hash, current = token[len('commit '):], []
+        elif commit_hash is not None:
+            current.append(token)
+    if commit_hash is not None:
+        changes[commit_hash] = _parse_name_status(current)
+    return changes
+
+
+def _classify(ours: str, theirs: str) -> str:
+    """同一路径上提交的改动 ours 与目标分支的改动 theirs 的冲突风险"""
+    if ours == 'D' and theirs == 'D':
+        return RISK_NONE
+    if 'D' in (ours, theirs) or (ours == 'A' and theirs == 'A'):
+        return RISK_LIKELY
+    return RISK_OVERLAP
+
+
+def predict_conflicts(repo_path: str, target: str, commit_hashes: List[str]) -> Dict[str, dict]:
+    """
+    按文件重叠预测把 commit_hashes 依次 cherry-pick 到 target 的冲突风险
+
+    Args:
+        repo_path: 仓库目录
+        target: 目标分支
+        commit_hashes: 按应用顺序（从旧到新）排列的提交，合并基础按最后一个提交计算
+
+    Returns:
+        {提交哈希: {'risk': RISK_*, 'paths': 与目标分支重叠的文件}}
+
+    Raises:
+        PredictionError: git 命令失败
+    """
+    if not commit_hashes:
+        return {}
+    theirs = target_changes(repo_path, target, commit_hashes[-1])
+    predictions = {}
+    for commit_hash, ours in commit_changes(repo_path, commit_hashes).items():
+        risk, paths = RISK_NONE, []
+        for path, status in ours.items():
+            if path not in theirs:
+                continue
+            path_risk = _classify(status, theirs[path])
+            if path_risk == RISK_NONE:
+                continue
+            paths.append(path)
+            if risk != RISK_LIKELY:
+                risk = path_risk
+        predictions[commit_hash] = {'risk': risk, 'paths': sorted(paths)}
+    return predictions
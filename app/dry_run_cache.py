@@ -0,0 +1,150 @@
+"""
+预检结果缓存模块 - 按 (有序提交列表, 目标分支 tip) 缓存逐提交的预检结果，持久化到 cache.db
+
+提交和目标 tip 都是内容寻址的，相同的键必然得到相同的结果。键按提交顺序链式计算：
+第 i 个提交的键 = sha1(第 i-1 个提交的键 + 提交哈希)，第 0 个以目标 tip 为起点。
+因此提交列表只在末尾追加新提交时，已有前缀全部命中，只需模拟新增的提交；
+目标分支移动后 tip 改变，所有键自然失效。
+
+store() 只修改内存中的缓存，写入 cache.db 延迟 FLUSH_DELAY 秒进行，期间的多次 store() 合并为一次写入；
+退出程序时调用 flush() 写入尚未保存的修改。
+"""
+import hashlib
+from collections import OrderedDict
+from threading import Lock, Timer
+from typing import List, Optional, Tuple
+
+from app.cache_store import CACHE_FILE, read_cache, write_cache
+
+CACHE_KEY = 'dry_run_cache'
+# 缓存条目上限（每个条目对应一个提交前缀），超出时按最近最少使用淘汰
+MAX_ENTRIES = 5000
+# 单个条目保存的冲突文件数上限，避免个别大提交撑大缓存
+MAX_CONFLICT_FILES = 50
+# store() 之后延迟写入 cache.db 的秒数
+FLUSH_DELAY = 5.0
+
+
+def chain_key(previous_key: str, commit_hash: str) -> str:
+    """由前一个前缀的键和下一个提交计算新前缀的键"""
+    return hashlib.sha1(f'{previous_key}:{commit_hash}'.encode('ascii')).hexdigest()
+
+
+class DryRunCache:
+    """
+    线程安全的 LRU 预检缓存
+
+    条目为 {'outcome': 逐提交结果, 'state_commit': 模拟状态提交, 'state_tree': 模拟状态树}，
+    状态用于从缓存的前缀之后继续用 merge-tree 模拟，没有状态的条目只能整体命中。
+    """
+
+    def __init__(self, path: str = CACHE_FILE, max_entries: int = MAX_ENTRIES, flush_delay: float = FLUSH_DELAY):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_delay = flush_delay
+        self._lock = Lock()
+        self._entries: Optional[OrderedDict] = None
+        self._dirty = False
+        self._flush_timer: Optional[Timer] = None
+
+    def _load(self) -> OrderedDict:
+        if self._entries is None:
+            self._entries = OrderedDict(read_cache(CACHE_KEY, [], self.path))
+        return self._entries
+
+    def _schedule_flush(self):
+        """记录有未保存的修改，并在 flush_delay 秒后写入（调用时需持有锁）"""
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """把尚未保存的修改写入 cache.db"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._dirty:
+                self._dirty = False
+                write_cache(CACHE_KEY, list(self._entries.items()), self.path)
+
+    def lookup(self, target_sha: str, commit_hashes: List[str]) -> Tuple[List[dict], Optional[dict]]:
+        """
+        查找最长的已缓存前缀
+
+        Returns:
+            (前缀内的逐提交结果, 前缀最后一个条目)；没有命中时为 ([], None)
+        """
+        with self._lock:
+            entries = self._load()
+            key = target_sha
+            outcomes = []
+            last_entry = None
+            for commit_hash in commit_hashes:
+                key = chain_key(key, commit_hash)
+                entry = entries.get(key)
+                if entry is None:
+                    break
+                entries.move_to_end(key)
+                outcomes.append(dict(entry['outcome']))
+                last_entry = entry
+            return outcomes, last_entry
+
+    def store(self, target_sha: str, commit_hashes: List[str], outcomes: List[dict],
+              states: List[Tuple[Optional[str], Optional[str]]]):
+        """
+        保存逐提交结果
+
+        Args:
+            target_sha: 目标分支 tip
+            commit_hashes: 按应用顺序排列的提交，与 outcomes 一一对应
+            outcomes: 逐提交结果
+            states: 每个提交模拟之后的 (state_commit, state_tree)，未知时为 (None, None)
+        """
+        with self._lock:
+            entries = self._load()
+            key = target_sha
+            for commit_hash, outcome, (state_commit, state_tree) in zip(commit_hashes, outcomes, states):
+                if outcome['status'] == 'error':
+                    # 错误可能是超时等偶发原因，不缓存它及之后的结果
+                    break
+                key = chain_key(key, commit_hash)
+                if state_tree is None and key in entries:
+                    # 不覆盖已有条目中记录的模拟状态
+                    entries.move_to_end(key)
+                    continue
+                outcome = dict(outcome, conflict_files=outcome['conflict_files'][:MAX_CONFLICT_FILES])
+                entries[key] = {'outcome': outcome, 'state_commit': state_commit, 'state_tree': state_tree}
+                entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._schedule_flush()
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._dirty = True
+        self.flush()
+
+
+_default_cache: Optional[DryRunCache] = None
+_default_cache_lock = Lock()
+
+
+def flush_dry_run_cache():
+    """写入共享预检缓存中尚未保存的修改（退出程序时调用）"""
+    with _default_cache_lock:
+        cache = _default_cache
+    if cache is not None:
+        cache.flush()
+
+
+def get_dry_run_cache() -> DryRunCache:
+    """进程内共享的预检缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DryRunCache()
+        return _default_cache
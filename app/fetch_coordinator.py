@@ -0,0 +1,236 @@
+"""
+Fetch 协调模块 - 每个仓库一个协调器，合并并发的 git fetch 并记录远程跟踪分支的新鲜度
+
+创建分支、查看提交差异和后台预取都会触发 fetch。经由协调器后：
+- 同一时刻只有一个 fetch 在执行，并发的请求等待并共享这次结果（single-flight）
+- 调用方可以通过 max_age 声明"最多允许多少秒前的数据"，足够新时直接返回，不启动 git
+- 只依赖少数远程分支的操作可以用定向 fetch，只更新这些分支的远程跟踪引用
+- 记录最近一次成功的时间，供界面显示远程分支的新鲜度；全量 fetch 的时间保存在 cache.db 中，重启后仍然有效
+  （不能以 FETCH_HEAD 的修改时间代替，定向 fetch 也会写入它）
+"""
+import os
+import time
+from threading import Event, Lock
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from app.cache_store import read_cache, update_cache
+from app.git_runner import run_git
+
+CACHE_KEY = 'full_fetch_times'
+
+
+class FetchResult:
+    """一次 fetch 请求的结果"""
+
+    def __init__(self, ok: bool, stdout: str = '', stderr: str = '', finished_at: Optional[float] = None,
+                 from_cache: bool = False, shared: bool = False):
+        self.ok = ok
+        self.stdout = stdout
+        self.stderr = stderr
+        self.finished_at = finished_at
+        # 数据足够新，未启动 git
+        self.from_cache = from_cache
+        # 加入了其他调用方发起的 fetch
+        self.shared = shared
+
+    def __repr__(self):
+        return f'FetchResult(ok={self.ok}, from_cache={self.from_cache}, shared={self.shared})'
+
+
+class _Flight:
+    """一次正在进行的 fetch"""
+
+    def __init__(self):
+        self.done = Event()
+        self.result: Optional[FetchResult] = None
+
+
+def format_age(seconds: Optional[float]) -> str:
+    """将距今秒数格式化为"刚刚""5 分钟前"等描述"""
+    if seconds is None:
+        return '从未获取'
+    if seconds < 60:
+        return '刚刚'
+    if seconds < 3600:
+        return f'{int(seconds // 60)} 分钟前'
+    if seconds < 86400:
+        return f'{int(seconds // 3600)} 小时前'
+    return f'{int(seconds // 86400)} 天前'
+
+
+class FetchCoordinator:
+    """
+    单个仓库的 fetch 协调器
+
+    所有方法都是线程安全的。fetch() 会阻塞到结果可用，应在后台线程中调用。
+    """
+
+    def __init__(self, repo_path: str, remote: str = 'origin'):
+        self.repo_path = os.path.abspath(repo_path)
+        self.remote = remote
+        self._lock = Lock()
+        # 进行中的 fetch：全量为 None，定向 fetch 为分支名集合
+        self._flights: Dict[Optional[FrozenSet[str]], _Flight] = {}
+        self._last_success: Optional[float] = read_cache(CACHE_KEY, {}).get(self.repo_path)
+        # 定向 fetch 成功的时间 {分支名: 时间戳}
+        self._branch_success: Dict[str, float] = {}
+        self._last_error: Optional[str] = None
+
+    def _branch_time(self, branch: str) -> Optional[float]:
+        times = [t for t in (self._last_success, self._branch_success.get(branch)) if t is not None]
+        return max(times) if times else None
+
+    def _find_flight(self, branches: Optional[FrozenSet[str]]) -> Optional[_Flight]:
+        """查找能覆盖所需分支的进行中 fetch，全量 fetch 覆盖一切"""
+        if None in self._flights:
+            return self._flights[None]
+        if branches is None:
+            return None
+        for key, flight in self._flights.items():
+            if branches <= key:
+                return flight
+        return None
+
+    def _run(self, key: Optional[FrozenSet[str]], args: List[str], timeout: Optional[float]) -> FetchResult:
+        """在锁外执行 fetch，key 对应的 flight 已由调用方登记"""
+        with self._lock:
+            flight = self._flights[key]
+        result = FetchResult(False, stderr='fetch 未完成')
+        try:
+            git_result = run_git(args, self.repo_path, timeout=timeout)
+            result = FetchResult(git_result.ok, git_result.stdout, git_result.stderr, time.time())
+        except Exception as e:
+            result = FetchResult(False, stderr=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                if key is None:
+                    if result.ok:
+                        self._last_success = result.finished_at
+                    self._last_error = None if result.ok else result.stderr.strip()
+                elif result.ok:
+                    for branch in key:
+                        self._branch_success[branch] = result.finished_at
+                self._flights.pop(key, None)
+            flight.result = result
+            flight.done.set()
+        if key is None and result.ok:
+            update_cache(CACHE_KEY, lambda times: {**times, self.repo_path: result.finished_at}, {})
+        return result
+
+    @staticmethod
+    def _join(flight: _Flight) -> FetchResult:
+        flight.done.wait()
+        result = flight.result
+        return FetchResult(result.ok, result.stdout, result.stderr, result.finished_at, shared=True)
+
+    def fetch(self, max_age: Optional[float] = None, timeout: Optional[float] = None) -> FetchResult:
+        """
+        全量 fetch，确保所有远程跟踪分支足够新
+
+        Args:
+            max_age: 可接受的最大数据年龄（秒），最近一次成功的 fetch 在此范围内时直接返回；
+                None 或 0 表示总是需要一次新的 fetch（正在进行的 fetch 可以共享）
+            timeout: git fetch 超时秒数，默认使用 git_runner 的网络超时
+
+        Returns:
+            FetchResult
+        """
+        with self._lock:
+            if max_age and self._last_success is not None and time.time() - self._last_success <= max_age:
+                return FetchResult(True, finished_at=self._last_success, from_cache=True)
+            flight = self._find_flight(None)
+            if flight is None:
+                self._flights[None] = _Flight()
+        if flight is not None:
+            return self._join(flight)
+        return self._run(None, ['fetch', self.remote], timeout)
+
+    def fetch_branches(self, branches: Iterable[str], max_age: Optional[float] = None,
+                       timeout: Optional[float] = None) -> FetchResult:
+        """
+        定向 fetch：只更新给定分支对应的远程跟踪引用（refs/remotes/<remote>/<branch>）
+
+        用于创建分支、比较提交等只依赖少数远程分支的操作；分支数量多的仓库上比全量 fetch 快得多。
+        远程不存在的分支会让这次 fetch 失败。
+
+        Args:
+            branches: 远程分支名（不带 <remote>/ 前缀）
+            max_age: 同 fetch()，按每个分支最近一次被全量或定向 fetch 更新的时间判断
+            timeout: git fetch 超时秒数
+
+        Returns:
+            FetchResult
+        """
+        wanted = list(dict.fromkeys(b for b in branches if b))
+        if not wanted:
+            return FetchResult(True, finished_at=time.time(), from_cache=True)
+        with self._lock:
+            now = time.time()
+            stale = [b for b in wanted
+                     if not max_age or self._branch_time(b) is None or now - self._branch_time(b) > max_age]
+            if not stale:
+                return FetchResult(True, finished_at=min(self._branch_time(b) for b in wanted), from_cache=True)
+            key = frozenset(stale)
+            flight = self._find_flight(key)
+            if flight is None:
+                self._flights[key] = _Flight()
+        if flight is not None:
+            return self._join(flight)
+        refspecs = [f'+refs/heads/{b}:refs/remotes/{self.remote}/{b}' for b in stale]
+        return self._run(key, ['fetch', self.remote, *refspecs], timeout)
+
+    def is_fetching(self) -> bool:
+        """是否有全量 fetch 正在进行"""
+        with self._lock:
+            return None in self._flights
+
+    def last_success(self) -> Optional[float]:
+        """最近一次成功 fetch 的时间戳，从未成功时为 None"""
+        with self._lock:
+            return self._last_success
+
+    def branch_age(self, branch: str) -> Optional[float]:
+        """单个远程跟踪分支距最近一次被全量或定向 fetch 更新的秒数"""
+        with self._lock:
+            last = self._branch_time(branch)
+        return None if last is None else max(0.0, time.time() - last)
+
+    def age(self) -> Optional[float]:
+        """远程跟踪分支距最近一次成功的全量 fetch 的秒数"""
+        last_success = self.last_success()
+        return None if last_success is None else max(0.0, time.time() - last_success)
+
+    def freshness(self) -> dict:
+        """新鲜度快照: last_success, age, fetching, last_error"""
+        with self._lock:
+            last_success = self._last_success
+            fetching = None in self._flights
+            last_error = self._last_error
+        age = None if last_success is None else max(0.0, time.time() - last_success)
+        return {'last_success': last_success, 'age': age, 'fetching': fetching, 'last_error': last_error}
+
+    def describe_freshness(self) -> str:
+        """供界面显示的新鲜度描述"""
+        info = self.freshness()
+        text = f'远程分支更新于: {format_age(info["age"])}'
+        if info['fetching']:
+            text += '（正在获取...）'
+        elif info['last_error']:
+            text += '（上次获取失败）'
+        return text
+
+
+# 每个仓库一个协调器
+_coordinators: Dict[str, FetchCoordinator] = {}
+_coordinators_lock = Lock()
+
+
+def get_fetch_coordinator(repo_path: str) -> FetchCoordinator:
+    """获取仓库对应的 fetch 协调器（按绝对路径共享）"""
+    repo_path = os.path.abspath(repo_path)
+    with _coordinators_lock:
+        coordinator = _coordinators.get(repo_path)
+        if coordinator is None:
+            coordinator = FetchCoordinator(repo_path)
+            _coordinators[repo_path] = coordinator
+        return coordinator
@@ -0,0 +1,79 @@
+"""
+Git 提交日志模块 - 单个 git log 进程流式解析完整的提交信息
+"""
+import subprocess
+from typing import Iterator, List, Optional, Tuple
+
+from app.git_runner import open_git
+
+# 每个提交固定输出的字段（NUL 分隔），提交之间同样以 NUL 分隔（-z）
+LOG_FIELDS = ('hash', 'parents', 'author', 'email', 'date', 'message')
+LOG_FORMAT = '%x00'.join(('%H', '%P', '%an', '%ae', '%ai', '%s'))
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+
+class GitLogError(Exception):
+    """git log 执行失败"""
+
+
+def _build_record(fields: List[bytes]) -> dict:
+    values = [f.decode('utf-8', errors='replace') for f in fields]
+    record = dict(zip(LOG_FIELDS, values))
+    parents = record['parents'].split()
+    record['parents'] = parents
+    record['parent_count'] = len(parents)
+    return record
+
+
+def iter_log_records(directory: str, revision_args: List[str]) -> Iterator[dict]:
+    """
+    流式读取提交记录，边读边解析
+
+    Args:
+        directory: 仓库目录
+        revision_args: 传给 git log 的修订范围及过滤参数，例如 ['origin/dev..feature']
+
+    Yields:
+        提交字典: hash, parents, parent_count, author, email, date, message
+
+    Raises:
+        GitLogError: git log 返回非零退出码
+    """
+    field_count = len(LOG_FIELDS)
+    args = ['log', '-z', f'--format={LOG_FORMAT}', *revision_args, '--']
+    with open_git(args, directory, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        try:
+            pending = b''
+            fields: List[bytes] = []
+            while True:
+                chunk = process.stdout.read1(_READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                tokens = (pending + chunk).split(b'\0')
+                # 最后一个 token 可能还不完整，留到下一轮
+                pending = tokens.pop()
+                for token in tokens:
+                    fields.append(token)
+                    if len(fields) == field_count:
+                        yield _build_record(fields)
+                        fields = []
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                raise GitLogError(stderr.decode('utf-8', errors='replace').strip())
+        finally:
+            process.stdout.close()
+            process.stderr.close()
+
+
+def get_log_records(directory: str, revision_args: List[str]) -> List[dict]:
+    """读取全部提交记录，参见 iter_log_records"""
+    return list(iter_log_records(directory, revision_args))
+
+
+def get_log_records_or_error(directory: str, revision_args: List[str]) -> Tuple[List[dict], Optional[str]]:
+    """读取全部提交记录，失败时返回 ([], 错误信息)"""
+    try:
+        return get_log_records(directory, revision_args), None
+    except GitLogError as e:
+        return [], str(e)
@@ -0,0 +1,238 @@
+"""
+Git 对象读取模块 - 基于常驻的 git cat-file --batch / --batch-check 进程读取提交和文件内容
+"""
+import os
+import subprocess
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from app.git_runner import spawn_git
+
+
+def format_git_date(timestamp: int, tz_offset: str) -> str:
+    """将提交头中的时间戳和时区转换为与 git log %ai 一致的格式"""
+    sign = -1 if tz_offset.startswith('-') else 1
+    digits = tz_offset.lstrip('+-').rjust(4, '0')
+    offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+    tz = timezone(sign * offset)
+    return datetime.fromtimestamp(timestamp, tz).strftime('%Y-%m-%d %H:%M:%S ') + tz_offset
+
+
+def _parse_identity(value: str) -> Tuple[str, str, str]:
+    """解析 'Name <email> 1700000000 +0800' 形式的身份信息，返回 (name, email, date)"""
+    name, _, rest = value.partition(' <')
+    email, _, stamp = rest.partition('> ')
+    date = ''
+    stamp_parts = stamp.split()
+    if len(stamp_parts) == 2 and stamp_parts[0].isdigit():
+        try:
+            date = format_git_date(int(stamp_parts[0]), stamp_parts[1])
+        except (ValueError, OverflowError, OSError):
+            date = ''
+    return name, email, date
+
+
+def parse_commit(oid: str, data: bytes) -> dict:
+    """解析原始提交对象内容"""
+    header_bytes, _, message_bytes = data.partition(b'\n\n')
+    headers: List[Tuple[str, str]] = []
+    for line in header_bytes.split(b'\n'):
+        if line.startswith(b' ') and headers:
+            # 多行头（如 gpgsig）的续行
+            continue
+        key, _, value = line.partition(b' ')
+        headers.append((key.decode('ascii', errors='replace'), value.decode('utf-8', errors='replace')))
+
+    encoding = 'utf-8'
+    commit = {'hash': oid, 'tree': '', 'parents': [], 'author': '', 'email': '', 'date': '',
+              'committer': '', 'committer_email': '', 'committer_date': ''}
+    for key, value in headers:
+        if key == 'tree':
+            commit['tree'] = value
+        elif key == 'parent':
+            commit['parents'].append(value)
+        elif key == 'author':
+            commit['author'], commit['email'], commit['date'] = _parse_identity(value)
+        elif key == 'committer':
+            commit['committer'], commit['committer_email'], commit['committer_date'] = _parse_identity(value)
+        elif key == 'encoding':
+            encoding = value.strip() or encoding
+
+    try:
+        body = message_bytes.decode(encoding, errors='replace')
+    except LookupError:
+        body = message_bytes.decode('utf-8', errors='replace')
+    commit['body'] = body
+    commit['message'] = body.split('\n', 1)[0].strip()
+    return commit
+
+
+class GitObjectReader:
+    """
+    单个仓库的常驻对象读取器
+
+    通过一个 git cat-file --batch 进程（读取内容）和一个 --batch-check 进程（只读元信息）
+    服务所有请求，进程按需启动，意外退出后下次调用时自动重启。所有方法都是线程安全的。
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = os.path.abspath(repo_path)
+        self._batch_process: Optional[subprocess.Popen] = None
+        self._check_process: Optional[subprocess.Popen] = None
+        self._batch_lock = Lock()
+        self._check_lock = Lock()
+        self._closed = False
+
+    def _start_process(self, mode: str) -> subprocess.Popen:
+        return spawn_git(
+            ['cat-file', mode],
+            self.repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    @staticmethod
+    def _stop_process(process: Optional[subprocess.Popen]):
+        if process is None:
+            return
+        try:
+            if process.stdin:
+                process.stdin.close()
+            process.wait(timeout=2)
+        except Exception:
+            process.kill()
+        finally:
+            if process.stdout:
+                process.stdout.close()
+
+    @staticmethod
+    def _validate_rev(rev: str):
+        if not rev or '\n' in rev:
+            raise ValueError(f'无效的对象名: {rev!r}')
+
+    def _request(self, process: subprocess.Popen, rev: str) -> Optional[List[bytes]]:
+        """写入一行请求并读取响应头，对象不存在时返回 None"""
+        process.stdin.write(rev.encode('utf-8') + b'\n')
+        process.stdin.flush()
+        header = process.stdout.readline()
+        if not header:
+            raise BrokenPipeError('git cat-file 进程已退出')
+        parts = header.split()
+        # 不存在的对象响应为 "<rev> missing"，有歧义时为 "<rev> ambiguous"
+        if len(parts) != 3 or parts[-1] in (b'missing', b'ambiguous'):
+            return None
+        return parts
+
+    def read_object(self, rev: str) -> Optional[Tuple[str, str, bytes]]:
+        """
+        读取对象内容
+
+        Args:
+            rev: 任意 git 能解析的对象名（sha、分支名、<commit>:<path> 等）
+
+        Returns:
+            (oid, type, data)，对象不存在时返回 None
+        """
+        self._validate_rev(rev)
+        with self._batch_lock:
+            if self._closed:
+                raise RuntimeError('对象读取器已关闭')
+            for attempt in range(2):
+                if self._batch_process is None or self._batch_process.poll() is not None:
+                    self._batch_process = self._start_process('--batch')
+                try:
+                    parts = self._request(self._batch_process, rev)
+                    if parts is None:
+                        return None
+                    size = int(parts[2])
+                    data = self._batch_process.stdout.read(size)
+                    # 内容之后还有一个换行符
+                    self._batch_process.stdout.read(1)
+                    return parts[0].decode('ascii'), parts[1].decode('ascii'), data
+                except (BrokenPipeError, OSError, ValueError):
+                    self._stop_process(self._batch_process)
+                    self._batch_process = None
+                    if attempt:
+                        raise
+        return None
+
+    def object_info(self, rev: str) -> Optional[Tuple[str, str, int]]:
+        """读取对象元信息，返回 (oid, type, size)，对象不存在时返回 None"""
+        self._validate_rev(rev)
+        with self._check_lock:
+            if self._closed:
+                raise RuntimeError('对象读取器已关闭')
+            for attempt in range(2):
+                if self._check_process is None or self._check_process.poll() is not None:
+                    self._check_process = self._start_process('--batch-check')
+                try:
+                    parts = self._request(self._check_process, rev)
+                    if parts is None:
+                        return None
+                    return parts[0].decode('ascii'), parts[1].decode('ascii'), int(parts[2])
+                except (BrokenPipeError, OSError, ValueError):
+                    self._stop_process(self._check_process)
+                    self._check_process = None
+                    if attempt:
+                        raise
+        return None
+
+    def read_commit(self, rev: str) -> Optional[dict]:
+        """读取并解析提交，返回包含 hash/parents/author/email/date/message/body 等字段的字典"""
+        obj = self.read_object(rev)
+        if obj is None or obj[1] != 'commit':
+            return None
+        return parse_commit(obj[0], obj[2])
+
+    def read_text(self, rev: str, encoding: str = 'utf-8') -> Optional[str]:
+        """读取 blob 内容并解码为文本，对象不存在时返回 None"""
+        obj = self.read_object(rev)
+        if obj is None:
+            return None
+        return obj[2].decode(encoding, errors='replace')
+
+    def close(self):
+        """关闭后台进程，之后的调用会抛出 RuntimeError"""
+        with self._batch_lock:
+            self._closed = True
+            self._stop_process(self._batch_process)
+            self._batch_process = None
+        with self._check_lock:
+            self._stop_process(self._check_process)
+            self._check_process = None
+
+
+# 每个仓库一个读取器
+_readers: Dict[str, GitObjectReader] = {}
+_readers_lock = Lock()
+
+
+def get_object_reader(repo_path: str) -> GitObjectReader:
+    """获取仓库对应的对象读取器（按绝对路径共享）"""
+    repo_path = os.path.abspath(repo_path)
+    with _readers_lock:
+        reader = _readers.get(repo_path)
+        if reader is None:
+            reader = GitObjectReader(repo_path)
+            _readers[repo_path] = reader
+        return reader
+
+
+def close_object_reader(repo_path: str):
+    """关闭并移除仓库对应的对象读取器"""
+    repo_path = os.path.abspath(repo_path)
+    with _readers_lock:
+        reader = _readers.pop(repo_path, None)
+    if reader is not None:
+        reader.close()
+
+
+def close_all_object_readers():
+    """关闭所有对象读取器"""
+    with _readers_lock:
+        readers = list(_readers.values())
+        _readers.clear()
+    for reader in readers:
+        reader.close()
@@ -0,0 +1,259 @@
+"""
+Git 引用读取模块 - 直接解析 .git 中的 HEAD、松散引用和 packed-refs，无需启动 git 进程
+"""
+import os
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from app.git_runner import run_git
+
+HEADS_PREFIX = 'refs/heads/'
+REMOTES_PREFIX = 'refs/remotes/'
+
+
+class RefStoreError(Exception):
+    """引用读取失败"""
+
+
+def _is_sha(value: str) -> bool:
+    return len(value) in (40, 64) and all(c in '0123456789abcdef' for c in value)
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def find_git_dirs(path: str) -> Tuple[str, str]:
+    """
+    查找仓库的 git 目录和公共目录
+
+    Args:
+        path: 工作区内任意目录
+
+    Returns:
+        (git_dir, common_dir)，对 worktree 来说 git_dir 是 .git/worktrees/<name>，
+        common_dir 是主仓库的 .git
+
+    Raises:
+        RefStoreError: 找不到 git 仓库
+    """
+    current = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(current, '.git')
+        if os.path.isdir(dot_git):
+            git_dir = dot_git
+            break
+        if os.path.isfile(dot_git):
+            content = _read_text(dot_git) or ''
+            if not content.startswith('gitdir:'):
+                raise RefStoreError(f'无法解析 {dot_git}')
+            git_dir = os.path.normpath(os.path.join(current, content[len('gitdir:'):].strip()))
+            break
+        parent = os.path.dirname(current)
+        if parent == current:
+            raise RefStoreError(f'{path} 不是 git 仓库')
+        current = parent
+
+    common_dir = git_dir
+    commondir_file = _read_text(os.path.join(git_dir, 'commondir'))
+    if commondir_file:
+        common_dir = os.path.normpath(os.path.join(git_dir, commondir_file))
+    return git_dir, common_dir
+
+
+class RefStore:
+    """
+    单个仓库的引用读取器
+
+    松散引用和 packed-refs 的解析结果按目录和文件的 mtime 缓存，引用未变化时
+    只需要对已知目录做一次 stat。遇到 reftable 等无法直接解析的格式时回退到
+    git for-each-ref。
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = os.path.abspath(repo_path)
+        self.git_dir, self.common_dir = find_git_dirs(self.repo_path)
+        self._lock = Lock()
+        self._signature = None
+        self._dirs: List[str] = []
+        self._refs: Dict[str, str] = {}
+        self._use_git = self._detect_unsupported_format()
+
+    def _detect_unsupported_format(self) -> bool:
+        """检测是否为需要回退到 git 命令的引用存储格式（如 reftable）"""
+        if os.path.isdir(os.path.join(self.common_dir, 'reftable')):
+            return True
+        config = _read_text(os.path.join(self.common_dir, 'config')) or ''
+        for line in config.splitlines():
+            key, _, value = line.strip().partition('=')
+            if key.strip().lower() == 'refstorage' and value.strip().lower() != 'files':
+                return True
+        return False
+
+    def _packed_refs_stat(self) -> Optional[tuple]:
+        try:
+            st = os.stat(os.path.join(self.common_dir, 'packed-refs'))
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _stat_signature(self) -> Optional[tuple]:
+        """根据 packed-refs 和已知引用目录的 mtime 计算缓存签名，目录缺失时返回 None"""
+        parts = [self._packed_refs_stat()]
+        for directory in self._dirs:
+            try:
+                parts.append(os.stat(directory).st_mtime_ns)
+            except FileNotFoundError:
+                return None
+        return tuple(parts)
+
+    def _read_packed_refs(self, refs: Dict[str, str]):
+        try:
+            with open(os.path.join(self.common_dir, 'packed-refs'), 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.rstrip('\n')
+                    # 注释头和 peeled 行（^sha）跳过
+                    if not line or line[0] in '#^':
+                        continue
+                    sha, _, name = line.partition(' ')
+                    if not _is_sha(sha) or not name:
+                        raise RefStoreError(f'无法解析 packed-refs 行: {line}')
+                    if name.startswith(HEADS_PREFIX) or name.startswith(REMOTES_PREFIX):
+                        refs[name] = sha
+        except FileNotFoundError:
+            pass
+
+    def _read_loose_refs(self, refs: Dict[str, str], dirs: List[str], mtimes: List[int]):
+        """读取松散引用；每个目录在读取前记录 mtime，读取期间的变化会让签名在下次检查时不一致"""
+        symrefs = {}
+        # refs 目录本身也纳入签名，refs/remotes 等目录首次创建时能被感知
+        dirs.append(os.path.join(self.common_dir, 'refs'))
+        mtimes.append(os.stat(dirs[-1]).st_mtime_ns)
+        for prefix in (HEADS_PREFIX, REMOTES_PREFIX):
+            root = os.path.join(self.common_dir, *prefix.rstrip('/').split('/'))
+            if not os.path.isdir(root):
+                continue
+            stack = [(root, prefix)]
+            while stack:
+                directory, ref_prefix = stack.pop()
+                dirs.append(directory)
+                mtimes.append(os.stat(directory).st_mtime_ns)
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.lock'):
+                            continue
+                        name = ref_prefix + entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, name + '/'))
+                            continue
+                        content = _read_text(entry.path)
+                        if content is None:
+                            continue
+                        if content.startswith('ref:'):
+                            symrefs[name] = content[len('ref:'):].strip()
+                        elif _is_sha(content):
+                            refs[name] = content
+                        else:
+                            raise RefStoreError(f'无法解析引用 {name}')
+        # 符号引用（如 refs/remotes/origin/HEAD）解析为其指向的 sha
+        for name, target in symrefs.items():
+            if target in refs:
+                refs[name] = refs[target]
+
+    def _load_with_git(self) -> Dict[str, str]:
+        result = run_git(
+            ['for-each-ref', '--format=%(objectname) %(refname)', HEADS_PREFIX, REMOTES_PREFIX],
+            self.repo_path
+        )
+        if not result.ok:
+            raise RefStoreError(result.stderr.strip())
+        refs = {}
+        for line in result.stdout.splitlines():
+            sha, _, name = line.partition(' ')
+            if name:
+                refs[name] = sha
+        return refs
+
+    def refs(self) -> Dict[str, str]:
+        """返回 refs/heads 和 refs/remotes 下的全部引用 {完整引用名: sha}"""
+        with self._lock:
+            if self._use_git:
+                return self._load_with_git()
+            if self._signature is not None and self._stat_signature() == self._signature:
+                return dict(self._refs)
+            try:
+                refs: Dict[str, str] = {}
+                dirs: List[str] = []
+                # 签名取自读取之前的状态：读取期间引用被修改时，缓存的结果不会被当作最新
+                mtimes: List[int] = []
+                packed_stat = self._packed_refs_stat()
+                self._read_packed_refs(refs)
+                # 松散引用优先于 packed-refs
+                self._read_loose_refs(refs, dirs, mtimes)
+            except (RefStoreError, OSError, UnicodeDecodeError):
+                # 多为读取期间 git 正在修改引用（目录被清理、引用写了一半），只有这一次改用 git，
+                # 下次仍走直接解析；无法解析的存储格式由 _detect_unsupported_format 永久切换
+                return self._load_with_git()
+            self._dirs = dirs
+            self._refs = refs
+            self._signature = (packed_stat, *mtimes)
+            return dict(refs)
+
+    def local_branches(self) -> Dict[str, str]:
+        """本地分支 {分支名: sha}"""
+        return {name[len(HEADS_PREFIX):]: sha for name, sha in self.refs().items()
+                if name.startswith(HEADS_PREFIX)}
+
+    def remote_branches(self) -> Dict[str, str]:
+        """远程跟踪分支 {remote/分支名: sha}，不包含 <remote>/HEAD"""
+        return {name[len(REMOTES_PREFIX):]: sha for name, sha in self.refs().items()
+                if name.startswith(REMOTES_PREFIX) and not name.endswith('/HEAD')}
+
+    def resolve(self, refname: str) -> Optional[str]:
+        """解析完整引用名（如 refs/remotes/origin/dev）为 sha"""
+        return self.refs().get(refname)
+
+    def head(self) -> Tuple[Optional[str], Optional[str]]:
+        """当前工作区的 HEAD，返回 (分支名或 None, sha 或 None)"""
+        content = _read_text(os.path.join(self.git_dir, 'HEAD')) or ''
+        if content.startswith('ref:'):
+            target = content[len('ref:'):].strip()
+            branch = target[len(HEADS_PREFIX):] if target.startswith(HEADS_PREFIX) else None
+            return branch, self.resolve(target)
+        return None, content if _is_sha(content) else None
+
+    def worktree_branches(self) -> Dict[str, str]:
+        """所有工作区中已检出的分支 {分支名: 工作区路径}"""
+        checked_out = {}
+        main_head = _read_text(os.path.join(self.common_dir, 'HEAD')) or ''
+        if main_head.startswith('ref: ' + HEADS_PREFIX):
+            checked_out[main_head[len('ref: ' + HEADS_PREFIX):]] = os.path.dirname(self.common_dir)
+        worktrees_dir = os.path.join(self.common_dir, 'worktrees')
+        if os.path.isdir(worktrees_dir):
+            for name in os.listdir(worktrees_dir):
+                head = _read_text(os.path.join(worktrees_dir, name, 'HEAD')) or ''
+                if not head.startswith('ref: ' + HEADS_PREFIX):
+                    continue
+                gitdir_file = _read_text(os.path.join(worktrees_dir, name, 'gitdir')) or ''
+                checked_out[head[len('ref: ' + HEADS_PREFIX):]] = os.path.dirname(gitdir_file)
+        return checked_out
+
+
+# 每个仓库一个引用读取器
+_stores: Dict[str, RefStore] = {}
+_stores_lock = Lock()
+
+
+def get_ref_store(repo_path: str) -> RefStore:
+    """获取仓库对应的引用读取器（按绝对路径共享）"""
+    repo_path = os.path.abspath(repo_path)
+    with _stores_lock:
+        store = _stores.get(repo_path)
+        if store is None:
+            store = RefStore(repo_path)
+            _stores[repo_path] = store
+        return store
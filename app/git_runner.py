@@ -0,0 +1,367 @@
+"""
+Git 命令执行模块 - 统一的 git 调用入口
+
+所有 git 进程都经由这里启动，统一提供：
+- 按仓库的并发控制：修改仓库状态的命令（worktree、cherry-pick 等）在同一仓库内串行执行，
+  避免后台操作和交互操作争抢 index.lock；同一仓库（包括它的各个 worktree）同时运行的命令数也有上限
+- 默认超时（网络命令更长）
+- GIT_TERMINAL_PROMPT=0，避免凭据提示卡住后台线程
+- 统一的 UTF-8 解码
+- 每次调用的耗时统计，可用于诊断
+"""
+import os
+import re
+import subprocess
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Event, Lock, RLock, Thread
+from typing import Deque, Dict, Iterator, List, Optional, Union
+
+DEFAULT_TIMEOUT = 60
+NETWORK_TIMEOUT = 300
+MAX_CONCURRENT_PER_REPO = 4
+
+# 需要在同一仓库内串行执行的子命令
+# fetch 只写引用和 FETCH_HEAD，不碰 index，且可能持续到网络超时，不在其中（重复的 fetch 由 fetch_coordinator 合并）
+MUTATING_COMMANDS = {
+    'add', 'am', 'branch', 'checkout', 'cherry-pick', 'clean', 'commit', 'gc', 'merge',
+    'pack-refs', 'prune', 'pull', 'read-tree', 'rebase', 'reset', 'restore', 'revert', 'rm',
+    'sparse-checkout', 'stash', 'switch', 'update-index', 'update-ref', 'worktree',
+}
+NETWORK_COMMANDS = {'fetch', 'pull', 'push', 'ls-remote', 'clone'}
+# 流式输出的行分隔符：换行或回车（进度行）
+_LINE_BREAK_RE = re.compile(rb'(\r\n|\n|\r)')
+
+
+class GitResult:
+    """一次 git 调用的结果"""
+
+    def __init__(self, args: List[str], returncode: int, stdout: Union[str, bytes], stderr: str,
+                 duration: float, timed_out: bool = False):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    def __repr__(self):
+        return f'GitResult({" ".join(self.args[:3])}..., returncode={self.returncode}, duration={self.duration:.3f}s)'
+
+
+class _RepoGate:
+    """单个仓库的并发闸门"""
+
+    def __init__(self):
+        self.slots = BoundedSemaphore(MAX_CONCURRENT_PER_REPO)
+        self.write_lock = RLock()
+
+
+_gates: Dict[str, _RepoGate] = {}
+# 工作目录 -> 闸门所属的公共 git 目录
+_gate_keys: Dict[str, str] = {}
+_gates_lock = Lock()
+
+_stats_lock = Lock()
+_stats: Dict[tuple, dict] = {}
+_recent_calls: Deque[dict] = deque(maxlen=200)
+_spawn_count = 0
+
+
+def git_env(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """git 子进程使用的环境变量"""
+    env = os.environ.copy()
+    env['GIT_TERMINAL_PROMPT'] = '0'
+    if extra:
+        env.update(extra)
+    return env
+
+
+def _gate_key(cwd: str) -> str:
+    """闸门按公共 git 目录区分，同一仓库的各个 worktree 共用一个闸门；不是仓库时按目录区分"""
+    key = _gate_keys.get(cwd)
+    if key is None:
+        # git_refs 依赖本模块，在这里导入以避免循环导入
+        from app.git_refs import RefStoreError, find_git_dirs
+        try:
+            _, common_dir = find_git_dirs(cwd)
+            key = os.path.normcase(os.path.abspath(common_dir))
+        except RefStoreError:
+            key = cwd
+        _gate_keys[cwd] = key
+    return key
+
+
+def _get_gate(cwd: str) -> _RepoGate:
+    key = _gate_key(cwd)
+    with _gates_lock:
+        gate = _gates.get(key)
+        if gate is None:
+            gate = _RepoGate()
+            _gates[key] = gate
+        return gate
+
+
+def subcommand_of(args: List[str]) -> str:
+    """跳过 -c key=value 等全局选项，返回子命令名"""
+    skip_next = False
+    for arg in args:
+        if skip_next:
+            skip_next = False
+            continue
+        if arg in ('-c', '-C', '--git-dir', '--work-tree'):
+            skip_next = True
+            continue
+        if arg.startswith('-'):
+            continue
+        return arg
+    return ''
+
+
+def _record(cwd: str, args: List[str], duration: float, returncode: int, timed_out: bool):
+    command = subcommand_of(args)
+    with _stats_lock:
+        entry = _stats.setdefault((cwd, command), {
+            'repo': cwd, 'command': command, 'count': 0, 'failures': 0,
+            'timeouts': 0, 'total_time': 0.0, 'max_time': 0.0,
+        })
+        entry['count'] += 1
+        entry['total_time'] += duration
+        entry['max_time'] = max(entry['max_time'], duration)
+        if returncode != 0:
+            entry['failures'] += 1
+        if timed_out:
+            entry['timeouts'] += 1
+        _recent_calls.append({
+            'repo': cwd, 'args': list(args), 'duration': duration,
+            'returncode': returncode, 'finished_at': time.time(),
+        })
+
+
+def _count_spawn():
+    global _spawn_count
+    with _stats_lock:
+        _spawn_count += 1
+
+
+@contextmanager
+def _acquire(cwd: str, args: List[str], exclusive: Optional[bool]):
+    gate = _get_gate(cwd)
+    if exclusive is None:
+        exclusive = subcommand_of(args) in MUTATING_COMMANDS
+    # 先排队等写锁再占用名额，等待中的写命令不会占满名额、挡住只读命令
+    if exclusive:
+        with gate.write_lock, gate.slots:
+            yield
+    else:
+        with gate.slots:
+            yield
+
+
+def run_git(args: List[str], cwd: str, timeout: Optional[float] = None, input: Union[str, bytes, None] = None,
+            binary: bool = False, exclusive: Optional[bool] = None,
+            env: Optional[Dict[str, str]] = None) -> GitResult:
+    """
+    执行一条 git 命令并等待结束
+
+    Args:
+        args: git 之后的参数，例如 ['fetch', 'origin']
+        cwd: 仓库目录
+        timeout: 超时秒数，默认网络命令 NETWORK_TIMEOUT、其他命令 DEFAULT_TIMEOUT
+        input: 写入 stdin 的内容
+        binary: 为 True 时 stdout 保持为 bytes
+        exclusive: 是否需要独占仓库写锁，默认按子命令判断
+        env: 额外的环境变量
+
+    Returns:
+        GitResult，超时时 returncode 为 -1 且 timed_out 为 True
+    """
+    cwd = os.path.abspath(cwd)
+    if timeout is None:
+        timeout = NETWORK_TIMEOUT if subcommand_of(args) in NETWORK_COMMANDS else DEFAULT_TIMEOUT
+    if isinstance(input, str):
+        input = input.encode('utf-8')
+
+    with _acquire(cwd, args, exclusive):
+        start = time.perf_counter()
+        _count_spawn()
+        timed_out = False
+        try:
+            completed = subprocess.run(
+                ['git', *args],
+                cwd=cwd,
+                input=input,
+                capture_output=True,
+                timeout=timeout,
+                env=git_env(env)
+            )
+            returncode, stdout, stderr = completed.returncode, completed.stdout, completed.stderr
+        except subprocess.TimeoutExpired as e:
+            timed_out = True
+            returncode = -1
+            stdout = e.stdout or b''
+            stderr = (e.stderr or b'') + f'\ngit {subcommand_of(args)} 超时（{timeout} 秒）'.encode('utf-8')
+        except OSError as e:
+            returncode, stdout, stderr = -1, b'', str(e).encode('utf-8')
+        duration = time.perf_counter() - start
+
+    _record(cwd, args, duration, returncode, timed_out)
+    if not binary:
+        stdout = stdout.decode('utf-8', errors='replace')
+    return GitResult(args, returncode, stdout, stderr.decode('utf-8', errors='replace'), duration, timed_out)
+
+
+@contextmanager
+def open_git(args: List[str], cwd: str, exclusive: Optional[bool] = None,
+             env: Optional[Dict[str, str]] = None, **popen_kwargs) -> Iterator[subprocess.Popen]:
+    """
+    以流式方式启动 git 进程，在 with 块内占用仓库并发名额，退出时记录耗时
+
+    调用方负责读取输出；with 块结束时进程若仍在运行会被终止。
+    """
+    cwd = os.path.abspath(cwd)
+    with _acquire(cwd, args, exclusive):
+        start = time.perf_counter()
+        _count_spawn()
+        process = subprocess.Popen(['git', *args], cwd=cwd, env=git_env(env), **popen_kwargs)
+        try:
+            yield process
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            _record(cwd, args, time.perf_counter() - start, process.returncode, False)
+
+
+def spawn_git(args: List[str], cwd: str, **popen_kwargs) -> subprocess.Popen:
+    """启动常驻 git 进程（如 cat-file --batch），不占用并发名额，只计入进程数统计"""
+    _count_spawn()
+    return subprocess.Popen(['git', *args], cwd=os.path.abspath(cwd), env=git_env(), **popen_kwargs)
+
+
+def get_git_stats(repo_path: Optional[str] = None) -> List[dict]:
+    """
+    按 (仓库, 子命令) 汇总的调用统计，按总耗时降序
+
+    每项包含 repo, command, count, failures, timeouts, total_time, max_time, avg_time
+    """
+    if repo_path is not None:
+        repo_path = os.path.abspath(repo_path)
+    with _stats_lock:
+        entries = [dict(e) for e in _stats.values() if repo_path is None or e['repo'] == repo_path]
+    for entry in entries:
+        entry['avg_time'] = entry['total_time'] / entry['count'] if entry['count'] else 0.0
+    return sorted(entries, key=lambda e: e['total_time'], reverse=True)
+
+
+def get_recent_git_calls(limit: int = 50) -> List[dict]:
+    """最近的 git 调用记录（最新的在前）"""
+    with _stats_lock:
+        calls = list(_recent_calls)
+    return calls[::-1][:limit]
+
+
+def get_spawn_count() -> int:
+    """进程启动以来经由本模块启动的 git 进程总数"""
+    with _stats_lock:
+        return _spawn_count
+
+
+def reset_git_stats():
+    """清空调用统计"""
+    global _spawn_count
+    with _stats_lock:
+        _stats.clear()
+        _recent_calls.clear()
+        _spawn_count = 0
+
+
+_version: Optional[tuple] = None
+
+
+def git_version() -> tuple:
+    """git 版本号，如 (2, 43, 0)，无法识别时为 (0,)；结果在进程内缓存"""
+    global _version
+    if _version is None:
+        result = run_git(['version'], os.getcwd())
+        numbers = []
+        # "git version 2.43.0" 或 "git version 2.43.0.windows.1"
+        for part in result.stdout.strip().rpartition(' ')[2].split('.'):
+            if not part.isdigit():
+                break
+            numbers.append(int(part))
+        _version = tuple(numbers) or (0,)
+    return _version
+
+
+def _terminate_on(stop: Event, process: subprocess.Popen):
+    """stop 被设置时终止仍在运行的进程；进程自行结束后返回"""
+    while not stop.wait(0.1):
+        if process.poll() is not None:
+            return
+    if process.poll() is None:
+        process.terminate()
+
+
+def run_git_streaming(args: List[str], cwd: str, on_line, exclusive: Optional[bool] = None,
+                      env: Optional[Dict[str, str]] = None, stop: Optional[Event] = None) -> GitResult:
+    """
+    执行 git 命令并逐行回调输出（stdout 与 stderr 合并）
+
+    以 \r 结尾的进度行（如 push --progress 的 "Writing objects:  45%"）也会立即回调。
+
+    Args:
+        args: git 之后的参数
+        cwd: 仓库目录
+        on_line: 每读到一行输出时调用，参数为去掉换行符的文本
+        exclusive: 是否需要独占仓库写锁，默认按子命令判断
+        env: 额外的环境变量
+        stop: 被设置时终止 git 进程（如用户取消），调用方负责清理进程留下的状态
+
+    Returns:
+        GitResult，stdout 为合并后的完整输出（进度行只保留最后一次），stderr 为空
+    """
+    lines = []
+    start = time.perf_counter()
+    with open_git(args, cwd, exclusive=exclusive, env=env, stdin=subprocess.DEVNULL,
+                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as process:
+        if stop is not None:
+            Thread(target=_terminate_on, args=(stop, process), name='git-stop-watch', daemon=True).start()
+        try:
+            pending = b''
+            replace_last = False
+            while True:
+                chunk = process.stdout.read1(4096)
+                if not chunk:
+                    break
+                pending += chunk
+                # 末尾的 \r 可能是被拆开的 \r\n，留到下次再判断
+                held = b'\r' if pending.endswith(b'\r') else b''
+                parts = _LINE_BREAK_RE.split(pending[:len(pending) - len(held)])
+                pending = parts.pop() + held
+                for text, separator in zip(parts[::2], parts[1::2]):
+                    line = text.decode('utf-8', errors='replace')
+                    if replace_last:
+                        lines[-1] = line
+                    else:
+                        lines.append(line)
+                    # 进度行会被下一行覆盖
+                    replace_last = separator == b'\r'
+                    on_line(line)
+            pending = pending.rstrip(b'\r')
+            if pending:
+                line = pending.decode('utf-8', errors='replace')
+                if replace_last:
+                    lines[-1] = line
+                else:
+                    lines.append(line)
+                on_line(line)
+        finally:
+            process.stdout.close()
+        returncode = process.wait()
+    return GitResult(args, returncode, '\n'.join(lines), '', time.perf_counter() - start)
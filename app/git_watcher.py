@@ -2,13 +2,14 @@
 Git 仓库监听模块 - 监听 Git 仓库的提交变化
 """
 import os
-import subprocess
-import shelve
 from threading import Thread, Lock
 from typing import Dict, List, Callable, Optional
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileModifiedEvent
 
+from app.cache_store import open_cache
+from app.git_runner import run_git
+
 
 class CreateMRRequest:
     """创建 MR 请求"""
@@ -34,23 +35,11 @@ class GitEventHandler(FileSystemEventHandler):
         """获取当前最新提交信息"""
         try:
             # 获取当前分支名
-            branch_result = subprocess.run(
-                ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
-                cwd=self.repo_path,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            current_branch = branch_result.stdout.strip() if branch_result.returncode == 0 else 'HEAD'
-
-            result = subprocess.run(
-                ['git', 'log', '-1', '--pretty=%H|%s|%an|%ai'],
-                cwd=self.repo_path,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            if result.returncode == 0:
+            branch_result = run_git(['rev-parse', '--abbrev-ref', 'HEAD'], self.repo_path)
+            current_branch = branch_result.stdout.strip() if branch_result.ok else 'HEAD'
+
+            result = run_git(['log', '-1', '--pretty=%H|%s|%an|%ai'], self.repo_path)
+            if result.ok:
                 parts = result.stdout.strip().split('|')
                 if len(parts) >= 4:
                     return {
@@ -185,7 +174,7 @@ class GitWatcher:
     def _load_commits_from_cache(self):
         """从缓存加载提交历史"""
         try:
-            with shelve.open('cache.db') as db:
+            with open_cache() as db:
                 cached_commits = db.get(self.CACHE_KEY, [])
                 # 只保留最近的 max_commits 条
                 self.commits = cached_commits[:self.max_commits] if cached_commits else []
@@ -195,7 +184,7 @@ class GitWatcher:
     def _save_commits_to_cache(self):
         """保存提交历史到缓存"""
         try:
-            with shelve.open('cache.db', writeback=False) as db:
+            with open_cache() as db:
                 db[self.CACHE_KEY] = self.commits.copy()
         except Exception:
             pass
@@ -0,0 +1,94 @@
+"""
+GitLab 客户端模块 - 按 (url, token) 共享已认证的 gitlab.Gitlab 实例
+
+创建 MR、获取用户列表等调用原先每次都新建客户端并调用 gl.auth()，每次都要重新建立 TLS 连接并多一次 /user 请求。
+经由这里获取客户端后：
+- 同一 (url, token) 在进程内只有一个客户端，底层 requests.Session 保持长连接并按主机复用连接池
+- 认证在第一次使用时进行，成功后不再重复；失败时不缓存结果，下次调用重新认证
+- 配置中的 URL 或 token 改变时调用 close_gitlab_clients()，关闭旧凭据对应的客户端
+- token 被吊销或轮换后请求返回 401 时调用 invalidate_gitlab_client()，丢弃已认证的客户端
+"""
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import gitlab
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个主机保留的连接数，批量创建 MR 等并发请求共用
+POOL_MAXSIZE = 10
+
+
+def _client_key(url: str, token: str) -> Tuple[str, str]:
+    return (url or '').strip().rstrip('/'), (token or '').strip()
+
+
+class _Client:
+    """一个 (url, token) 对应的客户端，认证结果在首次使用时确定"""
+
+    def __init__(self, url: str, token: str):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.gl = gitlab.Gitlab(url=url, private_token=token, session=self.session)
+        self._lock = Lock()
+        self._authenticated = False
+
+    def authenticated(self) -> gitlab.Gitlab:
+        with self._lock:
+            if not self._authenticated:
+                self.gl.auth()
+                self._authenticated = True
+        return self.gl
+
+    def close(self):
+        self.session.close()
+
+
+_clients: Dict[Tuple[str, str], _Client] = {}
+_clients_lock = Lock()
+
+
+def get_gitlab_client(url: str, token: str) -> gitlab.Gitlab:
+    """
+    获取 (url, token) 对应的已认证客户端（进程内共享）
+
+    Raises:
+        gitlab.exceptions.GitlabError 等: 认证失败或无法连接，与 gl.auth() 相同
+    """
+    key = _client_key(url, token)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _Client(*key)
+            _clients[key] = client
+    return client.authenticated()
+
+
+def invalidate_gitlab_client(url: str, token: str):
+    """丢弃 (url, token) 对应的客户端，下次获取时重新连接并认证（如服务端返回 401 后）"""
+    with _clients_lock:
+        client = _clients.pop(_client_key(url, token), None)
+    if client is not None:
+        client.close()
+
+
+def is_authentication_error(error: BaseException) -> bool:
+    """error（或引发它的异常，如包装后的 ProjectResolveError）是否为 GitLab 拒绝凭据（401）"""
+    while error is not None:
+        if isinstance(error, gitlab.exceptions.GitlabAuthenticationError) or \
+                getattr(error, 'response_code', None) == 401:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def close_gitlab_clients(keep_url: Optional[str] = None, keep_token: Optional[str] = None):
+    """关闭所有客户端；给出 keep_url/keep_token 时保留当前配置对应的客户端"""
+    keep = _client_key(keep_url, keep_token) if keep_url is not None else None
+    with _clients_lock:
+        stale = [key for key in _clients if key != keep]
+        clients = [_clients.pop(key) for key in stale]
+    for client in clients:
+        client.close()
@@ -0,0 +1,189 @@
+"""
+GitLab 项目解析模块 - 由工作区的 git 远程地址确定 GitLab 项目 id，并按工作区缓存
+
+支持的远程地址形式：
+- http(s)://[user[:token]@]host[:port]/[前缀/]group/sub/project[.git]
+- ssh://[user@]host[:port]/group/project[.git]
+- user@host:group/project[.git]（scp 风格）
+
+解析出的项目 id 连同远程地址保存在 cache.db 中（按工作区路径区分），远程地址不变时直接使用缓存的 id，
+创建 MR 时无需再调用 projects.get；远程地址改变或调用方要求时才重新查询。
+远程地址本身也在进程内按工作区缓存，创建 MR（包括批量创建）时不再每次执行 git remote -v，
+缓存的项目返回 404 时随项目一起重新读取。
+"""
+import os
+import re
+from threading import Lock
+from typing import Dict, Optional
+from urllib.parse import unquote, urlparse
+
+from app.cache_store import CACHE_FILE, read_cache, update_cache
+from app.git_runner import run_git
+
+CACHE_KEY = 'gitlab_projects'
+# scp 风格：[user@]host:path，host 中不含 /
+_SCP_RE = re.compile(r'^(?:[^@/]+@)?(?P<host>[^:/]+):(?P<path>.+)$')
+# Windows 本地路径（C:/repo、C:\\repo）不是 scp 风格地址
+_WINDOWS_PATH_RE = re.compile(r'^[A-Za-z]:[\\/]')
+
+
+class ProjectResolveError(Exception):
+    """无法确定工作区对应的 GitLab 项目"""
+
+
+def parse_remote_url(remote_url: str, base_path: str = '') -> Optional[str]:
+    """
+    从远程地址中取出项目路径（如 group/sub/project）
+
+    Args:
+        remote_url: git 远程地址
+        base_path: GitLab 部署在子路径下时（如 http://host/gitlab）的路径前缀，http(s) 地址会去掉这一段
+
+    Returns:
+        项目路径，无法识别时返回 None
+    """
+    remote_url = remote_url.strip()
+    if '://' in remote_url:
+        parsed = urlparse(remote_url)
+        if parsed.scheme not in ('http', 'https', 'ssh', 'git+ssh') or not parsed.hostname:
+            return None
+        path = unquote(parsed.path)
+        base_path = base_path.strip('/')
+        if parsed.scheme in ('http', 'https') and base_path and path.strip('/').startswith(base_path + '/'):
+            path = path.strip('/')[len(base_path):]
+    else:
+        match = None if _WINDOWS_PATH_RE.match(remote_url) else _SCP_RE.match(remote_url)
+        if not match:
+            return None
+        path = match.group('path')
+
+    path = path.strip('/')
+    if path.endswith('.git'):
+        path = path[:-len('.git')]
+    # GitLab 项目至少有 namespace/project 两级
+    return path if '/' in path else None
+
+
+def get_remote_url(repo_path: str) -> Optional[str]:
+    """工作区的远程地址（去掉其中的用户名和密码）：优先 origin，否则第一个远程；没有远程时返回 None"""
+    result = run_git(['remote', '-v'], repo_path)
+    if not result.ok:
+        raise ProjectResolveError(f'Could not get remote URL: {result.stderr.strip()}')
+    remotes = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            remotes.setdefault(parts[0], parts[1])
+    remote_url = remotes.get('origin') or next(iter(remotes.values()), None)
+    if remote_url and '://' in remote_url:
+        # http(s)://user:token@host/... 中的凭据不写入缓存
+        parsed = urlparse(remote_url)
+        remote_url = parsed._replace(netloc=parsed.netloc.rpartition('@')[2]).geturl()
+    return remote_url
+
+
+class ProjectResolver:
+    """
+    单个工作区的项目解析器，线程安全
+
+    缓存记录: {'remote_url': 解析时的远程地址, 'project_id', 'project_path'}
+    """
+
+    def __init__(self, repo_path: str, path: str = CACHE_FILE):
+        self.repo_path = os.path.abspath(repo_path)
+        self.path = path
+        self._lock = Lock()
+        self._record: Optional[dict] = None
+        self._loaded = False
+        self._remote_url: Optional[str] = None
+
+    def _load(self) -> Optional[dict]:
+        if not self._loaded:
+            self._record = read_cache(CACHE_KEY, {}, self.path).get(self.repo_path)
+            self._loaded = True
+        return self._record
+
+    def _save(self):
+        def update(records):
+            records = dict(records)
+            if self._record is None:
+                records.pop(self.repo_path, None)
+            else:
+                records[self.repo_path] = self._record
+            return records
+
+        update_cache(CACHE_KEY, update, {}, self.path)
+
+    def cached_project_id(self, remote_url: str) -> Optional[int]:
+        """remote_url 与缓存时一致时返回缓存的项目 id"""
+        with self._lock:
+            record = self._load()
+        if record is not None and record['remote_url'] == remote_url:
+            return record['project_id']
+        return None
+
+    def remote_url(self, use_cache: bool = True) -> Optional[str]:
+        """工作区的远程地址（见 get_remote_url），首次读取后缓存；use_cache 为 False 时重新读取"""
+        with self._lock:
+            remote_url = self._remote_url if use_cache else None
+        if remote_url is None:
+            remote_url = get_remote_url(self.repo_path)
+            with self._lock:
+                self._remote_url = remote_url
+        return remote_url
+
+    def resolve(self, gl, use_cache: bool = True) -> int:
+        """
+        工作区对应的 GitLab 项目 id
+
+        Args:
+            gl: 已认证的 gitlab.Gitlab
+            use_cache: 为 False 时忽略缓存，重新读取远程地址并查询项目（如缓存的项目返回 404）
+
+        Raises:
+            ProjectResolveError: 没有远程、无法识别远程地址或 GitLab 中找不到项目
+        """
+        remote_url = self.remote_url(use_cache)
+        if not remote_url:
+            raise ProjectResolveError('No git remote configured')
+        if use_cache:
+            project_id = self.cached_project_id(remote_url)
+            if project_id is not None:
+                return project_id
+
+        project_path = parse_remote_url(remote_url, urlparse(gl.url).path)
+        if project_path is None:
+            raise ProjectResolveError(f'Unrecognized remote URL: {remote_url}')
+        try:
+            project = gl.projects.get(project_path)
+        except Exception as e:
+            raise ProjectResolveError(f'Could not find project {project_path}: {e}')
+
+        with self._lock:
+            self._record = {'remote_url': remote_url, 'project_id': project.id, 'project_path': project_path}
+            self._loaded = True
+            self._save()
+        return project.id
+
+    def invalidate(self):
+        with self._lock:
+            self._remote_url = None
+            self._load()
+            if self._record is not None:
+                self._record = None
+                self._save()
+
+
+_resolvers: Dict[str, ProjectResolver] = {}
+_resolvers_lock = Lock()
+
+
+def get_project_resolver(repo_path: str) -> ProjectResolver:
+    """获取工作区对应的项目解析器（按绝对路径共享）"""
+    repo_path = os.path.abspath(repo_path)
+    with _resolvers_lock:
+        resolver = _resolvers.get(repo_path)
+        if resolver is None:
+            resolver = ProjectResolver(repo_path)
+            _resolvers[repo_path] = resolver
+        return resolver
@@ -0,0 +1,68 @@
+"""
+GitLab 用户 id 缓存模块 - 记住用户名对应的用户 id，创建 MR 时不必每次查询指派人和审查者
+
+用户名到 id 的对应关系几乎不变，缓存保存在内存和 cache.db 中（按 GitLab 地址区分），
+超过 TTL 的条目视为过期重新查询；GitLab 返回 404（用户已被删除等）时调用方应调用 invalidate()。
+"""
+import time
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from app.cache_store import CACHE_FILE, read_cache, write_cache
+
+CACHE_KEY = 'gitlab_user_ids'
+# 条目有效期（秒）
+TTL = 7 * 24 * 3600
+
+
+def _entry_key(url: str, username: str) -> Tuple[str, str]:
+    return (url or '').strip().rstrip('/'), (username or '').strip().lower()
+
+
+class UserIdCache:
+    """线程安全的用户名 → 用户 id 缓存，条目为 {(url, 小写用户名): (用户 id, 解析时间)}"""
+
+    def __init__(self, path: str = CACHE_FILE, ttl: float = TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries: Optional[Dict[Tuple[str, str], Tuple[int, float]]] = None
+
+    def _load(self) -> Dict[Tuple[str, str], Tuple[int, float]]:
+        if self._entries is None:
+            self._entries = dict(read_cache(CACHE_KEY, {}, self.path))
+        return self._entries
+
+    def _save(self):
+        write_cache(CACHE_KEY, self._entries, self.path)
+
+    def get(self, url: str, username: str) -> Optional[int]:
+        """缓存的用户 id，没有或已过期时返回 None"""
+        with self._lock:
+            entry = self._load().get(_entry_key(url, username))
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def put(self, url: str, username: str, user_id: int):
+        with self._lock:
+            self._load()[_entry_key(url, username)] = (user_id, time.time())
+            self._save()
+
+    def invalidate(self, url: str, username: str):
+        with self._lock:
+            if self._load().pop(_entry_key(url, username), None) is not None:
+                self._save()
+
+
+_default_cache: Optional[UserIdCache] = None
+_default_cache_lock = Lock()
+
+
+def get_user_id_cache() -> UserIdCache:
+    """进程内共享的用户 id 缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = UserIdCache()
+        return _default_cache
@@ -0,0 +1,140 @@
+"""
+GitLab 用户目录模块 - 在本地保存 GitLab 用户列表（username、id、name、state），指派人/审查者下拉框直接从这里读取
+
+逐页拉取全部用户在几千人的实例上需要几十秒，因此目录按 GitLab 地址保存在 cache.db 中，同步在后台进行：
+- 首次同步和每隔 FULL_SYNC_INTERVAL 的完整同步逐页（PAGE_SIZE 个一页）拉取全部用户，以捕获改名、停用等变化
+- 其余同步为增量同步：按 id 倒序分页，遇到已知的最大 id 即停止，只取新注册的用户；
+  /users 接口没有 updated_after 这类按更新时间过滤的参数，已有用户的变化留给完整同步
+- 同一实例的同步互斥，max_age 秒内同步过的请求直接返回
+"""
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+from app.cache_store import CACHE_FILE, read_cache, update_cache
+from app.gitlab_clients import get_gitlab_client
+
+CACHE_KEY = 'gitlab_users'
+PAGE_SIZE = 100
+# 完整同步的间隔（秒）
+FULL_SYNC_INTERVAL = 24 * 3600
+# 不出现在下拉框中的用户状态
+INACTIVE_STATES = {'blocked', 'deactivated', 'banned', 'blocked_pending_approval'}
+
+
+def _directory_key(url: str) -> str:
+    return (url or '').strip().rstrip('/')
+
+
+class GitLabUserDirectory:
+    """
+    单个 GitLab 实例的用户目录，线程安全
+
+    记录格式: {'users': {id: {'id', 'username', 'name', 'state'}}, 'max_id', 'synced_at', 'full_synced_at'}
+    """
+
+    def __init__(self, url: str, path: str = CACHE_FILE):
+        self.url = _directory_key(url)
+        self.path = path
+        self._lock = Lock()
+        self._sync_lock = Lock()
+        self._record: Optional[dict] = None
+
+    def _load(self) -> dict:
+        if self._record is None:
+            record = read_cache(CACHE_KEY, {}, self.path).get(self.url)
+            self._record = record or {'users': {}, 'max_id': 0, 'synced_at': 0.0, 'full_synced_at': 0.0}
+        return self._record
+
+    def _save(self):
+        update_cache(CACHE_KEY, lambda directories: {**directories, self.url: self._record}, {}, self.path)
+
+    def users(self, include_inactive: bool = False) -> List[dict]:
+        """目录中的用户，按用户名排序"""
+        with self._lock:
+            users = [dict(u) for u in self._load()['users'].values()]
+        if not include_inactive:
+            users = [u for u in users if u.get('state') not in INACTIVE_STATES]
+        return sorted(users, key=lambda u: u['username'].lower())
+
+    def usernames(self) -> List[str]:
+        """下拉框使用的用户名列表（不含已停用的用户）"""
+        return [u['username'] for u in self.users()]
+
+    def find(self, username: str) -> Optional[dict]:
+        """按用户名查找（不区分大小写），目录中没有时返回 None"""
+        lowered = username.lower()
+        with self._lock:
+            for user in self._load()['users'].values():
+                if user['username'].lower() == lowered:
+                    return dict(user)
+        return None
+
+    @property
+    def synced_at(self) -> float:
+        with self._lock:
+            return self._load()['synced_at']
+
+    def sync(self, token: str, max_age: float = 0, full: Optional[bool] = None) -> int:
+        """
+        从 GitLab 同步目录
+
+        Args:
+            token: 私有 Token
+            max_age: 距上次同步不超过该秒数时直接返回
+            full: 是否完整同步，默认目录为空或距上次完整同步超过 FULL_SYNC_INTERVAL 时完整同步
+
+        Returns:
+            新增或变化的用户数
+
+        Raises:
+            gitlab 的异常: 认证失败或请求失败，目录保持不变
+        """
+        with self._sync_lock:
+            with self._lock:
+                record = self._load()
+                if max_age and time.time() - record['synced_at'] <= max_age:
+                    return 0
+                if full is None:
+                    full = not record['users'] or time.time() - record['full_synced_at'] > FULL_SYNC_INTERVAL
+                known_max_id = record['max_id']
+
+            gl = get_gitlab_client(self.url, token)
+            fetched: Dict[int, dict] = {}
+            # 倒序分页：增量同步遇到已知的最大 id 就不必继续翻页
+            for user in gl.users.list(iterator=True, per_page=PAGE_SIZE, order_by='id', sort='desc'):
+                if not full and user.id <= known_max_id:
+                    break
+                if getattr(user, 'username', None):
+                    fetched[user.id] = {'id': user.id, 'username': user.username,
+                                        'name': getattr(user, 'name', ''), 'state': getattr(user, 'state', '')}
+
+            now = time.time()
+            with self._lock:
+                record = self._load()
+                users = {} if full else dict(record['users'])
+                changed = sum(1 for user_id, user in fetched.items() if record['users'].get(user_id) != user)
+                users.update(fetched)
+                self._record = {
+                    'users': users,
+                    'max_id': max(users, default=0),
+                    'synced_at': now,
+                    'full_synced_at': now if full else record['full_synced_at'],
+                }
+                self._save()
+            return changed
+
+
+_directories: Dict[str, GitLabUserDirectory] = {}
+_directories_lock = Lock()
+
+
+def get_user_directory(url: str) -> GitLabUserDirectory:
+    """获取 GitLab 实例对应的用户目录（按地址共享）"""
+    key = _directory_key(url)
+    with _directories_lock:
+        directory = _directories.get(key)
+        if directory is None:
+            directory = GitLabUserDirectory(key)
+            _directories[key] = directory
+        return directory
@@ -0,0 +1,152 @@
+"""
+Patch-id 索引模块 - 用 git patch-id --stable 判断提交是否已经以其他哈希存在于目标分支
+
+对目标分支最近的历史计算 patch-id 建立索引（按目标分支 tip 缓存，分支移动后自然失效），
+候选提交的 patch-id 在索引中即说明内容已被 cherry-pick 过，无需实际模拟就能在提交列表中标记。
+"""
+import os
+import subprocess
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Set
+
+from app.git_object_reader import get_object_reader
+from app.git_runner import open_git, spawn_git
+
+# 建立索引时扫描的目标分支提交数上限
+MAX_HISTORY = 1000
+# log -p | patch-id 整条管道的超时（秒）
+PIPE_TIMEOUT = 120
+# 每个仓库保留索引的目标 tip 数
+MAX_CACHED_TIPS = 8
+# log -p 的输出格式，两侧必须一致；关闭颜色和外部 diff 工具，保证 patch-id 稳定
+_LOG_PATCH_ARGS = ['log', '-p', '--no-color', '--no-ext-diff', '--no-merges', '--format=commit %H']
+
+
+class PatchIdError(Exception):
+    """无法计算 patch-id"""
+
+
+def _compute_patch_ids(repo_path: str, rev_args: List[str]) -> Dict[str, str]:
+    """
+    计算一组提交的 patch-id
+
+    Returns:
+        {提交哈希: patch-id}，空提交没有 patch-id，不出现在结果中
+
+    Raises:
+        PatchIdError: git 命令失败
+    """
+    # log -p 的输出直接接到 patch-id 的标准输入，上千个提交的补丁不在内存中缓冲；
+    # log 的 stderr 写入临时文件，避免管道写满后两个进程互相等待
+    with tempfile.TemporaryFile() as log_errors, \
+            open_git(_LOG_PATCH_ARGS + rev_args, repo_path, stdin=subprocess.DEVNULL,
+                     stdout=subprocess.PIPE, stderr=log_errors) as log:
+        # patch-id 是同一条管道的一部分，不另占仓库的并发名额
+        patch_id = spawn_git(['patch-id', '--stable'], repo_path, stdin=log.stdout,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        log.stdout.close()
+        try:
+            output, errors = patch_id.communicate(timeout=PIPE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            patch_id.kill()
+            patch_id.communicate()
+            raise PatchIdError(f'计算 patch-id 超时（{PIPE_TIMEOUT} 秒）')
+        if log.wait() != 0:
+            log_errors.seek(0)
+            message = log_errors.read().decode('utf-8', errors='replace').strip()
+            raise PatchIdError(message or f'git log 失败，错误代码: {log.returncode}')
+        if patch_id.returncode != 0:
+            message = errors.decode('utf-8', errors='replace').strip()
+            raise PatchIdError(message or f'git patch-id 失败，错误代码: {patch_id.returncode}')
+
+    patch_ids = {}
+    for line in output.decode('utf-8', errors='replace').splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            patch_id, commit_hash = parts
+            patch_ids[commit_hash] = patch_id
+    return patch_ids
+
+
+class PatchIdIndex:
+    """
+    单个仓库的 patch-id 索引，线程安全
+
+    - 目标分支索引按 tip 缓存，保留最近使用的 MAX_CACHED_TIPS 个
+    - 提交的 patch-id 由内容决定，按提交哈希永久缓存
+    """
+
+    def __init__(self, repo_path: str, max_history: int = MAX_HISTORY):
+        self.repo_path = os.path.abspath(repo_path)
+        self.max_history = max_history
+        self._lock = Lock()
+        self._target_indexes: OrderedDict = OrderedDict()
+        self._commit_patch_ids: Dict[str, str] = {}
+
+    def _target_index(self, target_sha: str) -> Set[str]:
+        with self._lock:
+            index = self._target_indexes.get(target_sha)
+            if index is not None:
+                self._target_indexes.move_to_end(target_sha)
+                return index
+
+        patch_ids = _compute_patch_ids(self.repo_path, [f'--max-count={self.max_history}', target_sha])
+        index = set(patch_ids.values())
+        with self._lock:
+            self._target_indexes[target_sha] = index
+            while len(self._target_indexes) > MAX_CACHED_TIPS:
+                self._target_indexes.popitem(last=False)
+        return index
+
+    def _patch_ids_of(self, commit_hashes: List[str]) -> Dict[str, str]:
+        with self._lock:
+            missing = [h for h in commit_hashes if h not in self._commit_patch_ids]
+        if missing:
+            computed = _compute_patch_ids(self.repo_path, ['--no-walk=unsorted'] + missing)
+            with self._lock:
+                for commit_hash in missing:
+                    # 空提交记为 ''，避免重复计算
+                    self._commit_patch_ids[commit_hash] = computed.get(commit_hash, '')
+        with self._lock:
+            return {h: self._commit_patch_ids[h] for h in commit_hashes}
+
+    def already_applied(self, target: str, commit_hashes: List[str]) -> Set[str]:
+        """
+        找出内容已存在于目标分支的提交
+
+        Args:
+            target: 目标分支或提交
+            commit_hashes: 候选提交的完整哈希
+
+        Returns:
+            patch-id 出现在目标分支最近 max_history 个提交中的候选提交
+
+        Raises:
+            PatchIdError: 找不到目标分支或 git 命令失败
+        """
+        target_commit = get_object_reader(self.repo_path).read_commit(target)
+        if target_commit is None:
+            raise PatchIdError(f'找不到目标分支 {target}')
+        if not commit_hashes:
+            return set()
+        index = self._target_index(target_commit['hash'])
+        patch_ids = self._patch_ids_of(commit_hashes)
+        return {h for h, patch_id in patch_ids.items() if patch_id and patch_id in index}
+
+
+# 每个仓库一个索引
+_indexes: Dict[str, PatchIdIndex] = {}
+_indexes_lock = Lock()
+
+
+def get_patch_id_index(repo_path: str) -> PatchIdIndex:
+    """获取仓库对应的 patch-id 索引（按绝对路径共享）"""
+    repo_path = os.path.abspath(repo_path)
+    with _indexes_lock:
+        index = _indexes.get(repo_path)
+        if index is None:
+            index = PatchIdIndex(repo_path)
+            _indexes[repo_path] = index
+        return index
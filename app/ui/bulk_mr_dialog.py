@@ -0,0 +1,254 @@
+"""
+批量创建 Merge Request 对话框 - 为一组 <名称>__from__<目标> 分支并发创建 MR，逐分支显示地址或错误
+"""
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QLabel, QCheckBox, QMessageBox, QWidget,
+    QSpinBox, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QDialogButtonBox
+)
+from PyQt5.QtCore import Qt, QThread, QUrl, pyqtSignal
+from PyQt5.QtGui import QColor, QDesktopServices
+
+from quick_generate_mr_form import MAX_PARALLEL_MRS, find_bulk_mr_branches, generate_mrs
+from app.async_utils import run_blocking
+from app.gitlab_clients import POOL_MAXSIZE
+
+
+class BulkMRWorker(QThread):
+    """在后台线程中批量创建 MR，每个分支完成时发出 result"""
+
+    result = pyqtSignal(object)
+    all_finished = pyqtSignal(object)
+
+    def __init__(self, repo_path, gitlab_url, token, assignee, reviewer, source_branches,
+                 title_template, description_template, max_workers, parent=None):
+        super().__init__(parent)
+        self.args = (repo_path, gitlab_url, token, assignee, reviewer, source_branches,
+                     title_template, description_template)
+        self.max_workers = max_workers
+
+    def run(self):
+        results = []
+        try:
+            results = generate_mrs(*self.args, max_workers=self.max_workers, on_result=self.result.emit)
+        finally:
+            # 出现意外异常时也要通知对话框结束，否则对话框无法关闭
+            self.all_finished.emit(results)
+
+
+class BulkMRDialog(QDialog):
+    """按分支前缀找出 __from__ 分支，确认后并发创建 MR"""
+
+    def __init__(self, repo_path, gitlab_url, token, assignee, reviewer, title_template, description_template,
+                 prefix='', parent=None):
+        super().__init__(parent)
+        self.repo_path = repo_path
+        self.gitlab_url = gitlab_url
+        self.token = token
+        self.assignee = assignee
+        self.reviewer = reviewer
+        self.title_template = title_template
+        self.description_template = description_template
+        self.is_executing = False
+        self.worker = None
+        # 源分支 -> 表格行号
+        self.branch_rows = {}
+        self.branch_checkboxes = []
+
+        self.setWindowTitle('批量创建 Merge Request')
+        self.setMinimumWidth(800)
+        self.setMinimumHeight(500)
+        self.initUI(prefix)
+        self.run_find_branches()
+
+    def initUI(self, prefix):
+        layout = QVBoxLayout()
+        layout.setSpacing(12)
+
+        self.title_label = QLabel('<b>为匹配前缀的 __from__ 分支批量创建 MR</b>')
+        self.title_label.setStyleSheet('font-size: 16px; color: #2c3e50;')
+        layout.addWidget(self.title_label)
+
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(QLabel('分支前缀:'))
+        self.prefix_input = QLineEdit(prefix)
+        self.prefix_input.returnPressed.connect(self.run_find_branches)
+        search_layout.addWidget(self.prefix_input)
+        self.find_button = QPushButton('查找分支')
+        self.find_button.clicked.connect(self.run_find_branches)
+        search_layout.addWidget(self.find_button)
+        search_layout.addWidget(QLabel('并发数:'))
+        self.concurrency_spin = QSpinBox()
+        # 并发请求共用一个连接池，超过池大小没有意义
+        self.concurrency_spin.setRange(1, POOL_MAXSIZE)
+        self.concurrency_spin.setValue(MAX_PARALLEL_MRS)
+        search_layout.addWidget(self.concurrency_spin)
+        layout.addLayout(search_layout)
+
+        info_label = QLabel(f'<b>指派人:</b> {self.assignee or "-"}　　<b>审查者:</b> {self.reviewer or "-"}　　'
+                            f'标题和描述按各分支最后一个提交生成')
+        info_label.setStyleSheet('color: #3498db;')
+        layout.addWidget(info_label)
+
+        # 分支表格：选择 / 源分支 / 目标分支 / 结果
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(['选择', '源分支', '目标分支', '结果'])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Fixed)
+        header.setSectionResizeMode(1, QHeaderView.Stretch)
+        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.setColumnWidth(0, 50)
+        # 双击已创建的行在浏览器中打开 MR
+        self.table.cellDoubleClicked.connect(self.open_mr_url)
+        layout.addWidget(self.table)
+
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        self.summary_label.setVisible(False)
+        layout.addWidget(self.summary_label)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Yes | QDialogButtonBox.No)
+        self.confirm_button = self.button_box.button(QDialogButtonBox.Yes)
+        self.cancel_button = self.button_box.button(QDialogButtonBox.No)
+        self.confirm_button.setText('创建全部')
+        self.cancel_button.setText('关闭')
+        self.confirm_button.setEnabled(False)
+        self.button_box.accepted.connect(self.start_creation)
+        self.button_box.rejected.connect(self.reject)
+        layout.addWidget(self.button_box)
+
+        self.setLayout(layout)
+
+    def run_find_branches(self):
+        if self.is_executing:
+            return
+        prefix = self.prefix_input.text().strip()
+        self.find_button.setEnabled(False)
+        self.confirm_button.setEnabled(False)
+
+        def _find():
+            return find_bulk_mr_branches(self.repo_path, prefix)
+
+        def on_success(branches):
+            self.find_button.setEnabled(True)
+            self.show_branches(branches)
+
+        def on_error(e):
+            self.find_button.setEnabled(True)
+            QMessageBox.warning(self, '错误', f'获取本地分支失败: {e}')
+
+        run_blocking(_find, on_success=on_success, on_error=on_error, parent=self)
+
+    def show_branches(self, branches):
+        """填充分支表格，branches 为 [(源分支, 目标分支或 None)]"""
+        self.table.setRowCount(len(branches))
+        self.branch_rows = {}
+        self.branch_checkboxes = []
+        self.summary_label.setVisible(False)
+        for row, (source_branch, target_branch) in enumerate(branches):
+            checkbox = QCheckBox()
+            checkbox.setChecked(bool(target_branch))
+            checkbox.setEnabled(bool(target_branch))
+            checkbox_widget = QWidget()
+            checkbox_layout = QHBoxLayout(checkbox_widget)
+            checkbox_layout.addWidget(checkbox)
+            checkbox_layout.setAlignment(Qt.AlignCenter)
+            checkbox_layout.setContentsMargins(0, 0, 0, 0)
+            self.table.setCellWidget(row, 0, checkbox_widget)
+            self.branch_checkboxes.append((checkbox, source_branch))
+
+            self.table.setItem(row, 1, QTableWidgetItem(source_branch))
+            self.table.setItem(row, 2, QTableWidgetItem(target_branch or '-'))
+            self.table.setItem(row, 3, QTableWidgetItem('' if target_branch else '无法从分支名解析目标分支'))
+            self.branch_rows[source_branch] = row
+
+        self.title_label.setText(f'<b>找到 {len(branches)} 个匹配的 __from__ 分支</b>')
+        self.confirm_button.setEnabled(any(checkbox.isEnabled() for checkbox, _ in self.branch_checkboxes))
+
+    def _set_result(self, source_branch, text, color=None):
+        row = self.branch_rows[source_branch]
+        item = self.table.item(row, 3)
+        item.setText(text)
+        item.setToolTip(text)
+        if color:
+            for col in (1, 2, 3):
+                self.table.item(row, col).setBackground(QColor(color))
+
+    def start_creation(self):
+        source_branches = [branch for checkbox, branch in self.branch_checkboxes if checkbox.isChecked()]
+        if not source_branches:
+            QMessageBox.warning(self, '提示', '请至少选择一个分支。')
+            return
+        if not self.assignee or not self.reviewer:
+            QMessageBox.warning(self, '提示', '请先在创建 MR 页面选择指派人和审查者。')
+            return
+        reply = QMessageBox.question(self, '确认批量创建 Merge Request 吗？',
+                                     f'将为 {len(source_branches)} 个分支创建 MR\n'
+                                     f'指派人: {self.assignee}\n审查者: {self.reviewer}',
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.No:
+            return
+
+        self.is_executing = True
+        self.title_label.setText(f'<b>正在创建 {len(source_branches)} 个 MR...</b>')
+        self.title_label.setStyleSheet('font-size: 16px; color: #27ae60;')
+        for checkbox, branch in self.branch_checkboxes:
+            if checkbox.isChecked():
+                self._set_result(branch, '创建中...')
+            checkbox.setEnabled(False)
+        self.prefix_input.setEnabled(False)
+        self.find_button.setEnabled(False)
+        self.concurrency_spin.setEnabled(False)
+        self.confirm_button.setEnabled(False)
+        self.cancel_button.setEnabled(False)
+
+        self.worker = BulkMRWorker(self.repo_path, self.gitlab_url, self.token, self.assignee, self.reviewer,
+                                   source_branches, self.title_template, self.description_template,
+                                   self.concurrency_spin.value(), self)
+        self.worker.result.connect(self.on_result)
+        self.worker.all_finished.connect(self.on_all_finished)
+        self.worker.start()
+
+    def on_result(self, result):
+        if result['error']:
+            self._set_result(result['source_branch'], f'❌ {result["error"]}', '#ffcccc')
+        else:
+            self._set_result(result['source_branch'], f'✅ {result["url"]}', '#d4edda')
+
+    def on_all_finished(self, results):
+        self.is_executing = False
+        self.worker = None
+        # 意外中断时没有返回结果的分支
+        for row in range(self.table.rowCount()):
+            if self.table.item(row, 3).text() == '创建中...':
+                self._set_result(self.table.item(row, 1).text(), '❌ 未完成（执行中断）', '#ffcccc')
+        succeeded = [r for r in results if not r['error']]
+        failed = [r for r in results if r['error']]
+        parts = [f'✅ 成功 {len(succeeded)} 个']
+        if failed:
+            parts.append(f'❌ 失败 {len(failed)} 个: {", ".join(r["source_branch"] for r in failed)}')
+        if succeeded:
+            parts.append('双击成功的行可在浏览器中打开 MR')
+        self.summary_label.setText('\n'.join(parts))
+        self.summary_label.setVisible(True)
+        if failed:
+            self.title_label.setText('<b>⚠️ 部分 MR 未能创建</b>')
+            self.title_label.setStyleSheet('font-size: 16px; color: #e74c3c;')
+        else:
+            self.title_label.setText('<b>✅ 批量创建 MR 完成</b>')
+        self.confirm_button.setVisible(False)
+        self.cancel_button.setEnabled(True)
+
+    def open_mr_url(self, row, _column):
+        text = self.table.item(row, 3).text() if self.table.item(row, 3) else ''
+        if text.startswith('✅ '):
+            QDesktopServices.openUrl(QUrl(text[len('✅ '):]))
+
+    def reject(self):
+        """创建中不允许关闭，等待已发出的请求返回"""
+        if self.is_executing:
+            return
+        super().reject()
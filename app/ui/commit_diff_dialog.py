@@ -37,7 +37,10 @@ class CommitDiffDialog(QDialog):
         if self.commits:
             content = f'共有 {len(self.commits)} 个新提交:\n\n'
             for commit in self.commits:
-                content += f"{commit['hash']} {commit['message']}\n"
+                content += f"{commit['hash'][:8]} {commit['message']}"
+                if commit.get('author'):
+                    content += f"  ({commit['author']}, {commit.get('date', '')[:19]})"
+                content += '\n'
             self.commits_text.setPlainText(content)
         else:
             self.commits_text.setPlainText('源分支与目标分支之间没有新的提交。')
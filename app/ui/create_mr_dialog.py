@@ -9,13 +9,15 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QApplication
 import xml.etree.ElementTree as ET
 
-from app.widgets import NoWheelComboBox, enable_combo_search as util_enable_combo_search
+from app.widgets import NoWheelComboBox, enable_combo_search as util_enable_combo_search, set_user_items
 from quick_generate_mr_form import (
     get_local_branches, get_all_local_branches, generate_mr,
-    get_mr_defaults, parse_target_branch_from_source, get_gitlab_usernames
+    get_mr_defaults, parse_target_branch_from_source, get_gitlab_usernames, get_cached_gitlab_usernames,
+    USERS_SYNC_MAX_AGE
 )
 from quick_create_branch import get_remote_branches
 from app.async_utils import run_blocking
+from app.gitlab_clients import close_gitlab_clients
 
 
 class CreateMRDialog(QDialog):
@@ -158,10 +160,12 @@ class CreateMRDialog(QDialog):
         self.enable_combo_search(self.assignee_combo)
         self.enable_combo_search(self.reviewer_combo)
 
-        # 刷新数据（这会自动调用 init_users_selection）
+        # 刷新数据
         self.run_refresh_branches()
         self.run_refresh_mr_target_branches()
-        self.run_refresh_users()
+        # 先显示本地用户目录，目录较旧时再在后台同步
+        self._set_user_items(get_cached_gitlab_usernames(self.gitlab_url_input.text()))
+        self._sync_users(max_age=USERS_SYNC_MAX_AGE)
 
         # 如果有指定源分支，延迟设置
         if self.source_branch:
@@ -225,43 +229,29 @@ class CreateMRDialog(QDialog):
     def run_refresh_users(self):
         self.mr_output.append('正在刷新用户...')
         QApplication.processEvents()
+        self._sync_users(max_age=0)
 
+    def _sync_users(self, max_age):
+        """在后台同步本地用户目录，完成后更新指派人/审查者下拉框"""
         url = self.gitlab_url_input.text()
         token = self.token_input.text()
 
         def _fetch_users():
-            return get_gitlab_usernames(url, token)
+            return get_gitlab_usernames(url, token, max_age)
 
         def on_success(result):
             users, error = result
             if error:
                 self.mr_output.append(error)
                 return
-
-            # 保存当前选择的值
-            current_assignee = self.assignee_combo.currentText()
-            current_reviewer = self.reviewer_combo.currentText()
-
-            self.assignee_combo.clear()
-            self.reviewer_combo.clear()
-            self.assignee_combo.addItems(users)
-            self.reviewer_combo.addItems(users)
-
-            # 恢复之前选择的值（如果存在）
-            if current_assignee:
-                index = self.assignee_combo.findText(current_assignee, Qt.MatchFixedString)
-                if index >= 0:
-                    self.assignee_combo.setCurrentIndex(index)
-            if current_reviewer:
-                index = self.reviewer_combo.findText(current_reviewer, Qt.MatchFixedString)
-                if index >= 0:
-                    self.reviewer_combo.setCurrentIndex(index)
+            self._set_user_items(users)
 
         run_blocking(_fetch_users, on_success=on_success, parent=self)
 
-
-
-
+    def _set_user_items(self, users):
+        """用用户列表替换下拉框内容，保留当前选择"""
+        gitlab_config = self.config.find('gitlab') if self.config is not None else None
+        set_user_items(self.assignee_combo, self.reviewer_combo, users, gitlab_config)
 
     def save_gitlab_basic_config(self):
         gitlab_config = self.config.find('gitlab')
@@ -274,8 +264,12 @@ class CreateMRDialog(QDialog):
                 child = ET.SubElement(parent, tag)
             child.text = text
 
-        set_child_text(gitlab_config, 'gitlab_url', self.gitlab_url_input.text())
-        set_child_text(gitlab_config, 'private_token', self.token_input.text())
+        url, token = self.gitlab_url_input.text(), self.token_input.text()
+        # URL 或 token 改变后，旧凭据的共享客户端不再使用
+        if (gitlab_config.findtext('gitlab_url'), gitlab_config.findtext('private_token')) != (url, token):
+            close_gitlab_clients(url, token)
+        set_child_text(gitlab_config, 'gitlab_url', url)
+        set_child_text(gitlab_config, 'private_token', token)
         tree = ET.ElementTree(self.config)
         tree.write('config.xml', encoding='UTF-8', xml_declaration=True)
 
@@ -12,6 +12,7 @@ from app.styles import apply_global_styles
 from app.ui.workspace_tab import WorkspaceTab
 from app.ui.commit_notification_dialog import CommitNotificationDialog
 from app.git_watcher import get_global_watcher
+from app.dry_run_cache import flush_dry_run_cache
 
 class App(QWidget):
     def __init__(self):
@@ -153,6 +154,8 @@ class App(QWidget):
             if isinstance(tab_widget, WorkspaceTab):
                 # 停止 Git 监听
                 self.git_watcher.remove_repository(tab_widget.path)
+                # 释放工作区后台资源
+                tab_widget.shutdown()
 
             self.workspace_tabs.removeTab(index)
             self.save_config()
@@ -299,6 +302,11 @@ class App(QWidget):
         if hasattr(self, '_pending_mr_timer'):
             self._pending_mr_timer.stop()
         self.git_watcher.stop_all()
+        for i in range(self.workspace_tabs.count()):
+            tab_widget = self.workspace_tabs.widget(i)
+            if isinstance(tab_widget, WorkspaceTab):
+                tab_widget.shutdown()
+        flush_dry_run_cache()
         QApplication.instance().quit()
 
     def _start_pending_mr_checker(self):
@@ -9,11 +9,13 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QTextCharFormat, QColor, QBrush, QTextCursor, QFont, QSyntaxHighlighter, QTextDocument
-import subprocess
 import os
 import re
 import difflib
 
+from app.git_object_reader import get_object_reader
+from app.git_runner import run_git
+
 
 class ConflictHighlighter(QSyntaxHighlighter):
     """高亮显示冲突标记"""
@@ -414,8 +416,33 @@ class MergeConflictDialog(QDialog):
         self.current_file_index = 0
         self.resolved_files = {}
         self.diff_blocks = []  # 存储当前文件的所有差异块
+        self.stage_blobs = self.load_stage_blobs()  # {file_path: {stage: blob_sha}}
         self.initUI()
 
+    def load_stage_blobs(self):
+        """一次性读取所有冲突文件各暂存阶段的 blob sha（1: base, 2: 本地, 3: cherry-pick）"""
+        result = run_git(['ls-files', '-u', '-z'], self.repo_path, binary=True)
+        stage_blobs = {}
+        if not result.ok:
+            return stage_blobs
+        for entry in result.stdout.split(b'\0'):
+            if not entry:
+                continue
+            # 格式: <mode> <sha> <stage>\t<path>
+            info, _, path = entry.partition(b'\t')
+            parts = info.split()
+            if len(parts) != 3:
+                continue
+            stage_blobs.setdefault(path.decode('utf-8', errors='replace'), {})[int(parts[2])] = parts[1].decode('ascii')
+        return stage_blobs
+
+    def read_stage_content(self, file_path, stage):
+        """通过常驻的 cat-file 进程读取指定阶段的文件内容，不存在时返回空字符串"""
+        blob_sha = self.stage_blobs.get(file_path, {}).get(stage)
+        if not blob_sha:
+            return ''
+        return get_object_reader(self.repo_path).read_text(blob_sha) or ''
+
     def initUI(self):
         self.setWindowTitle('Cherry-pick 冲突解决')
         self.setMinimumSize(1400, 800)
@@ -566,33 +593,10 @@ class MergeConflictDialog(QDialog):
         if self.result_preview.toPlainText():
             self.resolved_files[self.conflict_files[index - 1]] = self.result_preview.toPlainText()
 
-        # 获取三个版本的内容
-        # 本地版本
-        local_result = subprocess.run(
-            ['git', 'show', ':2:' + file_path],
-            cwd=self.repo_path,
-            capture_output=True,
-            text=True
-        )
-        local_content = local_result.stdout if local_result.returncode == 0 else ''
-
-        # 基础版本
-        base_result = subprocess.run(
-            ['git', 'show', ':1:' + file_path],
-            cwd=self.repo_path,
-            capture_output=True,
-            text=True
-        )
-        base_content = base_result.stdout if base_result.returncode == 0 else ''
-
-        # Cherry-pick 版本
-        incoming_result = subprocess.run(
-            ['git', 'show', ':3:' + file_path],
-            cwd=self.repo_path,
-            capture_output=True,
-            text=True
-        )
-        incoming_content = incoming_result.stdout if incoming_result.returncode == 0 else ''
+        # 获取三个版本的内容：本地版本、基础版本、Cherry-pick 版本
+        local_content = self.read_stage_content(file_path, 2)
+        base_content = self.read_stage_content(file_path, 1)
+        incoming_content = self.read_stage_content(file_path, 3)
 
         # 分析差异
         self.diff_blocks = []
@@ -852,13 +856,8 @@ class MergeConflictDialog(QDialog):
 
         # 执行 git add 标记冲突已解决
         for file_path in self.resolved_files:
-            result = subprocess.run(
-                ['git', 'add', file_path],
-                cwd=self.repo_path,
-                capture_output=True,
-                text=True
-            )
-            if result.returncode != 0:
+            result = run_git(['add', file_path], self.repo_path)
+            if not result.ok:
                 QMessageBox.critical(
                     self,
                     '错误',
@@ -871,14 +870,9 @@ class MergeConflictDialog(QDialog):
     @staticmethod
     def detect_conflicts(repo_path):
         """检测冲突文件列表"""
-        result = subprocess.run(
-            ['git', 'diff', '--name-only', '--diff-filter=U'],
-            cwd=repo_path,
-            capture_output=True,
-            text=True
-        )
+        result = run_git(['diff', '--name-only', '--diff-filter=U'], repo_path)
 
-        if result.returncode == 0 and result.stdout.strip():
+        if result.ok and result.stdout.strip():
             return result.stdout.strip().split('\n')
         return []
 
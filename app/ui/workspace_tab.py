@@ -1,25 +1,37 @@
-import shelve
 import time
 import xml.etree.ElementTree as ET
 from PyQt5.QtWidgets import (
     QCheckBox,
     QWidget, QTabWidget, QFormLayout, QLineEdit, QHBoxLayout, QPushButton,
     QVBoxLayout, QListWidget, QAbstractItemView, QTextEdit, QComboBox, QMessageBox, QDialog,
-    QFrame, QSizePolicy, QTableWidget, QTableWidgetItem, QDialogButtonBox, QHeaderView
+    QFrame, QSizePolicy, QTableWidget, QTableWidgetItem, QDialogButtonBox, QHeaderView, QProgressBar
 )
 from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QApplication
 
 from app.async_utils import run_blocking
-from quick_create_branch import create_branch as create_branch_func, get_remote_branches
+from app.cache_store import open_cache
+from app.cherry_pick_dry_run import rank_targets, run_dry_run, run_dry_run_many
+from app.cherry_pick_executor import MAX_PARALLEL_TARGETS, STATUS_CONFLICT, STATUS_RUNNING, CherryPickJob, FanOutJob
+from app.cherry_pick_jobs import get_job_store
+from app.conflict_predictor import RISK_LIKELY, RISK_OVERLAP, predict_conflicts
+from app.fetch_coordinator import get_fetch_coordinator
+from app.git_object_reader import close_object_reader
+from app.gitlab_clients import close_gitlab_clients
+from app.patch_id_index import get_patch_id_index
+from app.worktree_pool import close_worktree_pool, open_worktree_pool
+from quick_create_branch import create_branches, get_remote_branches
 from quick_generate_mr_form import (
     get_local_branches, get_all_local_branches, generate_mr, get_mr_defaults,
-    parse_target_branch_from_source, get_gitlab_usernames, get_branch_diff,
-    get_commits_between_branches
+    parse_target_branch_from_source, get_gitlab_usernames, get_cached_gitlab_usernames, get_branch_diff,
+    get_commits_between_branches, COMMITS_FETCH_MAX_AGE, USERS_SYNC_MAX_AGE
+)
+from app.widgets import (
+    NoWheelComboBox, enable_combo_search as util_enable_combo_search, init_users_selection, set_user_items
 )
-from app.widgets import NoWheelComboBox, enable_combo_search as util_enable_combo_search
 from PyQt5.QtWidgets import QScrollArea, QLabel
+from app.ui.bulk_mr_dialog import BulkMRDialog
 from app.ui.commit_diff_dialog import CommitDiffDialog
 
 
@@ -94,10 +106,11 @@ class CollapsibleConsole(QWidget):
 
     def append(self, text):
         """追加日志文本"""
-        self.log_text.setPlainText(self.log_text.toPlainText() + text + '\n')
-        # 滚动到底部
+        # 在末尾插入而不是重设全部文本，流式输出时避免整段重排
         cursor = self.log_text.textCursor()
         cursor.movePosition(cursor.End)
+        cursor.insertText(text + '\n')
+        # 滚动到底部
         self.log_text.setTextCursor(cursor)
 
     def clear(self):
@@ -113,19 +126,49 @@ class CollapsibleConsole(QWidget):
         self.log_text.setPlainText(text)
 
 
+class CherryPickWorker(QThread):
+    """在后台线程中执行 CherryPickJob，通过信号把日志和进度送回界面线程"""
+
+    output = pyqtSignal(str)
+    progress = pyqtSignal(int, int, str)
+    push_progress = pyqtSignal(str, int)
+    job_finished = pyqtSignal(object)
+
+    def __init__(self, repo_path, target_branch, commits, parent=None, source_branch='', record=None):
+        super().__init__(parent)
+        callbacks = dict(
+            on_output=self.output.emit,
+            on_progress=lambda index, total, _commit, status: self.progress.emit(index, total, status),
+            on_push_progress=self.push_progress.emit
+        )
+        if record is not None:
+            # 继续上次未完成的任务
+            self.job = CherryPickJob.from_record(record, **callbacks)
+            self.action = self.job.recover
+        else:
+            self.job = CherryPickJob(repo_path, target_branch, commits, source_branch=source_branch, **callbacks)
+            self.action = self.job.run
+        # 本次线程执行的阶段：run / recover / resume / abort，冲突暂停后复用同一个线程对象继续
+
+    def run(self):
+        self.job_finished.emit(self.action())
+
+
 class CherryPickConfirmDialog(QDialog):
     """Cherry-Pick 二阶段确认对话框，支持显示执行日志"""
 
-    def __init__(self, source_branch, target_branch, commits, workspace_tab, parent=None):
+    def __init__(self, source_branch, target_branch, commits, workspace_tab, parent=None, record=None):
         super().__init__(parent)
         self.source_branch = source_branch
         self.target_branch = target_branch
         self.commits = commits
         self.workspace_tab = workspace_tab
+        # 程序重启后继续的任务记录
+        self.record = record
         self.is_executing = False
-        self.cherry_pick_current_index = 0
-        self.cherry_pick_successful = 0
-        self.cherry_pick_worktree_dir = None
+        # 遇到冲突暂停，等待用户在 worktree 中解决
+        self.is_paused = False
+        self.worker = None
 
         self.setWindowTitle('确认 Cherry-Pick 操作')
         self.setMinimumWidth(700)
@@ -209,6 +252,12 @@ class CherryPickConfirmDialog(QDialog):
         self.warning_label.setStyleSheet('color: #f39c12; padding: 10px; background: #fff3cd; border-radius: 4px;')
         self.main_layout.addWidget(self.warning_label)
 
+        # 执行进度（初始隐藏）
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat('%v / %m')
+        self.progress_bar.setVisible(False)
+        self.main_layout.addWidget(self.progress_bar)
+
         # 控制台日志区域（初始隐藏）
         self.console = CollapsibleConsole('Cherry-Pick 执行日志')
         self.console.setMinimumHeight(200)
@@ -255,13 +304,12 @@ class CherryPickConfirmDialog(QDialog):
     def append_log(self, text):
         """追加日志文本"""
         self.console.append(text)
-        QApplication.processEvents()
 
     def start_execution(self):
-        """开始执行 cherry-pick"""
-        import subprocess
-        import tempfile
-        import shutil
+        """开始执行 cherry-pick（在后台线程中进行，不阻塞界面）"""
+        if self.is_paused:
+            self.resume_execution()
+            return
 
         # 切换到执行模式
         self.is_executing = True
@@ -269,202 +317,334 @@ class CherryPickConfirmDialog(QDialog):
         self.title_label.setStyleSheet('font-size: 16px; color: #27ae60;')
         self.warning_label.setVisible(False)
         self.table.setVisible(False)
+        self.progress_bar.setRange(0, len(self.commits))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
         self.console.setVisible(True)
 
-        # 禁用按钮
+        # 执行中确认按钮不可用，取消按钮用于中止
         self.confirm_button.setEnabled(False)
+        self.cancel_button.setText('取消执行')
+
+        # 提交列表按 git log 顺序（从新到旧），需要从旧到新应用
+        self.worker = CherryPickWorker(self.workspace_tab.path, self.target_branch,
+                                       list(reversed(self.commits)), self,
+                                       source_branch=self.source_branch, record=self.record)
+        if self.record is not None:
+            self.progress_bar.setValue(self.record['position'])
+        self.worker.output.connect(self.append_log)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.push_progress.connect(self.on_push_progress)
+        self.worker.job_finished.connect(self.on_job_finished)
+        self.worker.start()
+
+    def on_push_progress(self, stage, percent):
+        """推送进度"""
+        self.title_label.setText(f'<b>正在推送到远程仓库: {stage} {percent}%</b>')
+
+    def on_progress(self, index, total, status):
+        """单个提交状态变化"""
+        if status == STATUS_RUNNING:
+            self.title_label.setText(f'<b>正在执行 Cherry-Pick 操作 ({index + 1}/{total})</b>')
+        else:
+            self.progress_bar.setValue(index + 1)
+
+    def _run_worker_action(self, action, title):
+        """在同一个后台线程对象上执行暂停后的下一阶段"""
+        self.is_paused = False
+        self.is_executing = True
+        self.title_label.setText(f'<b>{title}</b>')
+        self.title_label.setStyleSheet('font-size: 16px; color: #27ae60;')
+        self.confirm_button.setEnabled(False)
+        self.cancel_button.setText('取消执行')
+        self.cancel_button.setEnabled(True)
+        self.worker.action = action
+        self.worker.start()
+
+    def resume_execution(self):
+        """冲突解决后继续"""
+        self._run_worker_action(self.worker.job.resume, '正在继续 Cherry-Pick 操作')
+
+    def abort_execution(self):
+        """放弃暂停中的执行并恢复目标分支"""
+        self._run_worker_action(self.worker.job.abort, '正在放弃 Cherry-Pick 操作')
+        self.cancel_button.setEnabled(False)
+
+    def pause_for_conflict(self, result):
+        """遇到冲突：保留 worktree，等待用户解决后继续或放弃"""
+        self.is_executing = False
+        self.is_paused = True
+        self.title_label.setText('<b>⚠️ 存在冲突，请解决后继续</b>')
+        self.title_label.setStyleSheet('font-size: 16px; color: #f39c12;')
+        self.append_log(f'\n--- 冲突文件: {", ".join(result["conflict_files"])} ---')
+        self.append_log(f'--- 请在 {result["worktree"]} 中解决冲突并 git add，然后点击"继续" ---')
+        self.confirm_button.setText('继续')
+        self.confirm_button.setEnabled(True)
+        self.cancel_button.setText('放弃并还原')
+        self.cancel_button.setEnabled(True)
+
+    def on_job_finished(self, result):
+        """后台执行结束"""
+        if result['paused']:
+            self.pause_for_conflict(result)
+            return
+        summary = f'应用 {result["applied"]} 个，跳过 {result["skipped"]} 个'
+        if result['cancelled']:
+            self.append_log(f'\n--- 已取消（{summary}，未推送）---')
+        elif not result['success'] and result['error']:
+            self.append_log(f'\n--- 失败: {result["error"]}（{summary}）---')
+        self.worker = None
+        self.finish_execution(result['success'], result['cancelled'])
+
+    def finish_execution(self, success, cancelled=False):
+        """完成执行"""
+        self.is_executing = False
+        if success:
+            self.title_label.setText('<b>✅ Cherry-Pick 操作完成</b>')
+            self.title_label.setStyleSheet('font-size: 16px; color: #27ae60;')
+        elif cancelled:
+            self.title_label.setText('<b>⏹ Cherry-Pick 操作已取消</b>')
+            self.title_label.setStyleSheet('font-size: 16px; color: #7f8c8d;')
+        else:
+            self.title_label.setText('<b>❌ Cherry-Pick 操作失败</b>')
+            self.title_label.setStyleSheet('font-size: 16px; color: #e74c3c;')
+        self.confirm_button.setVisible(False)
         self.cancel_button.setText('关闭')
+        self.cancel_button.setEnabled(True)
 
-        # 开始执行
-        self.cherry_pick_current_index = 0
-        self.cherry_pick_successful = 0
+    def reject(self):
+        """重写 reject 方法，执行中改为请求取消，冲突暂停时改为放弃并还原"""
+        if self.is_paused:
+            self.abort_execution()
+            return
+        if self.is_executing:
+            if self.worker is not None and not self.worker.job.cancelled:
+                self.worker.job.cancel()
+                self.cancel_button.setText('正在取消...')
+                self.cancel_button.setEnabled(False)
+                self.append_log('\n--- 收到取消请求，git 停下后恢复目标分支 ---')
+            return
+        super().reject()
 
-        # 创建临时 worktree 目录
-        temp_dir = tempfile.mkdtemp(prefix='cherry-pick-')
-        self.cherry_pick_worktree_dir = temp_dir
 
-        self.append_log(f'--- 创建临时 worktree: {temp_dir} ---')
+class CherryPickFanOutWorker(QThread):
+    """在后台线程中执行 FanOutJob，把各目标的日志、进度和结果送回界面线程"""
 
-        # 检查目标分支是否存在于本地
-        self.append_log(f'--- 检查目标分支: {self.target_branch} ---')
-        local_branch_check = subprocess.run(
-            ['git', 'branch', '--list', self.target_branch],
-            cwd=self.workspace_tab.path,
-            capture_output=True,
-            text=True
-        )
+    output = pyqtSignal(object, str)
+    progress = pyqtSignal(str, int, int, str)
+    target_finished = pyqtSignal(str, object)
+    push_progress = pyqtSignal(str, int)
+    job_finished = pyqtSignal(object)
 
-        # 检查目标分支是否存在于远程
-        remote_branch_check = subprocess.run(
-            ['git', 'branch', '-r', '--list', f'origin/{self.target_branch}'],
-            cwd=self.workspace_tab.path,
-            capture_output=True,
-            text=True
+    def __init__(self, repo_path, target_branches, commits, parent=None):
+        super().__init__(parent)
+        self.job = FanOutJob(
+            repo_path, target_branches, commits,
+            on_output=self.output.emit,
+            on_progress=lambda target, index, total, _commit, status: self.progress.emit(target, index, total, status),
+            on_target_finished=self.target_finished.emit,
+            on_push_progress=self.push_progress.emit
         )
 
-        # 确定使用哪个命令创建 worktree
-        worktree_cmd = ['git', 'worktree', 'add', '-f', temp_dir]
+    def run(self):
+        self.job_finished.emit(self.job.run())
 
-        if local_branch_check.returncode == 0 and local_branch_check.stdout.strip():
-            worktree_cmd.append(self.target_branch)
-            self.append_log(f'使用本地分支: {self.target_branch}\n')
-        elif remote_branch_check.returncode == 0 and remote_branch_check.stdout.strip():
-            worktree_cmd.extend(['-b', self.target_branch, f'origin/{self.target_branch}'])
-            self.append_log(f'从远程创建分支: origin/{self.target_branch}\n')
-        else:
-            worktree_cmd.append(self.target_branch)
-            self.append_log(f'尝试使用分支: {self.target_branch}\n')
-
-        worktree_result = subprocess.run(
-            worktree_cmd,
-            cwd=self.workspace_tab.path,
-            capture_output=True,
-            text=True
-        )
 
-        self.append_log(f'STDOUT:\n{worktree_result.stdout}')
-        if worktree_result.stderr:
-            self.append_log(f'STDERR:\n{worktree_result.stderr}')
+class CherryPickFanOutDialog(QDialog):
+    """把选中的提交并行 cherry-pick 到多个目标分支，每个目标一行进度"""
 
-        if worktree_result.returncode != 0:
-            self.append_log(f'\n创建 worktree 失败！错误代码: {worktree_result.returncode}')
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            self.finish_execution(False)
-            return
+    def __init__(self, source_branch, target_branches, commits, workspace_tab, parent=None):
+        super().__init__(parent)
+        self.source_branch = source_branch
+        self.target_branches = target_branches
+        self.commits = commits
+        self.workspace_tab = workspace_tab
+        self.is_executing = False
+        self.worker = None
+        # 目标分支 -> 表格行号
+        self.target_rows = {}
+        self.target_checkboxes = []
+
+        self.setWindowTitle('批量 Cherry-Pick 到多个目标分支')
+        self.setMinimumWidth(750)
+        self.setMinimumHeight(550)
+        self.setup_ui()
 
-        # 验证 worktree 中的分支
-        verify_result = subprocess.run(
-            ['git', 'branch', '--show-current'],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True
-        )
-        current_branch = verify_result.stdout.strip()
-        self.append_log(f'Worktree 当前分支: {current_branch}\n')
-
-        # 开始逐个执行 cherry-pick
-        self.cherry_pick_next_commit()
-
-    def cherry_pick_next_commit(self):
-        """执行下一个 cherry-pick"""
-        import subprocess
-        import shutil
-
-        if self.cherry_pick_current_index >= len(self.commits):
-            # 全部完成，执行 push 和清理
-            self.append_log(f'\n--- 完成！成功 cherry-pick 了 {self.cherry_pick_successful} 个提交 ---')
-
-            # 执行 git push
-            self.append_log(f'\n--- 正在推送到远程仓库 ---')
-            push_result = subprocess.run(
-                ['git', 'push', '-u', 'origin', self.target_branch],
-                cwd=self.cherry_pick_worktree_dir,
-                capture_output=True,
-                text=True
-            )
-            self.append_log(f'STDOUT:\n{push_result.stdout}')
-            if push_result.stderr:
-                self.append_log(f'STDERR:\n{push_result.stderr}')
+    def setup_ui(self):
+        self.main_layout = QVBoxLayout()
+        self.main_layout.setSpacing(15)
 
-            if push_result.returncode == 0:
-                self.append_log(f'\n--- 推送成功！---')
-                self.finish_execution(True)
-            else:
-                self.append_log(f'\n--- 推送失败！错误代码: {push_result.returncode} ---')
-                self.finish_execution(False)
+        self.title_label = QLabel(f'<b>将 {len(self.commits)} 个提交并行应用到多个目标分支</b>')
+        self.title_label.setStyleSheet('font-size: 16px; color: #2c3e50;')
+        self.main_layout.addWidget(self.title_label)
 
-            # 清理 worktree
-            self.cleanup_worktree()
-            return
+        info_label = QLabel(f'<b>源分支:</b> {self.source_branch}　　'
+                            f'<b>并发数:</b> {MAX_PARALLEL_TARGETS}')
+        info_label.setStyleSheet('color: #3498db;')
+        self.main_layout.addWidget(info_label)
 
-        commit = self.commits[self.cherry_pick_current_index]
-        commit_hash = commit['hash']
-        commit_msg = commit['message'][:50]
+        # 目标分支表格：选择 / 目标分支 / 进度 / 状态
+        self.table = QTableWidget(len(self.target_branches), 4)
+        self.table.setHorizontalHeaderLabels(['选择', '目标分支', '进度', '状态'])
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Fixed)
+        header.setSectionResizeMode(1, QHeaderView.Stretch)
+        header.setSectionResizeMode(2, QHeaderView.Fixed)
+        header.setSectionResizeMode(3, QHeaderView.Fixed)
+        self.table.setColumnWidth(0, 50)
+        self.table.setColumnWidth(2, 140)
+        self.table.setColumnWidth(3, 200)
+
+        for row, target in enumerate(self.target_branches):
+            checkbox = QCheckBox()
+            checkbox.setChecked(True)
+            checkbox_widget = QWidget()
+            checkbox_layout = QHBoxLayout(checkbox_widget)
+            checkbox_layout.addWidget(checkbox)
+            checkbox_layout.setAlignment(Qt.AlignCenter)
+            checkbox_layout.setContentsMargins(0, 0, 0, 0)
+            self.table.setCellWidget(row, 0, checkbox_widget)
+            self.target_checkboxes.append((checkbox, target))
+
+            self.table.setItem(row, 1, QTableWidgetItem(target))
+
+            progress_bar = QProgressBar()
+            progress_bar.setRange(0, len(self.commits))
+            progress_bar.setValue(0)
+            progress_bar.setFormat('%v / %m')
+            self.table.setCellWidget(row, 2, progress_bar)
+
+            self.table.setItem(row, 3, QTableWidgetItem('等待'))
+            self.target_rows[target] = row
 
-        self.append_log(f'--- Cherry-pick ({self.cherry_pick_current_index + 1}/{len(self.commits)}): {commit_hash[:8]} - {commit_msg} ---')
+        self.main_layout.addWidget(self.table)
 
-        # 在 worktree 中执行 cherry-pick
-        cherry_pick_result = subprocess.run(
-            ['git', 'cherry-pick', commit_hash],
-            cwd=self.cherry_pick_worktree_dir,
-            capture_output=True,
-            text=True
-        )
+        # 汇总（执行结束后显示）
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        self.summary_label.setVisible(False)
+        self.main_layout.addWidget(self.summary_label)
 
-        self.append_log(f'STDOUT:\n{cherry_pick_result.stdout}')
-        if cherry_pick_result.stderr:
-            self.append_log(f'STDERR:\n{cherry_pick_result.stderr}')
-
-        if cherry_pick_result.returncode != 0:
-            # 检查是否是空提交（内容已存在）
-            is_empty = 'empty' in cherry_pick_result.stderr.lower() or 'empty' in cherry_pick_result.stdout.lower()
-
-            if is_empty:
-                # 空提交，跳过
-                self.append_log('⚠️ 提交内容已存在，自动跳过（--skip）\n')
-                subprocess.run(
-                    ['git', 'cherry-pick', '--skip'],
-                    cwd=self.cherry_pick_worktree_dir,
-                    capture_output=True
-                )
-                # 继续下一个
-                self.cherry_pick_current_index += 1
-                self.cherry_pick_next_commit()
-                return
-            else:
-                # 真正的冲突，需要手动处理
-                self.append_log(f'Cherry-pick 失败！错误代码: {cherry_pick_result.returncode}')
-                self.append_log('请手动解决冲突后继续。')
-                self.cleanup_worktree()
-                self.append_log('\n由于失败，worktree 已清理。')
-                self.finish_execution(False)
-                return
+        self.console = CollapsibleConsole('批量 Cherry-Pick 执行日志')
+        self.console.setMinimumHeight(180)
+        self.console.setVisible(False)
+        self.main_layout.addWidget(self.console)
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.Yes | QDialogButtonBox.No)
+        self.confirm_button = self.button_box.button(QDialogButtonBox.Yes)
+        self.cancel_button = self.button_box.button(QDialogButtonBox.No)
+        self.confirm_button.setText('并行执行')
+        self.cancel_button.setText('取消')
+        self.button_box.accepted.connect(self.start_execution)
+        self.button_box.rejected.connect(self.reject)
+        self.main_layout.addWidget(self.button_box)
+
+        self.setLayout(self.main_layout)
+
+    def _set_target_status(self, target, text, color=None):
+        item = self.table.item(self.target_rows[target], 3)
+        item.setText(text)
+        item.setToolTip(text)
+        if color:
+            for col in (1, 3):
+                self.table.item(self.target_rows[target], col).setBackground(QColor(color))
+
+    def start_execution(self):
+        """开始并行执行（在后台线程中进行，不阻塞界面）"""
+        targets = [target for checkbox, target in self.target_checkboxes if checkbox.isChecked()]
+        if not targets:
+            QMessageBox.warning(self, '提示', '请至少选择一个目标分支。')
+            return
+
+        self.is_executing = True
+        self.title_label.setText(f'<b>正在并行执行 Cherry-Pick（{len(targets)} 个目标）</b>')
+        self.title_label.setStyleSheet('font-size: 16px; color: #27ae60;')
+        for checkbox, target in self.target_checkboxes:
+            checkbox.setEnabled(False)
+            if not checkbox.isChecked():
+                self._set_target_status(target, '未选择')
+        self.console.setVisible(True)
+        self.confirm_button.setEnabled(False)
+        self.cancel_button.setText('取消执行')
+
+        # 提交列表按 git log 顺序（从新到旧），需要从旧到新应用
+        self.worker = CherryPickFanOutWorker(self.workspace_tab.path, targets,
+                                             list(reversed(self.commits)), self)
+        self.worker.output.connect(self.append_log)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.target_finished.connect(self.on_target_finished)
+        self.worker.push_progress.connect(self.on_push_progress)
+        self.worker.job_finished.connect(self.on_job_finished)
+        self.worker.start()
+
+    def append_log(self, target, text):
+        self.console.append(f'[{target or "推送"}] {text}')
+
+    def on_push_progress(self, stage, percent):
+        """所有目标合并推送的进度"""
+        self.title_label.setText(f'<b>正在推送（atomic）: {stage} {percent}%</b>')
+
+    def on_progress(self, target, index, total, status):
+        """单个目标中某个提交的状态变化"""
+        row = self.target_rows[target]
+        if status == STATUS_RUNNING:
+            self._set_target_status(target, f'执行中 ({index + 1}/{total})')
         else:
-            self.cherry_pick_successful += 1
-            self.append_log('Cherry-pick 成功！\n')
-
-        # 继续下一个
-        self.cherry_pick_current_index += 1
-        self.cherry_pick_next_commit()
-
-    def cleanup_worktree(self):
-        """清理 worktree"""
-        import subprocess
-        import shutil
-
-        if self.cherry_pick_worktree_dir:
-            self.append_log(f'\n--- 清理临时 worktree ---')
-            subprocess.run(
-                ['git', 'worktree', 'remove', '--force', self.cherry_pick_worktree_dir],
-                cwd=self.workspace_tab.path,
-                capture_output=True
-            )
-            shutil.rmtree(self.cherry_pick_worktree_dir, ignore_errors=True)
-            # 清理可能残留的 worktree 记录
-            subprocess.run(
-                ['git', 'worktree', 'prune'],
-                cwd=self.workspace_tab.path,
-                capture_output=True
-            )
-            self.append_log('清理完成！')
-            self.cherry_pick_worktree_dir = None
+            self.table.cellWidget(row, 2).setValue(index + 1)
+
+    def on_target_finished(self, target, result):
+        """一个目标执行结束；成功的目标在全部结束后统一推送"""
+        if result['success']:
+            text = f'✅ 应用 {result["applied"]} 个，跳过 {result["skipped"]} 个'
+            text += '，已推送' if result['pushed'] else '，等待推送'
+            color = '#d4edda'
+        elif STATUS_CONFLICT in result['statuses']:
+            text = f'⚠️ {result["error"]}，已还原'
+            color = '#ffcccc'
+        elif result['cancelled']:
+            text, color = '⏹ 已取消', '#e9ecef'
+        else:
+            text, color = f'❌ {result["error"]}', '#fff3cd'
+        self._set_target_status(target, text, color)
 
-    def finish_execution(self, success):
-        """完成执行"""
+    def on_job_finished(self, summary):
+        """全部目标执行结束，显示汇总"""
         self.is_executing = False
-        if success:
-            self.title_label.setText('<b>✅ Cherry-Pick 操作完成</b>')
+        self.worker = None
+        # 推送或取消会改变各目标的最终结果
+        for target, result in summary['results'].items():
+            self.on_target_finished(target, result)
+        parts = [f'✅ 成功 {len(summary["succeeded"])} 个目标（共应用 {summary["applied"]} 个提交，'
+                 f'跳过 {summary["skipped"]} 个）']
+        if summary['conflicted']:
+            parts.append(f'⚠️ 冲突 {len(summary["conflicted"])} 个: {", ".join(summary["conflicted"])}')
+        if summary['failed']:
+            parts.append(f'❌ 失败 {len(summary["failed"])} 个: {", ".join(summary["failed"])}')
+        if summary['cancelled']:
+            parts.append(f'⏹ 取消 {len(summary["cancelled"])} 个')
+        self.summary_label.setText('\n'.join(parts))
+        self.summary_label.setVisible(True)
+
+        if summary['success']:
+            self.title_label.setText('<b>✅ 批量 Cherry-Pick 完成</b>')
             self.title_label.setStyleSheet('font-size: 16px; color: #27ae60;')
         else:
-            self.title_label.setText('<b>❌ Cherry-Pick 操作失败</b>')
+            self.title_label.setText('<b>⚠️ 批量 Cherry-Pick 部分目标未成功</b>')
             self.title_label.setStyleSheet('font-size: 16px; color: #e74c3c;')
         self.confirm_button.setVisible(False)
         self.cancel_button.setText('关闭')
         self.cancel_button.setEnabled(True)
 
     def reject(self):
-        """重写 reject 方法，执行中不允许关闭"""
+        """执行中改为请求取消：未开始的目标不再执行，执行中的目标在 git 停下后恢复"""
         if self.is_executing:
+            if self.worker is not None and not self.worker.job.cancelled:
+                self.worker.job.cancel()
+                self.cancel_button.setText('正在取消...')
+                self.cancel_button.setEnabled(False)
             return
         super().reject()
 
@@ -483,12 +663,16 @@ class WorkspaceTab(QWidget):
 
         # 分支缓存：{branch_type: (data, timestamp)}
         self._branch_cache = {}
-        # 预取状态
-        self._is_prefetching = False
-        self._last_fetch_time = 0
+        # fetch 协调器：合并并发 fetch，记录远程分支新鲜度
+        self.fetch_coordinator = get_fetch_coordinator(self.path)
 
         self.initUI()
 
+    def shutdown(self):
+        """释放工作区占用的后台资源（工作区关闭时调用）"""
+        close_object_reader(self.path)
+        close_worktree_pool(self.path)
+
     def initUI(self):
         self.tools_tabs = QTabWidget()
         self.create_branch_tab = QWidget()
@@ -503,10 +687,23 @@ class WorkspaceTab(QWidget):
         self.init_create_mr_tab()
         self.init_cherry_pick_tab()
 
+        # 远程分支新鲜度
+        self.fetch_status_label = QLabel()
+        self.fetch_status_label.setStyleSheet('color: #888; font-size: 11px;')
+        self.fetch_status_timer = QTimer(self)
+        self.fetch_status_timer.timeout.connect(self.update_fetch_status)
+        self.fetch_status_timer.start(10000)
+        self.update_fetch_status()
+
         layout = QVBoxLayout()
+        layout.addWidget(self.fetch_status_label)
         layout.addWidget(self.tools_tabs)
         self.setLayout(layout)
 
+    def update_fetch_status(self):
+        """刷新远程分支新鲜度显示"""
+        self.fetch_status_label.setText(self.fetch_coordinator.describe_freshness())
+
     def init_create_branch_tab(self):
         layout = QFormLayout()
         layout.setContentsMargins(16, 16, 16, 16)
@@ -626,8 +823,10 @@ class WorkspaceTab(QWidget):
         mr_button_layout = QHBoxLayout()
         self.view_commits_button = QPushButton('查看提交差异')
         self.create_mr_button = QPushButton('创建合并请求')
+        self.bulk_create_mr_button = QPushButton('批量创建合并请求')
         mr_button_layout.addWidget(self.view_commits_button)
         mr_button_layout.addWidget(self.create_mr_button)
+        mr_button_layout.addWidget(self.bulk_create_mr_button)
 
         self.mr_output = QTextEdit()
         self.mr_output.setReadOnly(True)
@@ -665,6 +864,7 @@ class WorkspaceTab(QWidget):
         self.source_branch_combo.currentIndexChanged.connect(self.update_mr_fields)
         self.view_commits_button.clicked.connect(self.run_view_commits_diff)
         self.create_mr_button.clicked.connect(self.run_create_mr)
+        self.bulk_create_mr_button.clicked.connect(self.run_bulk_create_mr)
         self.refresh_users_button.clicked.connect(self.run_refresh_users)
         self.assignee_combo.currentTextChanged.connect(self.save_gitlab_user_selection)
         self.reviewer_combo.currentTextChanged.connect(self.save_gitlab_user_selection)
@@ -683,7 +883,9 @@ class WorkspaceTab(QWidget):
             self.run_refresh_remote_branches()
             self.run_refresh_branches()
             self.run_refresh_mr_target_branches()
-            self.run_refresh_users()
+            # 先显示本地用户目录，目录较旧时再在后台同步
+            self._set_user_items(get_cached_gitlab_usernames(self.gitlab_url_input.text()))
+            self._sync_users(max_age=USERS_SYNC_MAX_AGE)
             self.initialized = True
 
     def get_default_new_branch_prefix(self, tab_name=None):
@@ -709,18 +911,19 @@ class WorkspaceTab(QWidget):
         QApplication.processEvents()
 
         def _create_all_branches():
-            """执行所有分支创建的阻塞函数"""
-            all_output = []
-            any_success = False
-            for target_branch in target_branches:
-                output = create_branch_func(self.path, target_branch, new_branch)
-                all_output.append(f'--- 对于目标分支: {target_branch} ---\n{output}')
-                if 'Branch created successfully!' in output:
-                    any_success = True
+            """一次 fetch 后在同一个事务中创建所有分支"""
+            results, output = create_branches(self.path, target_branches, new_branch)
+            lines = []
+            for item in results:
+                status = '✅' if item['success'] else '❌'
+                lines.append(f"{status} {item['branch']} ← origin/{item['target']}: {item['message']}")
+            all_output = ['\n'.join(lines), output]
+            any_success = any(item['success'] for item in results)
             return all_output, any_success
 
         def on_success(result):
             all_output, any_success = result
+            self.update_fetch_status()
             self.create_branch_output.setText('\n\n'.join(all_output))
             if any_success and new_branch:
                 self.save_new_branch_to_history(new_branch)
@@ -750,7 +953,7 @@ class WorkspaceTab(QWidget):
     def reload_new_branch_history(self):
         new_branch_text = self.new_branch_combo.currentText()
         try:
-            with shelve.open('cache.db') as db:
+            with open_cache() as db:
                 history = db.get('new_branch_history', [])
             self.new_branch_combo.clear()
             for item in history:
@@ -764,7 +967,7 @@ class WorkspaceTab(QWidget):
 
     def load_new_branch_history(self):
         try:
-            with shelve.open('cache.db') as db:
+            with open_cache() as db:
                 history = db.get('new_branch_history', [])
             for item in history:
                 if self.new_branch_combo.findText(item, Qt.MatchFixedString) < 0:
@@ -776,7 +979,7 @@ class WorkspaceTab(QWidget):
 
     def save_new_branch_to_history(self, name):
         try:
-            with shelve.open('cache.db', writeback=True) as db:
+            with open_cache(writeback=True) as db:
                 history = db.get('new_branch_history', [])
                 if name in history:
                     history.remove(name)
@@ -793,7 +996,7 @@ class WorkspaceTab(QWidget):
 
     def get_new_branch_history(self):
         try:
-            with shelve.open('cache.db') as db:
+            with open_cache() as db:
                 return db.get('new_branch_history', [])
         except Exception:
             return []
@@ -835,7 +1038,7 @@ class WorkspaceTab(QWidget):
         if reply == QMessageBox.No:
             return
         try:
-            with shelve.open('cache.db', writeback=True) as db:
+            with open_cache(writeback=True) as db:
                 db['new_branch_history'] = []
             self.new_branch_combo.clear()
             prefix = self.get_default_new_branch_prefix()
@@ -892,44 +1095,34 @@ class WorkspaceTab(QWidget):
     def run_refresh_users(self):
         self.mr_output.setText('正在刷新用户...')
         QApplication.processEvents()
+        self._sync_users(max_age=0)
 
+    def _sync_users(self, max_age):
+        """在后台同步本地用户目录，完成后更新指派人/审查者下拉框"""
         url = self.gitlab_url_input.text()
         token = self.token_input.text()
 
         def _fetch_users():
-            return get_gitlab_usernames(url, token)
+            return get_gitlab_usernames(url, token, max_age)
 
         def on_success(result):
             users, error = result
             if error:
                 self.mr_output.setText(error)
                 return
-            self.assignee_combo.addItems(users)
-            self.reviewer_combo.addItems(users)
-            self.init_users_selection()
+            self._set_user_items(users)
 
         run_blocking(_fetch_users, on_success=on_success, parent=self)
 
+    def _set_user_items(self, users):
+        """用用户列表替换下拉框内容，保留当前选择"""
+        set_user_items(self.assignee_combo, self.reviewer_combo, users, self._gitlab_config())
+
     def init_users_selection(self):
-        gitlab_config = self.config.find('gitlab') if self.config is not None else None
-        def get_config_value(element, tag, default=''):
-            if element is not None:
-                found = element.find(tag)
-                if found is not None and found.text:
-                    return found.text.strip()
-            return default
-        assignee_default = get_config_value(gitlab_config, 'assignee')
-        reviewer_default = get_config_value(gitlab_config, 'reviewer')
-        if assignee_default and self.assignee_combo.findText(assignee_default, Qt.MatchFixedString) >= 0:
-            self.assignee_combo.setCurrentText(assignee_default)
-        elif assignee_default and self.assignee_combo.count() == 0:
-            self.assignee_combo.addItem(assignee_default)
-            self.assignee_combo.setCurrentText(assignee_default)
-        if reviewer_default and self.reviewer_combo.findText(reviewer_default, Qt.MatchFixedString) >= 0:
-            self.reviewer_combo.setCurrentText(reviewer_default)
-        elif reviewer_default and self.reviewer_combo.count() == 0:
-            self.reviewer_combo.addItem(reviewer_default)
-            self.reviewer_combo.setCurrentText(reviewer_default)
+        init_users_selection(self.assignee_combo, self.reviewer_combo, self._gitlab_config())
+
+    def _gitlab_config(self):
+        return self.config.find('gitlab') if self.config is not None else None
 
     def save_gitlab_user_selection(self):
         gitlab_config = self.config.find('gitlab')
@@ -954,8 +1147,12 @@ class WorkspaceTab(QWidget):
             if child is None:
                 child = ET.SubElement(parent, tag)
             child.text = text
-        set_child_text(gitlab_config, 'gitlab_url', self.gitlab_url_input.text())
-        set_child_text(gitlab_config, 'private_token', self.token_input.text())
+        url, token = self.gitlab_url_input.text(), self.token_input.text()
+        # URL 或 token 改变后，旧凭据的共享客户端不再使用
+        if (gitlab_config.findtext('gitlab_url'), gitlab_config.findtext('private_token')) != (url, token):
+            close_gitlab_clients(url, token)
+        set_child_text(gitlab_config, 'gitlab_url', url)
+        set_child_text(gitlab_config, 'private_token', token)
         tree = ET.ElementTree(self.config)
         tree.write('config.xml', encoding='UTF-8', xml_declaration=True)
 
@@ -974,11 +1171,8 @@ class WorkspaceTab(QWidget):
 
         self.update_mr_defaults()
 
-    def update_mr_defaults(self):
-        source_branch = self.source_branch_combo.currentText()
-        if not source_branch:
-            return
-
+    def get_mr_templates(self):
+        """配置中的 MR 标题和描述模板"""
         gitlab_config = self.config.find('gitlab') if self.config is not None else None
         def get_config_value(element, tag, default=''):
             if element is not None:
@@ -989,7 +1183,14 @@ class WorkspaceTab(QWidget):
 
         title_template = get_config_value(gitlab_config, 'title_template', 'Draft: {commit_message}')
         description_template = get_config_value(gitlab_config, 'description_template', '{commit_message}')
+        return title_template, description_template
+
+    def update_mr_defaults(self):
+        source_branch = self.source_branch_combo.currentText()
+        if not source_branch:
+            return
 
+        title_template, description_template = self.get_mr_templates()
         defaults, error = get_mr_defaults(self.path, source_branch, title_template, description_template)
         if error:
             self.mr_output.setText(error)
@@ -1027,6 +1228,17 @@ class WorkspaceTab(QWidget):
 
         run_blocking(_create_mr, on_success=on_success, parent=self)
 
+    def run_bulk_create_mr(self):
+        """为匹配前缀的所有 __from__ 分支批量创建 MR"""
+        # 默认前缀取当前源分支 __from__ 之前的部分，即同一批分支的名称
+        source_branch = self.source_branch_combo.currentText()
+        prefix = source_branch.split('__from__')[0] + '__from__' if '__from__' in source_branch else ''
+        title_template, description_template = self.get_mr_templates()
+        dialog = BulkMRDialog(self.path, self.gitlab_url_input.text(), self.token_input.text(),
+                              self.assignee_combo.currentText(), self.reviewer_combo.currentText(),
+                              title_template, description_template, prefix, self)
+        dialog.exec_()
+
     def run_view_commits_diff(self):
         """查看源分支相对于目标分支的提交差异"""
         source_branch = self.source_branch_combo.currentText()
@@ -1047,6 +1259,7 @@ class WorkspaceTab(QWidget):
 
         def on_success(result):
             commits, error = result
+            self.update_fetch_status()
             if error:
                 self.mr_output.setText(error)
                 dialog = CommitDiffDialog(source_branch, target_branch, [], self)
@@ -1180,8 +1393,34 @@ class WorkspaceTab(QWidget):
             }
         ''')
 
+        # 多目标预检按钮 - 次要按钮
+        self.cherry_pick_dry_run_all_button = QPushButton('预检全部目标')
+        self.cherry_pick_dry_run_all_button.setToolTip('对所有匹配源分支前缀的目标分支并行进行冲突预检')
+        self.cherry_pick_dry_run_all_button.setStyleSheet('''
+            QPushButton {
+                background: #f5f5f5;
+                border: 1px solid #ddd;
+                border-radius: 4px;
+                padding: 8px 16px;
+                color: #555;
+            }
+            QPushButton:hover {
+                background: #e8e8e8;
+            }
+            QPushButton:disabled {
+                color: #bbb;
+            }
+        ''')
+
+        # 多目标执行按钮 - 次要按钮
+        self.cherry_pick_fan_out_button = QPushButton('执行到多个目标')
+        self.cherry_pick_fan_out_button.setToolTip('把选中的提交并行 cherry-pick 到多个匹配源分支前缀的目标分支')
+        self.cherry_pick_fan_out_button.setStyleSheet(self.cherry_pick_dry_run_all_button.styleSheet())
+
         button_layout.addWidget(self.cherry_pick_refresh_button)
+        button_layout.addWidget(self.cherry_pick_dry_run_all_button)
         button_layout.addStretch()
+        button_layout.addWidget(self.cherry_pick_fan_out_button)
         button_layout.addWidget(self.cherry_pick_execute_button)
         form_layout.addRow('', button_layout)
 
@@ -1206,12 +1445,18 @@ class WorkspaceTab(QWidget):
         self.cherry_pick_source_combo.currentTextChanged.connect(self.run_cherry_pick_refresh)
         self.cherry_pick_target_combo.currentTextChanged.connect(self.run_cherry_pick_dry_run_on_target_change)
         self.cherry_pick_refresh_button.clicked.connect(self.run_cherry_pick_refresh)
+        self.cherry_pick_dry_run_all_button.clicked.connect(self.run_cherry_pick_dry_run_all_targets)
         self.cherry_pick_execute_button.clicked.connect(self.run_cherry_pick_execute)
+        self.cherry_pick_fan_out_button.clicked.connect(self.run_cherry_pick_fan_out)
 
         self.cherry_pick_tab.setLayout(layout)
 
         # 初始化时触发异步预取
         self.start_background_prefetch()
+        # 后台清理上次运行遗留的临时 worktree
+        run_blocking(open_worktree_pool(self.path).sweep_orphans, parent=self)
+        # 界面显示后询问是否继续上次未完成的 cherry-pick
+        QTimer.singleShot(0, self.check_interrupted_cherry_picks)
         # 立即显示本地数据
         self.load_local_branches_immediately()
 
@@ -1228,39 +1473,27 @@ class WorkspaceTab(QWidget):
         self._branch_cache[cache_key] = (data, time.time())
 
     def start_background_prefetch(self):
-        """后台静默预取 - 检查是否需要 git fetch"""
-        current_time = time.time()
-        # 如果 5 分钟内已进行过 fetch，则跳过
-        if current_time - self._last_fetch_time < self.CACHE_TTL:
+        """后台静默预取 - 远程分支超过 CACHE_TTL 未更新时执行 git fetch"""
+        age = self.fetch_coordinator.age()
+        # 如果 5 分钟内已进行过 fetch，或已有 fetch 在进行，则跳过
+        if age is not None and age < self.CACHE_TTL:
             return
-
-        if self._is_prefetching:
+        if self.fetch_coordinator.is_fetching():
             return
 
-        self._is_prefetching = True
-
         def _do_fetch():
-            import subprocess
-            try:
-                # 静默执行 git fetch，不阻塞 UI
-                subprocess.run(
-                    ['git', 'fetch', '--quiet'],
-                    cwd=self.path,
-                    capture_output=True,
-                    timeout=60
-                )
-                return True
-            except Exception:
-                return False
-
-        def on_fetch_done(success):
-            self._is_prefetching = False
-            if success:
-                self._last_fetch_time = time.time()
+            # 静默执行 git fetch，不阻塞 UI
+            result = self.fetch_coordinator.fetch(max_age=self.CACHE_TTL, timeout=60)
+            return result.ok and not result.from_cache
+
+        def on_fetch_done(fetched):
+            self.update_fetch_status()
+            if fetched:
                 # 清除缓存，强制下次刷新获取新数据
                 self._branch_cache.clear()
 
         run_blocking(_do_fetch, on_success=on_fetch_done, parent=self)
+        self.update_fetch_status()
 
     def load_local_branches_immediately(self):
         """立即加载本地分支数据（本地优先原则）"""
@@ -1501,6 +1734,8 @@ class WorkspaceTab(QWidget):
                 hash_item = self.commit_table.item(row, 1)
                 if hash_item:
                     commit_hash = hash_item.text().replace('⚠️ ', '').replace('∅ ', '')
+                    # 清除上一个目标分支的预检结果，否则新目标分支的 patch-id 标记会被跳过
+                    hash_item.setData(Qt.UserRole, None)
                     for col in range(self.commit_table.columnCount()):
                         item = self.commit_table.item(row, col)
                         if item:
@@ -1516,17 +1751,156 @@ class WorkspaceTab(QWidget):
 
         # 获取所有提交
         all_commits = [commit for _, commit in self.cherry_pick_commit_checkboxes]
+        self._mark_already_applied_commits(all_commits)
         self._perform_dry_run_check(all_commits)
 
+    def _get_candidate_target_branches(self):
+        """目标分支下拉框中的全部候选分支（已按源分支前缀过滤）"""
+        source_branch = self.cherry_pick_source_combo.currentText()
+        branches = []
+        for i in range(self.cherry_pick_target_combo.count()):
+            branch = self.cherry_pick_target_combo.itemText(i)
+            # 跳过 "(无匹配 ...)" 提示项
+            if branch and not branch.startswith('(') and branch != source_branch:
+                branches.append(branch)
+        return branches
+
+    def run_cherry_pick_dry_run_all_targets(self):
+        """对所有候选目标分支并行预检，显示每个目标的冲突/空提交摘要"""
+        if not hasattr(self, 'cherry_pick_commit_checkboxes') or not self.cherry_pick_commit_checkboxes:
+            QMessageBox.warning(self, '提示', '请先点击"刷新提交记录"查看提交列表。')
+            return
+
+        targets = self._get_candidate_target_branches()
+        if not targets:
+            QMessageBox.warning(self, '提示', '没有可预检的目标分支。')
+            return
+
+        # 勾选了提交时只预检勾选的，否则预检全部
+        commits = [commit for checkbox, commit in self.cherry_pick_commit_checkboxes if checkbox.isChecked()]
+        if not commits:
+            commits = [commit for _, commit in self.cherry_pick_commit_checkboxes]
+        commit_hashes = [c['hash'] for c in reversed(commits)]
+
+        self._show_multi_dry_run_summary(None, len(targets))
+        self.cherry_pick_dry_run_all_button.setEnabled(False)
+
+        def _do_dry_run_all():
+            return rank_targets(run_dry_run_many(self.path, targets, commit_hashes))
+
+        def on_done(rows):
+            self.cherry_pick_dry_run_all_button.setEnabled(True)
+            self._show_multi_dry_run_summary(rows, len(targets))
+
+        def on_error(e):
+            self.cherry_pick_dry_run_all_button.setEnabled(True)
+            self._show_multi_dry_run_summary([], len(targets), str(e))
+
+        run_blocking(_do_dry_run_all, on_success=on_done, on_error=on_error, parent=self)
+
+    def _show_multi_dry_run_summary(self, rows, target_count, error=''):
+        """显示多目标预检摘要，rows 为 None 时显示进行中状态"""
+        if getattr(self, 'multi_dry_run_widget', None) is not None:
+            self.multi_dry_run_widget.setParent(None)
+            self.multi_dry_run_widget = None
+
+        widget = QWidget()
+        widget_layout = QVBoxLayout(widget)
+        widget_layout.setContentsMargins(0, 5, 0, 5)
+
+        if rows is None:
+            title = QLabel(f'🔍 正在并行预检 {target_count} 个目标分支...')
+            title.setStyleSheet('color: #3498db; font-size: 12px; padding: 5px;')
+            widget_layout.addWidget(title)
+        elif error:
+            title = QLabel(f'⚠️ 多目标预检失败: {error}')
+            title.setStyleSheet('color: #f39c12; font-size: 12px; padding: 5px;')
+            widget_layout.addWidget(title)
+        else:
+            title = QLabel(f'<b>多目标预检结果（{target_count} 个目标，双击选择）:</b>')
+            title.setStyleSheet('color: #2c3e50; font-size: 13px;')
+            widget_layout.addWidget(title)
+
+            table = QTableWidget(len(rows), 4)
+            table.setHorizontalHeaderLabels(['目标分支', '冲突', '已存在', '状态'])
+            table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            table.setSelectionBehavior(QAbstractItemView.SelectRows)
+            table.verticalHeader().setVisible(False)
+            header = table.horizontalHeader()
+            header.setSectionResizeMode(0, QHeaderView.Stretch)
+            for col in (1, 2, 3):
+                header.setSectionResizeMode(col, QHeaderView.ResizeToContents)
+
+            for row, info in enumerate(rows):
+                table.setItem(row, 0, QTableWidgetItem(info['target']))
+                if info['success']:
+                    table.setItem(row, 1, QTableWidgetItem(str(info['conflicts'])))
+                    table.setItem(row, 2, QTableWidgetItem(str(info['empty_commits'])))
+                    if info['conflicts']:
+                        status, color = '⚠️ 有冲突', '#ffcccc'
+                    elif info['errors']:
+                        status, color = '⚠️ 部分提交无法预检', '#fff3cd'
+                    else:
+                        status, color = '✅ 无冲突', '#d4edda'
+                else:
+                    table.setItem(row, 1, QTableWidgetItem('-'))
+                    table.setItem(row, 2, QTableWidgetItem('-'))
+                    status, color = f'❌ {info["error"]}', '#fff3cd'
+                status_item = QTableWidgetItem(status)
+                status_item.setToolTip(status)
+                table.setItem(row, 3, status_item)
+                for col in range(4):
+                    table.item(row, col).setBackground(QColor(color))
+
+            table.setFixedHeight(min(8, len(rows)) * 30 + 30)
+            # 双击切换目标分支，会触发该目标的逐提交预检
+            table.cellDoubleClicked.connect(
+                lambda r, _c, t=table: self.cherry_pick_target_combo.setCurrentText(t.item(r, 0).text()))
+            widget_layout.addWidget(table)
+
+        self.multi_dry_run_widget = widget
+        self.cherry_pick_diff_scroll_area.addWidget(widget)
+
+    def _mark_already_applied_commits(self, commits):
+        """用 patch-id 索引快速标记内容已在目标分支中的提交，不等待冲突预检"""
+        target_branch = self.cherry_pick_target_combo.currentText()
+        if not target_branch:
+            return
+        commit_hashes = [c['hash'] for c in commits]
+
+        def _do_classify():
+            return get_patch_id_index(self.path).already_applied(target_branch, commit_hashes)
+
+        def on_classified(applied):
+            if not hasattr(self, 'commit_table') or not self.commit_table:
+                return
+            # 目标分支已切换，结果作废
+            if self.cherry_pick_target_combo.currentText() != target_branch:
+                return
+            applied_short = {h[:8] for h in applied}
+            for row in range(self.commit_table.rowCount()):
+                hash_item = self.commit_table.item(row, 1)
+                if not hash_item or hash_item.text() not in applied_short:
+                    continue
+                # 预检已给出结果的行（包括无冲突的行）以预检结果为准
+                if hash_item.data(Qt.UserRole) is not None:
+                    continue
+                for col in range(self.commit_table.columnCount()):
+                    item = self.commit_table.item(row, col)
+                    if item:
+                        item.setBackground(QColor('#d0d0d0'))
+                        if col == 1:
+                            item.setText(f'∅ {hash_item.text()}')
+                            item.setToolTip('此提交内容已在目标分支中（patch-id 相同），将自动跳过')
+
+        # patch-id 计算失败不影响冲突预检，不处理错误
+        run_blocking(_do_classify, on_success=on_classified, parent=self)
+
     def _perform_dry_run_check(self, commits):
         """执行 cherry-pick 预检（Dry Run）
 
-        使用 git cherry-pick --no-commit 检测是否存在冲突
+        在不触碰工作区的情况下模拟按从旧到新的顺序应用提交，检测冲突和空提交
         """
-        import subprocess
-        import tempfile
-        import shutil
-
         target_branch = self.cherry_pick_target_combo.currentText()
         if not target_branch:
             if hasattr(self, 'dry_run_status_label') and self.dry_run_status_label:
@@ -1535,105 +1909,29 @@ class WorkspaceTab(QWidget):
             # 预检失败不阻止执行
             return
 
-        # 提取提交哈希列表
-        commit_hashes = [c['hash'] for c in commits]
+        # 提交列表按 git log 顺序（从新到旧）显示，应用时需要从旧到新
+        commit_hashes = [c['hash'] for c in reversed(commits)]
+        # 预检完成后不再显示文件重叠预测
+        dry_run_state = {'finished': False}
 
-        def _do_dry_run():
-            try:
-                # 创建临时目录用于 worktree
-                temp_dir = tempfile.mkdtemp(prefix='cherry_pick_dryrun_')
-
-                # 创建 worktree
-                worktree_result = subprocess.run(
-                    ['git', 'worktree', 'add', temp_dir, target_branch],
-                    cwd=self.path,
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
+        def _do_predict():
+            return predict_conflicts(self.path, target_branch, commit_hashes)
 
-                if worktree_result.returncode != 0:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    return {'success': False, 'error': f'无法创建 worktree: {worktree_result.stderr}'}
-
-                conflicts = []
-                empty_commits = []
-                try:
-                    # 逐个检查提交是否有冲突
-                    for commit_hash in commit_hashes:
-                        # 使用 --no-commit 进行预检
-                        result = subprocess.run(
-                            ['git', 'cherry-pick', '--no-commit', commit_hash],
-                            cwd=temp_dir,
-                            capture_output=True,
-                            text=True,
-                            timeout=30
-                        )
-
-                        if result.returncode != 0:
-                            # 检查是否是空提交（内容已存在）
-                            is_empty = 'empty' in result.stdout.lower() or 'empty' in result.stderr.lower()
-                            # 检查是否是冲突
-                            is_conflict = 'conflict' in result.stdout.lower() or 'conflict' in result.stderr.lower()
-
-                            if is_conflict and not is_empty:
-                                conflicts.append(commit_hash[:8])
-                            elif is_empty:
-                                empty_commits.append(commit_hash[:8])
-
-                            # 中止当前的 cherry-pick
-                            subprocess.run(
-                                ['git', 'cherry-pick', '--abort'],
-                                cwd=temp_dir,
-                                capture_output=True,
-                                timeout=10
-                            )
-                        else:
-                            # 成功，检查是否有实际更改（可能是空提交）
-                            status_result = subprocess.run(
-                                ['git', 'status', '--porcelain'],
-                                cwd=temp_dir,
-                                capture_output=True,
-                                text=True,
-                                timeout=10
-                            )
-                            if not status_result.stdout.strip():
-                                # 没有更改，说明提交内容已存在
-                                empty_commits.append(commit_hash[:8])
-
-                        # 确保每次都重置到干净状态（无论成功还是失败）
-                        subprocess.run(
-                            ['git', 'reset', '--hard', 'HEAD'],
-                            cwd=temp_dir,
-                            capture_output=True,
-                            timeout=10
-                        )
-
-                    return {'success': True, 'conflicts': conflicts, 'empty_commits': empty_commits}
-
-                finally:
-                    # 清理 worktree（使用 --force 强制删除）
-                    subprocess.run(
-                        ['git', 'worktree', 'remove', '--force', temp_dir],
-                        cwd=self.path,
-                        capture_output=True,
-                        timeout=10
-                    )
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    # 清理可能残留的 worktree 记录
-                    subprocess.run(
-                        ['git', 'worktree', 'prune'],
-                        cwd=self.path,
-                        capture_output=True,
-                        timeout=10
-                    )
-
-            except Exception as e:
-                return {'success': False, 'error': str(e)}
+        def on_predicted(predictions):
+            if dry_run_state['finished'] or self.cherry_pick_target_combo.currentText() != target_branch:
+                return
+            self._show_conflict_predictions(predictions)
+
+        def _do_dry_run():
+            return run_dry_run(self.path, target_branch, commit_hashes)
 
         def on_dry_run_done(result):
+            dry_run_state['finished'] = True
             if not hasattr(self, 'dry_run_status_label') or not self.dry_run_status_label:
                 return
+            # 目标分支已切换，结果作废
+            if self.cherry_pick_target_combo.currentText() != target_branch:
+                return
 
             if not result['success']:
                 self.dry_run_status_label.setText(f'⚠️ 预检失败: {result.get("error", "未知错误")}')
@@ -1644,6 +1942,9 @@ class WorkspaceTab(QWidget):
             conflicts = result.get('conflicts', [])
             empty_commits = result.get('empty_commits', [])
 
+            # 冲突提交涉及的文件，显示在提示中
+            conflict_files = {o['hash'][:8]: o['conflict_files'] for o in result.get('results', [])}
+
             # 在表格中标记冲突和空提交
             if hasattr(self, 'commit_table') and self.commit_table:
                 conflict_set = set(conflicts)
@@ -1653,6 +1954,9 @@ class WorkspaceTab(QWidget):
                     if hash_item:
                         # 清理可能存在的标记前缀
                         raw_hash = hash_item.text().replace('⚠️ ', '').replace('∅ ', '')
+                        # 记录该行的预检结果，之后到达的 patch-id 标记不再覆盖
+                        hash_item.setData(Qt.UserRole, 'conflict' if raw_hash in conflict_set
+                                          else 'empty' if raw_hash in empty_set else 'clean')
                         if raw_hash in conflict_set:
                             # 标记冲突行 - 红色背景
                             for col in range(self.commit_table.columnCount()):
@@ -1661,7 +1965,9 @@ class WorkspaceTab(QWidget):
                                     item.setBackground(QColor('#ffcccc'))
                                     if col == 1:  # Hash 列添加冲突标记
                                         item.setText(f'⚠️ {raw_hash}')
-                                        item.setToolTip('此提交可能存在冲突')
+                                        files = conflict_files.get(raw_hash)
+                                        item.setToolTip('此提交可能存在冲突' + (
+                                            ':\n' + '\n'.join(files) if files else ''))
                         elif raw_hash in empty_set:
                             # 标记空提交行 - 深灰色背景
                             for col in range(self.commit_table.columnCount()):
@@ -1690,20 +1996,60 @@ class WorkspaceTab(QWidget):
                 empty_msg = f'{len(empty_commits)} 个已存在（将跳过）'
                 status_parts.append(f'∅ {empty_msg}')
 
+            # 结果全部来自缓存时提示（目标分支未移动，无需重新模拟）
+            cached_suffix = ''
+            if result.get('results') and result.get('cached') == len(result['results']):
+                cached_suffix = '（缓存）'
+
             if status_parts:
-                self.dry_run_status_label.setText(' | '.join(status_parts))
+                self.dry_run_status_label.setText(' | '.join(status_parts) + cached_suffix)
                 if conflicts:
                     self.dry_run_status_label.setStyleSheet('color: #e74c3c; font-size: 12px; padding: 5px;')
                 else:
                     self.dry_run_status_label.setStyleSheet('color: #7f8c8d; font-size: 12px; padding: 5px;')
             else:
-                self.dry_run_status_label.setText('✅ 预检通过，未检测到冲突')
+                self.dry_run_status_label.setText('✅ 预检通过，未检测到冲突' + cached_suffix)
                 self.dry_run_status_label.setStyleSheet('color: #27ae60; font-size: 12px; padding: 5px;')
 
             self._set_execute_button_conflict(False)
 
+        # 文件重叠预测只是预检完成前的提示，失败时不处理错误
+        run_blocking(_do_predict, on_success=on_predicted, parent=self)
         run_blocking(_do_dry_run, on_success=on_dry_run_done, parent=self)
 
+    def _show_conflict_predictions(self, predictions):
+        """在预检完成前按文件重叠预测标记提交的冲突风险，预检结果出来后会被覆盖"""
+        if not hasattr(self, 'commit_table') or not self.commit_table:
+            return
+        by_short_hash = {h[:8]: p for h, p in predictions.items()}
+        likely = overlap = 0
+        for row in range(self.commit_table.rowCount()):
+            hash_item = self.commit_table.item(row, 1)
+            # 已被 patch-id 标记为已存在的行保持不变
+            if not hash_item or hash_item.text() not in by_short_hash:
+                continue
+            prediction = by_short_hash[hash_item.text()]
+            if prediction['risk'] == RISK_LIKELY:
+                likely += 1
+                color, tip = '#ffe0b2', '很可能冲突（一方删除或双方新增了相同文件）'
+            elif prediction['risk'] == RISK_OVERLAP:
+                overlap += 1
+                color, tip = '#fff3cd', '目标分支也修改了相同文件，可能冲突'
+            else:
+                continue
+            for col in range(self.commit_table.columnCount()):
+                item = self.commit_table.item(row, col)
+                if item:
+                    item.setBackground(QColor(color))
+            hash_item.setToolTip(f'{tip}（按文件重叠预测）:\n' + '\n'.join(prediction['paths']))
+
+        if hasattr(self, 'dry_run_status_label') and self.dry_run_status_label:
+            if likely or overlap:
+                self.dry_run_status_label.setText(
+                    f'🔍 正在进行冲突预检...（初步预测: {likely} 个很可能冲突，{overlap} 个与目标分支改动了相同文件）')
+            else:
+                self.dry_run_status_label.setText('🔍 正在进行冲突预检...（初步预测: 与目标分支没有文件重叠）')
+
     def run_cherry_pick_refresh(self):
         """刷新源分支的提交记录（比较 __from__ 后源分支的差异）"""
         source_branch = self.cherry_pick_source_combo.currentText()
@@ -1721,47 +2067,17 @@ class WorkspaceTab(QWidget):
         QApplication.processEvents()
 
         def _fetch_commits():
-            import subprocess
-
-            # 调用 get_branch_diff 获取差异提交
-            commits, error = get_branch_diff(self.path, source_branch)
+            # 调用 get_branch_diff 获取差异提交（先定向更新 origin/<source>）
+            commits, error = get_branch_diff(self.path, source_branch, max_age=COMMITS_FETCH_MAX_AGE)
 
             if error:
                 return [], [source_branch]
 
-            # 补充每个提交的详细信息（author, email, date）
-            all_commits = []
+            # get_branch_diff 已在单个 git log 进程中返回完整的作者/邮箱/时间信息
             for commit in commits:
-                commit_hash = commit['hash']
-                # 获取提交的详细信息
-                result = subprocess.run(
-                    ['git', 'log', '--pretty=%an|%ae|%ai', '-1', commit_hash],
-                    cwd=self.path,
-                    capture_output=True,
-                    text=True
-                )
-
-                author_name = ''
-                author_email = ''
-                author_date = ''
-
-                if result.returncode == 0 and result.stdout.strip():
-                    parts = result.stdout.strip().split('|')
-                    if len(parts) >= 3:
-                        author_name = parts[0]
-                        author_email = parts[1]
-                        author_date = parts[2]
-
-                all_commits.append({
-                    'hash': commit_hash,
-                    'author': author_name,
-                    'email': author_email,
-                    'date': author_date,
-                    'message': commit['message'],
-                    'source_branch': source_branch
-                })
+                commit['source_branch'] = source_branch
 
-            return all_commits, [source_branch]
+            return commits, [source_branch]
 
         def on_success(result):
             all_commits, matching_branches = result
@@ -1929,11 +2245,83 @@ class WorkspaceTab(QWidget):
             select_buttons_layout.addStretch()
             self.cherry_pick_diff_scroll_area.addWidget(select_buttons_widget)
 
-            # 执行预检
+            # 先用 patch-id 标记已存在的提交，再执行预检
+            self._mark_already_applied_commits(all_commits)
             self._perform_dry_run_check(all_commits)
 
         run_blocking(_fetch_commits, on_success=on_success, parent=self)
 
+    def _get_selected_cherry_pick_commits(self):
+        """提交列表中勾选的提交；没有可用的提交时提示并返回空列表"""
+        if not hasattr(self, 'cherry_pick_commit_checkboxes') or not self.cherry_pick_commit_checkboxes:
+            QMessageBox.warning(self, '提示', '请先点击"刷新提交记录"查看提交列表。')
+            return []
+
+        selected_commits = []
+        for checkbox, commit in self.cherry_pick_commit_checkboxes:
+            if checkbox.isChecked():
+                selected_commits.append(commit)
+
+        if not selected_commits:
+            QMessageBox.warning(self, '提示', '请至少选择一个提交进行 Cherry-Pick。')
+        return selected_commits
+
+    def check_interrupted_cherry_picks(self):
+        """上次关闭或崩溃时未完成的 cherry-pick 任务：继续、放弃并还原，或留到下次"""
+        for record in get_job_store().jobs_for(self.path):
+            total = len(record['commits'])
+            state = '停在冲突处' if record.get('paused') else '中途退出'
+            box = QMessageBox(self)
+            box.setIcon(QMessageBox.Question)
+            box.setWindowTitle('未完成的 Cherry-Pick')
+            box.setText(f'发现未完成的 Cherry-Pick（{state}）:\n'
+                        f'{record.get("source_branch") or "?"} → {record["target_branch"]}，'
+                        f'已完成 {record["position"]}/{total} 个提交。\n\n是否从上次完成的提交继续？')
+            resume_button = box.addButton('继续', QMessageBox.AcceptRole)
+            discard_button = box.addButton('放弃并还原', QMessageBox.DestructiveRole)
+            box.addButton('稍后', QMessageBox.RejectRole)
+            box.exec_()
+
+            if box.clickedButton() is resume_button:
+                dialog = CherryPickConfirmDialog(
+                    source_branch=record.get('source_branch', ''),
+                    target_branch=record['target_branch'],
+                    commits=list(reversed(record['commits'])),
+                    workspace_tab=self,
+                    parent=self,
+                    record=record
+                )
+                dialog.start_execution()
+                dialog.exec_()
+            elif box.clickedButton() is discard_button:
+                job = CherryPickJob.from_record(record)
+                run_blocking(job.abort, parent=self)
+
+    def run_cherry_pick_fan_out(self):
+        """把选中的提交并行 cherry-pick 到多个目标分支"""
+        source_branch = self.cherry_pick_source_combo.currentText()
+        if not source_branch:
+            QMessageBox.warning(self, '提示', '请先选择源分支。')
+            return
+
+        selected_commits = self._get_selected_cherry_pick_commits()
+        if not selected_commits:
+            return
+
+        target_branches = self._get_candidate_target_branches()
+        if not target_branches:
+            QMessageBox.warning(self, '提示', '没有可用的目标分支。')
+            return
+
+        dialog = CherryPickFanOutDialog(
+            source_branch=source_branch,
+            target_branches=target_branches,
+            commits=selected_commits,
+            workspace_tab=self,
+            parent=self
+        )
+        dialog.exec_()
+
     def run_cherry_pick_execute(self):
         """执行 cherry-pick 操作"""
         source_branch = self.cherry_pick_source_combo.currentText()
@@ -1944,17 +2332,8 @@ class WorkspaceTab(QWidget):
             return
 
         # 获取选中的提交
-        if not hasattr(self, 'cherry_pick_commit_checkboxes') or not self.cherry_pick_commit_checkboxes:
-            QMessageBox.warning(self, '提示', '请先点击"刷新提交记录"查看提交列表。')
-            return
-
-        selected_commits = []
-        for checkbox, commit in self.cherry_pick_commit_checkboxes:
-            if checkbox.isChecked():
-                selected_commits.append(commit)
-
+        selected_commits = self._get_selected_cherry_pick_commits()
         if not selected_commits:
-            QMessageBox.warning(self, '提示', '请至少选择一个提交进行 Cherry-Pick。')
             return
 
         # 二阶段确认对话框（包含执行逻辑）
@@ -1982,3 +2361,4 @@ class WorkspaceTab(QWidget):
         # 清除预检状态标签引用
         if hasattr(self, 'dry_run_status_label'):
             self.dry_run_status_label = None
+        self.multi_dry_run_widget = None
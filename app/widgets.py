@@ -13,3 +13,39 @@ def enable_combo_search(combo):
     if hasattr(completer, 'setFilterMode'):
         completer.setFilterMode(Qt.MatchContains)
     combo.setCompleter(completer)
+
+def _config_text(gitlab_config, tag):
+    if gitlab_config is not None:
+        found = gitlab_config.find(tag)
+        if found is not None and found.text:
+            return found.text.strip()
+    return ''
+
+def init_users_selection(assignee_combo, reviewer_combo, gitlab_config):
+    """选中配置中的默认指派人/审查者；下拉框为空时先加入默认值"""
+    for combo, tag in ((assignee_combo, 'assignee'), (reviewer_combo, 'reviewer')):
+        default = _config_text(gitlab_config, tag)
+        if default and combo.findText(default, Qt.MatchFixedString) >= 0:
+            combo.setCurrentText(default)
+        elif default and combo.count() == 0:
+            combo.addItem(default)
+            combo.setCurrentText(default)
+
+def set_user_items(assignee_combo, reviewer_combo, users, gitlab_config):
+    """
+    用用户列表替换指派人/审查者下拉框内容，保留当前选择，再应用配置中的默认值
+
+    替换过程中屏蔽信号，不会触发保存选择等槽函数；列表与现有内容相同时不做任何事。
+    """
+    if [assignee_combo.itemText(i) for i in range(assignee_combo.count())] == users:
+        return
+    for combo in (assignee_combo, reviewer_combo):
+        current = combo.currentText()
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItems(users)
+        index = combo.findText(current, Qt.MatchFixedString) if current else -1
+        if index >= 0:
+            combo.setCurrentIndex(index)
+        combo.blockSignals(False)
+    init_users_selection(assignee_combo, reviewer_combo, gitlab_config)
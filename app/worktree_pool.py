@@ -0,0 +1,405 @@
+"""
+Worktree 池模块 - 每个仓库维护一组可复用的临时 worktree
+
+cherry-pick 执行和预检不再每次 worktree add / remove / prune，而是从池中借出一个 worktree，
+重置到所需的提交（checkout --detach --force + clean）后使用，归还时分离 HEAD，
+避免占用分支。池有大小上限，空闲过久的 worktree 会被回收；创建池时清理上次崩溃遗留的 worktree
+（未完成的持久化 cherry-pick 任务所用的除外，由任务恢复时接管）。
+
+worktree 以 --no-checkout 创建，借出时可按提交改动的文件设置 cone 模式稀疏检出，
+大仓库中只检出相关目录。
+"""
+import hashlib
+import os
+import posixpath
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set
+
+from app.cherry_pick_jobs import get_job_store
+from app.git_object_reader import close_object_reader
+from app.git_refs import RefStoreError, find_git_dirs
+from app.git_runner import git_version, run_git
+
+POOL_ROOT = os.path.join(tempfile.gettempdir(), 'qmr-worktrees')
+MAX_POOL_SIZE = 3
+# 空闲超过该秒数的 worktree 会被回收
+IDLE_TIMEOUT = 600
+# 旧版本直接用 mkdtemp 创建的 worktree 目录前缀，启动时一并清理
+LEGACY_PREFIXES = ('cherry-pick-', 'cherry_pick_dryrun_')
+# sparse-checkout 的 cone 模式和 --stdin 从 2.27 开始稳定可用
+SPARSE_CHECKOUT_MIN_VERSION = (2, 27)
+
+
+class WorktreePoolError(Exception):
+    """无法准备 worktree"""
+
+
+def supports_sparse_checkout() -> bool:
+    """当前 git 是否支持 cone 模式的 sparse-checkout set / add --stdin"""
+    return git_version() >= SPARSE_CHECKOUT_MIN_VERSION
+
+
+def cone_directories(paths: Iterable[str]) -> FrozenSet[str]:
+    """文件路径所在的目录；根目录下的文件在 cone 模式下总会检出，无需列出"""
+    return frozenset(posixpath.dirname(p) for p in paths if '/' in p)
+
+
+def changed_paths(repo_path: str, commit_hashes: List[str]) -> Optional[List[str]]:
+    """一组提交改动过的全部文件（不做重命名检测，新旧路径都包含），失败时返回 None"""
+    if not commit_hashes:
+        return []
+    result = run_git(['log', '--no-walk=unsorted', '--no-renames', '--name-only', '--format=', *commit_hashes],
+                     repo_path)
+    if not result.ok:
+        return None
+    return sorted({line for line in result.stdout.split('\n') if line})
+
+
+def _common_dir(repo_path: str) -> str:
+    """仓库的公共 git 目录；同一仓库的各个 worktree 共用一个池"""
+    try:
+        _, common_dir = find_git_dirs(repo_path)
+    except RefStoreError:
+        common_dir = repo_path
+    return os.path.normcase(os.path.abspath(common_dir))
+
+
+class _Slot:
+    def __init__(self, path: str):
+        self.path = path
+        self.busy = False
+        self.last_used = time.time()
+        # 稀疏检出的目录集合，None 表示完整检出
+        self.cone: Optional[FrozenSet[str]] = None
+        # 接管的 worktree 不知道稀疏检出状态，下次借出时总是重新设置
+        self.cone_known = True
+
+
+class WorktreePool:
+    """
+    单个仓库的 worktree 池，线程安全
+
+    池满时 acquire 会等待其他调用方归还。
+    """
+
+    def __init__(self, repo_path: str, max_size: int = MAX_POOL_SIZE, idle_timeout: float = IDLE_TIMEOUT):
+        self.repo_path = os.path.abspath(repo_path)
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self._condition = Condition(Lock())
+        self._slots: List[_Slot] = []
+        # 正在创建的 worktree 目录
+        self._reserved: Set[str] = set()
+        self._closed = False
+        self._swept = False
+        self._sweep_lock = Lock()
+        digest = hashlib.sha1(_common_dir(self.repo_path).encode('utf-8')).hexdigest()[:12]
+        self.pool_dir = os.path.join(POOL_ROOT, digest)
+
+    def _registered_worktrees(self) -> List[str]:
+        result = run_git(['worktree', 'list', '--porcelain'], self.repo_path)
+        if not result.ok:
+            return []
+        return [line[len('worktree '):] for line in result.stdout.splitlines() if line.startswith('worktree ')]
+
+    def _remove_worktree(self, path: str):
+        # 冲突解决等界面可能为该 worktree 打开过对象读取器，随 worktree 一起关闭
+        close_object_reader(path)
+        run_git(['worktree', 'remove', '--force', path], self.repo_path, timeout=30)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def sweep_orphans(self):
+        """清理上次运行遗留的池目录和旧版本的临时 worktree，每个池只执行一次"""
+        with self._sweep_lock:
+            if self._swept:
+                return
+            self._sweep()
+            self._swept = True
+
+    def _sweep(self):
+        temp_root = os.path.normcase(os.path.abspath(tempfile.gettempdir()))
+        pool_dir = os.path.normcase(self.pool_dir)
+        # 未完成的 cherry-pick 任务还要在原 worktree 中继续，不能清理
+        protected = get_job_store().worktree_paths()
+        for path in self._registered_worktrees():
+            normalized = os.path.normcase(os.path.abspath(path))
+            if normalized in protected:
+                continue
+            is_pool_slot = os.path.dirname(normalized) == pool_dir
+            is_legacy = (os.path.dirname(normalized) == temp_root
+                         and os.path.basename(normalized).startswith(LEGACY_PREFIXES))
+            if is_pool_slot or is_legacy:
+                self._remove_worktree(path)
+        if os.path.isdir(self.pool_dir):
+            for name in os.listdir(self.pool_dir):
+                path = os.path.join(self.pool_dir, name)
+                if os.path.normcase(path) not in protected:
+                    shutil.rmtree(path, ignore_errors=True)
+        run_git(['worktree', 'prune'], self.repo_path)
+
+    def _reserve_path(self) -> str:
+        """在持有锁时为新 worktree 分配一个未被占用的目录名"""
+        taken = {slot.path for slot in self._slots} | self._reserved
+        index = 0
+        # 跳过持久化任务保留的目录
+        while (os.path.join(self.pool_dir, f'slot-{index}') in taken
+               or os.path.exists(os.path.join(self.pool_dir, f'slot-{index}'))):
+            index += 1
+        path = os.path.join(self.pool_dir, f'slot-{index}')
+        self._reserved.add(path)
+        return path
+
+    def _create_slot(self, path: str, commitish: str) -> _Slot:
+        """创建不检出文件的 worktree，文件由随后的 _reset_slot 按稀疏范围检出"""
+        os.makedirs(self.pool_dir, exist_ok=True)
+        shutil.rmtree(path, ignore_errors=True)
+        result = run_git(['worktree', 'add', '--detach', '--force', '--no-checkout', path, commitish],
+                         self.repo_path, timeout=120)
+        if not result.ok:
+            shutil.rmtree(path, ignore_errors=True)
+            raise WorktreePoolError(f'无法创建 worktree: {result.stderr.strip()}')
+        return _Slot(path)
+
+    @staticmethod
+    def _apply_cone(slot: _Slot, cone: Optional[FrozenSet[str]]):
+        """切换 worktree 的稀疏检出范围，None 表示完整检出"""
+        if slot.cone_known and cone == slot.cone:
+            return
+        if cone is None:
+            result = run_git(['sparse-checkout', 'disable'], slot.path, timeout=120)
+        else:
+            result = run_git(['sparse-checkout', 'set', '--cone', '--stdin'], slot.path,
+                             input=''.join(f'{d}\n' for d in sorted(cone)), timeout=120)
+        if not result.ok:
+            raise WorktreePoolError(f'无法设置稀疏检出: {result.stderr.strip()}')
+        slot.cone = cone
+        slot.cone_known = True
+
+    def _clear_operation_state(self, path: str):
+        """中止遗留的 cherry-pick（冲突后未处理的状态会阻止下一次 cherry-pick）"""
+        try:
+            git_dir, _ = find_git_dirs(path)
+        except RefStoreError:
+            return
+        if (os.path.exists(os.path.join(git_dir, 'CHERRY_PICK_HEAD'))
+                or os.path.isdir(os.path.join(git_dir, 'sequencer'))):
+            run_git(['cherry-pick', '--quit'], path)
+
+    def _reset_slot(self, slot: _Slot, commitish: str, cone: Optional[FrozenSet[str]]):
+        self._clear_operation_state(slot.path)
+        self._apply_cone(slot, cone)
+        result = run_git(['checkout', '--detach', '--force', commitish], slot.path, timeout=120)
+        if not result.ok:
+            raise WorktreePoolError(f'无法重置 worktree 到 {commitish}: {result.stderr.strip()}')
+        run_git(['clean', '-fdq'], slot.path)
+
+    def acquire(self, commitish: str, sparse_paths: Optional[Iterable[str]] = None) -> str:
+        """
+        借出一个 worktree，HEAD 分离在 commitish，工作区干净
+
+        Args:
+            commitish: 要检出的提交
+            sparse_paths: 只检出这些文件所在的目录（cone 模式）；None 或 git 不支持稀疏检出时完整检出
+
+        Returns:
+            worktree 路径，用完必须调用 release
+
+        Raises:
+            WorktreePoolError: 创建或重置 worktree 失败
+        """
+        cone = None
+        if sparse_paths is not None and supports_sparse_checkout():
+            cone = cone_directories(sparse_paths)
+        self.sweep_orphans()
+        self.evict_idle()
+        with self._condition:
+            while True:
+                # 等待期间池可能被关闭
+                if self._closed:
+                    raise WorktreePoolError('worktree 池已关闭')
+                slot = next((s for s in self._slots if not s.busy), None)
+                if slot is not None:
+                    slot.busy = True
+                    break
+                if len(self._slots) + len(self._reserved) < self.max_size:
+                    path = self._reserve_path()
+                    break
+                self._condition.wait()
+
+        if slot is None:
+            try:
+                slot = self._create_slot(path, commitish)
+                slot.busy = True
+            finally:
+                with self._condition:
+                    self._reserved.discard(path)
+                    if slot is not None:
+                        self._slots.append(slot)
+                    self._condition.notify()
+
+        try:
+            self._reset_slot(slot, commitish, cone)
+        except Exception:
+            self._discard(slot)
+            raise
+        return slot.path
+
+    def release(self, path: str):
+        """归还 worktree：分离 HEAD，使其中检出的分支可以在别处使用"""
+        with self._condition:
+            slot = next((s for s in self._slots if s.path == path), None)
+        if slot is None:
+            return
+        self._clear_operation_state(path)
+        if not run_git(['checkout', '--detach', '--force'], path).ok:
+            self._discard(slot)
+            return
+        with self._condition:
+            slot.busy = False
+            slot.last_used = time.time()
+            self._condition.notify()
+        if self._closed:
+            self.close()
+
+    def owns(self, path: str) -> bool:
+        """path 是否是池中的 worktree"""
+        normalized = os.path.normcase(os.path.abspath(path))
+        with self._condition:
+            return any(os.path.normcase(s.path) == normalized for s in self._slots)
+
+    def adopt(self, path: str) -> bool:
+        """
+        接管上次运行留下的 worktree（持久化的 cherry-pick 任务），以借出状态加入池中
+
+        Returns:
+            path 是本仓库登记的 worktree 且已加入池中时返回 True
+        """
+        path = os.path.abspath(path)
+        normalized = os.path.normcase(path)
+        registered = {os.path.normcase(os.path.abspath(p)) for p in self._registered_worktrees()}
+        if normalized not in registered:
+            return False
+        with self._condition:
+            if self._closed or any(os.path.normcase(s.path) == normalized for s in self._slots):
+                return False
+            slot = _Slot(path)
+            slot.busy = True
+            slot.cone_known = False
+            self._slots.append(slot)
+        return True
+
+    def expand(self, path: str, paths: Iterable[str]):
+        """把 paths 所在的目录加入已借出 worktree 的稀疏检出范围（如冲突涉及范围外的文件）"""
+        with self._condition:
+            slot = next((s for s in self._slots if s.path == path), None)
+        if slot is None or slot.cone is None:
+            return
+        extra = cone_directories(paths) - slot.cone
+        if not extra:
+            return
+        result = run_git(['sparse-checkout', 'add', '--stdin'], path,
+                         input=''.join(f'{d}\n' for d in sorted(extra)), timeout=120)
+        if result.ok:
+            slot.cone = slot.cone | extra
+
+    @contextmanager
+    def lease(self, commitish: str, sparse_paths: Optional[Iterable[str]] = None) -> Iterator[str]:
+        """with 块内借用 worktree"""
+        path = self.acquire(commitish, sparse_paths)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _discard(self, slot: _Slot):
+        with self._condition:
+            if slot in self._slots:
+                self._slots.remove(slot)
+            self._condition.notify()
+        self._remove_worktree(slot.path)
+
+    def evict_idle(self):
+        """回收空闲超过 idle_timeout 的 worktree"""
+        now = time.time()
+        with self._condition:
+            expired = [s for s in self._slots if not s.busy and now - s.last_used > self.idle_timeout]
+            for slot in expired:
+                self._slots.remove(slot)
+        for slot in expired:
+            self._remove_worktree(slot.path)
+        if expired:
+            run_git(['worktree', 'prune'], self.repo_path)
+
+    def close(self):
+        """移除所有空闲的 worktree；仍被借出的在归还时移除"""
+        with self._condition:
+            self._closed = True
+            idle = [s for s in self._slots if not s.busy]
+            for slot in idle:
+                self._slots.remove(slot)
+            self._condition.notify_all()
+        for slot in idle:
+            self._remove_worktree(slot.path)
+        if idle:
+            run_git(['worktree', 'prune'], self.repo_path)
+
+
+# 每个仓库（按公共 git 目录）一个 worktree 池，以及使用它的工作区路径
+_pools: Dict[str, WorktreePool] = {}
+_pool_users: Dict[str, Set[str]] = {}
+# 已关闭的池；关闭后仍在收尾的预检、批量执行不能再创建新池，否则其 worktree 无人清理
+_closed_pools: Set[str] = set()
+_pools_lock = Lock()
+
+
+def _get_pool(key: str, repo_path: str) -> WorktreePool:
+    pool = _pools.get(key)
+    if pool is None:
+        pool = WorktreePool(repo_path)
+        _pools[key] = pool
+    return pool
+
+
+def open_worktree_pool(repo_path: str) -> WorktreePool:
+    """工作区打开时调用：登记使用者并返回池，池已关闭时重新创建"""
+    repo_path = os.path.abspath(repo_path)
+    key = _common_dir(repo_path)
+    with _pools_lock:
+        _closed_pools.discard(key)
+        _pool_users.setdefault(key, set()).add(repo_path)
+        return _get_pool(key, repo_path)
+
+
+def get_worktree_pool(repo_path: str) -> WorktreePool:
+    """
+    获取仓库对应的 worktree 池；同一仓库的不同 worktree 共用一个池（池目录也按公共 git 目录区分）
+
+    Raises:
+        WorktreePoolError: 池已由 close_worktree_pool 关闭
+    """
+    repo_path = os.path.abspath(repo_path)
+    key = _common_dir(repo_path)
+    with _pools_lock:
+        if key in _closed_pools:
+            raise WorktreePoolError('worktree 池已关闭')
+        return _get_pool(key, repo_path)
+
+
+def close_worktree_pool(repo_path: str):
+    """工作区关闭时调用；同一仓库的其他工作区都已关闭时才关闭并移除池，之后 get_worktree_pool 不再创建"""
+    repo_path = os.path.abspath(repo_path)
+    key = _common_dir(repo_path)
+    with _pools_lock:
+        users = _pool_users.get(key, set())
+        users.discard(repo_path)
+        if users:
+            return
+        _pool_users.pop(key, None)
+        _closed_pools.add(key)
+        pool = _pools.pop(key, None)
+    if pool is not None:
+        pool.close()
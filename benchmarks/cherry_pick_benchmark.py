@@ -0,0 +1,460 @@
+"""
+Cherry-pick 性能基准 - 在本地生成的合成仓库上测量提交列表、预检和执行的耗时、git 进程数与内存峰值
+
+不依赖界面，直接调用界面背后的函数：
+- listing：刷新提交记录（quick_generate_mr_form.get_branch_diff）
+- predict：按文件重叠预测冲突（conflict_predictor.predict_conflicts）
+- dry-run / dry-run-all：单目标预检和多目标并行预检（不使用预检缓存）
+- execute / execute-all：CherryPickJob 和 FanOutJob 执行并推送到本地的裸仓库，每轮结束后把目标分支恢复原位
+
+每个阶段在独立的子进程中运行，内存峰值互不影响；子进程内先完成不计时的准备（如获取提交列表），
+再重复执行 --repeat 次。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.cherry_pick_benchmark --files 2000 --depth 500 --branches 4 --commits 30 \\
+        --conflict-density 0.2 --repeat 3 --json result.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.git_runner import get_spawn_count, run_git  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHASES = ['listing', 'predict', 'dry-run', 'dry-run-all', 'execute', 'execute-all']
+# 合成仓库中的分支命名：目标分支 release/N，功能分支基于 release/0
+TARGET_PREFIX = 'release/'
+FEATURE_BRANCH = 'feature__from__release@0'
+# 每个文件的行数；功能分支改第 FEATURE_LINE 行，冲突的目标分支提交改同一行，其他提交改第 0 行
+LINES_PER_FILE = 8
+FEATURE_LINE = 4
+FILES_PER_DIR = 50
+IDENTITY = 'Benchmark <benchmark@localhost>'
+
+
+class BenchmarkError(Exception):
+    """合成仓库生成或基准阶段失败"""
+
+
+def _git(args: List[str], cwd: str, input: Optional[bytes] = None) -> str:
+    result = run_git(args, cwd, input=input, timeout=600)
+    if not result.ok:
+        raise BenchmarkError(f'git {" ".join(args[:2])} 失败: {result.stderr.strip()}')
+    return result.stdout
+
+
+# ---------------------------------------------------------------------------
+# 合成仓库
+# ---------------------------------------------------------------------------
+
+class _HistoryWriter:
+    """生成 git fast-import 的输入流，一个进程写入全部历史"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.mark = 0
+        self.timestamp = 1700000000
+        # 被修改过的文件内容，未修改的文件按序号生成
+        self.contents: Dict[int, List[str]] = {}
+
+    @staticmethod
+    def path_of(index: int) -> str:
+        return f'src/m{index // FILES_PER_DIR}/f{index}.txt'
+
+    def lines_of(self, index: int) -> List[str]:
+        return self.contents.get(index) or [f'file {index} line {k}' for k in range(LINES_PER_FILE)]
+
+    def _data(self, text: str):
+        data = text.encode('utf-8')
+        self.chunks.append(b'data %d\n' % len(data) + data + b'\n')
+
+    def commit(self, branch: str, message: str, changes: Dict[int, List[str]], parent: Optional[int] = None) -> int:
+        """在 branch 上提交 changes（{文件序号: 全部行}），parent 为起点的 mark，返回新提交的 mark"""
+        self.mark += 1
+        self.timestamp += 60
+        self.chunks.append(f'commit refs/heads/{branch}\nmark :{self.mark}\n'
+                           f'committer {IDENTITY} {self.timestamp} +0000\n'.encode('utf-8'))
+        self._data(message)
+        if parent is not None:
+            self.chunks.append(f'from :{parent}\n'.encode('utf-8'))
+        for index, lines in changes.items():
+            self.chunks.append(f'M 100644 inline {self.path_of(index)}\n'.encode('utf-8'))
+            self._data('\n'.join(lines) + '\n')
+        return self.mark
+
+    def edit(self, index: int, line: int, text: str) -> List[str]:
+        lines = list(self.lines_of(index))
+        lines[line] = text
+        return lines
+
+    def reset(self, branch: str, mark: int):
+        self.chunks.append(f'reset refs/heads/{branch}\nfrom :{mark}\n\n'.encode('utf-8'))
+
+    def stream(self) -> bytes:
+        return b''.join(self.chunks) + b'done\n'
+
+
+def generate_repo(root: str, files: int, depth: int, branches: int, commits: int, target_commits: int,
+                  conflict_density: float, seed: int = 0) -> dict:
+    """
+    生成合成仓库：root/origin.git 为裸仓库，root/work 为克隆出的工作仓库
+
+    - main：一个包含 files 个文件的初始提交，之后 depth 个各改一个文件的提交
+    - release/0 .. release/{branches-1}：从 main 分出，各有 target_commits 个提交
+    - feature__from__release@0：从 main 分出，commits 个提交，各改一个不同的文件；
+      其中 conflict_density 比例的文件在每个目标分支上都被改了同一行，cherry-pick 时会冲突
+
+    Returns:
+        {'repo', 'origin', 'feature_branch', 'targets', 'conflict_files'}
+    """
+    if commits > files:
+        raise BenchmarkError('--commits 不能大于 --files')
+    rng = random.Random(seed)
+    origin = os.path.join(root, 'origin.git')
+    work = os.path.join(root, 'work')
+    os.makedirs(origin)
+    _git(['init', '-q', '--bare'], origin)
+    _git(['symbolic-ref', 'HEAD', 'refs/heads/main'], origin)
+
+    writer = _HistoryWriter()
+    tip = writer.commit('main', 'initial', {i: writer.lines_of(i) for i in range(files)})
+
+    feature_files = rng.sample(range(files), commits)
+    conflict_files = rng.sample(feature_files, round(commits * conflict_density))
+    feature_set = set(feature_files)
+    # 目标分支上与功能分支无关的提交只改其他文件，避免意外冲突
+    other_files = [i for i in range(files) if i not in feature_set] or list(range(files))
+
+    for n in range(depth):
+        index = rng.randrange(files)
+        lines = writer.edit(index, 0, f'main change {n}')
+        tip = writer.commit('main', f'main change {n}', {index: lines}, tip)
+        writer.contents[index] = lines
+    base_contents = dict(writer.contents)
+
+    targets = []
+    for t in range(branches):
+        branch = f'{TARGET_PREFIX}{t}'
+        targets.append(branch)
+        writer.contents = dict(base_contents)
+        branch_tip = tip
+        if conflict_files:
+            branch_tip = writer.commit(branch, f'{branch}: touch feature lines',
+                                       {i: writer.edit(i, FEATURE_LINE, f'{branch} change') for i in conflict_files},
+                                       branch_tip)
+        for n in range(target_commits):
+            index = rng.choice(other_files)
+            lines = writer.edit(index, 0, f'{branch} change {n}')
+            branch_tip = writer.commit(branch, f'{branch} change {n}', {index: lines}, branch_tip)
+            writer.contents[index] = lines
+        if branch_tip == tip:
+            # 没有任何提交的目标分支也要创建出来
+            writer.reset(branch, tip)
+
+    writer.contents = dict(base_contents)
+    feature_tip = tip
+    for n, index in enumerate(feature_files):
+        feature_tip = writer.commit(FEATURE_BRANCH, f'feature change {n}',
+                                    {index: writer.edit(index, FEATURE_LINE, f'feature change {n}')}, feature_tip)
+
+    _git(['fast-import', '--quiet', '--done'], origin, input=writer.stream())
+    _git(['clone', '-q', origin, work], root)
+    _git(['config', 'user.name', 'Benchmark'], work)
+    _git(['config', 'user.email', 'benchmark@localhost'], work)
+    _git(['branch', '-q', FEATURE_BRANCH, f'origin/{FEATURE_BRANCH}'], work)
+    return {'repo': work, 'origin': origin, 'feature_branch': FEATURE_BRANCH, 'targets': targets,
+            'conflict_files': len(conflict_files)}
+
+
+# ---------------------------------------------------------------------------
+# 阶段（在子进程中运行）
+#
+# 每个阶段先做不计时的准备，返回 (run, reset)：run 为计时部分，返回阶段相关的计数；
+# reset 不计时，在每轮之后把仓库恢复到初始状态，可为 None
+# ---------------------------------------------------------------------------
+
+def _list_commits(ctx: dict) -> List[dict]:
+    """功能分支的提交，按 git log 顺序（从新到旧）"""
+    from quick_generate_mr_form import get_branch_diff
+    commits, error = get_branch_diff(ctx['repo'], ctx['feature_branch'])
+    if error:
+        raise BenchmarkError(error)
+    return commits
+
+
+def _target_starts(ctx: dict, targets: List[str]) -> Dict[str, str]:
+    return {t: _git(['rev-parse', f'origin/{t}'], ctx['repo']).strip() for t in targets}
+
+
+def _restore_targets(repo: str, start_shas: Dict[str, str]):
+    """把执行阶段移动过的目标分支（本地、远程和远程跟踪分支）恢复到执行前的位置"""
+    _git(['push', '-q', '--force', 'origin', *[f'{sha}:refs/heads/{t}' for t, sha in start_shas.items()]], repo)
+    for target, sha in start_shas.items():
+        _git(['update-ref', f'refs/heads/{target}', sha], repo)
+        _git(['update-ref', f'refs/remotes/origin/{target}', sha], repo)
+
+
+def _phase_listing(ctx: dict):
+    # 模块导入（含 python-gitlab）不计入耗时
+    import quick_generate_mr_form  # noqa: F401
+
+    def run():
+        return {'commits': len(_list_commits(ctx))}
+    return run, None
+
+
+def _phase_predict(ctx: dict):
+    from app.conflict_predictor import RISK_NONE, predict_conflicts
+    hashes = [c['hash'] for c in reversed(_list_commits(ctx))]
+    target = f'origin/{ctx["targets"][0]}'
+
+    def run():
+        predictions = predict_conflicts(ctx['repo'], target, hashes)
+        return {'commits': len(hashes), 'at_risk': sum(p['risk'] != RISK_NONE for p in predictions.values())}
+    return run, None
+
+
+def _phase_dry_run(ctx: dict):
+    from app.cherry_pick_dry_run import run_dry_run
+    hashes = [c['hash'] for c in reversed(_list_commits(ctx))]
+    target = f'origin/{ctx["targets"][0]}'
+
+    def run():
+        result = run_dry_run(ctx['repo'], target, hashes, use_cache=False)
+        if not result['success']:
+            raise BenchmarkError(result['error'])
+        return {'engine': result['engine'], 'commits': len(hashes), 'conflicts': len(result['conflicts'])}
+    return run, None
+
+
+def _phase_dry_run_all(ctx: dict):
+    from app.cherry_pick_dry_run import run_dry_run_many
+    hashes = [c['hash'] for c in reversed(_list_commits(ctx))]
+    targets = [f'origin/{t}' for t in ctx['targets']]
+    # run_dry_run_many 总是使用预检缓存，每轮之前清空，保证测到的是完整预检
+    _clear_dry_run_cache()
+
+    def run():
+        results = run_dry_run_many(ctx['repo'], targets, hashes)
+        errors = [r['error'] for r in results.values() if not r['success']]
+        if errors:
+            raise BenchmarkError(errors[0])
+        return {'targets': len(targets), 'conflicts': sum(len(r['conflicts']) for r in results.values())}
+    return run, _clear_dry_run_cache
+
+
+def _clear_dry_run_cache():
+    from app.dry_run_cache import get_dry_run_cache
+    get_dry_run_cache().clear()
+
+
+def _phase_execute(ctx: dict):
+    from app.cherry_pick_executor import CherryPickJob
+    commits = list(reversed(_list_commits(ctx)))
+    target = ctx['targets'][0]
+    starts = _target_starts(ctx, [target])
+
+    def run():
+        job = CherryPickJob(ctx['repo'], target, commits, source_branch=ctx['feature_branch'])
+        result = job.run()
+        if result['paused']:
+            job.abort()
+        return {'applied': result['applied'], 'conflict': result['paused'], 'pushed': result['pushed']}
+    return run, lambda: _restore_targets(ctx['repo'], starts)
+
+
+def _phase_execute_all(ctx: dict):
+    from app.cherry_pick_executor import FanOutJob
+    commits = list(reversed(_list_commits(ctx)))
+    starts = _target_starts(ctx, ctx['targets'])
+
+    def run():
+        summary = FanOutJob(ctx['repo'], ctx['targets'], commits).run()
+        return {'succeeded': len(summary['succeeded']), 'conflicted': len(summary['conflicted']),
+                'failed': len(summary['failed'])}
+    return run, lambda: _restore_targets(ctx['repo'], starts)
+
+
+_PHASE_FACTORIES = {
+    'listing': _phase_listing,
+    'predict': _phase_predict,
+    'dry-run': _phase_dry_run,
+    'dry-run-all': _phase_dry_run_all,
+    'execute': _phase_execute,
+    'execute-all': _phase_execute_all,
+}
+
+
+def _peak_rss() -> Optional[int]:
+    """
+    本进程和已结束的子进程（git）中最大的内存峰值，单位字节；无法获取时为 None
+
+    Linux / macOS 使用 getrusage；Windows 上安装了 psutil 时只能取得本进程的峰值
+    """
+    if resource is not None:
+        # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return getattr(psutil.Process().memory_info(), 'peak_wset', None)
+
+
+def run_phase(phase: str, ctx: dict, repeat: int) -> dict:
+    """
+    在当前进程中运行一个阶段 repeat 次
+
+    Returns:
+        {'phase', 'wall': [每轮秒数], 'spawns': [每轮启动的 git 进程数], 'detail': 最后一轮的计数,
+         'peak_rss': 见 _peak_rss}
+    """
+    from app.worktree_pool import close_worktree_pool, get_worktree_pool
+
+    # 池目录在系统临时目录下，不随合成仓库删除，阶段结束后一并清理
+    pool_dir = get_worktree_pool(ctx['repo']).pool_dir
+    run, reset = _PHASE_FACTORIES[phase](ctx)
+    walls, spawns, detail = [], [], {}
+    try:
+        for _ in range(repeat):
+            spawn_start = get_spawn_count()
+            start = time.perf_counter()
+            detail = run()
+            walls.append(time.perf_counter() - start)
+            spawns.append(get_spawn_count() - spawn_start)
+            if reset is not None:
+                reset()
+    finally:
+        close_worktree_pool(ctx['repo'])
+        shutil.rmtree(pool_dir, ignore_errors=True)
+    return {'phase': phase, 'wall': walls, 'spawns': spawns, 'detail': detail, 'peak_rss': _peak_rss()}
+
+
+def _run_phase_in_subprocess(phase: str, ctx: dict, repeat: int, workdir: str) -> dict:
+    """
+    在新的 Python 进程中运行一个阶段，各阶段的内存峰值和进程内缓存互不影响
+
+    子进程的工作目录为 workdir，cache.db 等本地缓存写在那里而不是项目目录
+    """
+    command = [sys.executable, '-m', 'benchmarks.cherry_pick_benchmark', '--phase', phase,
+               '--context', json.dumps(ctx), '--repeat', str(repeat)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get('PYTHONPATH')])))
+    completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, encoding='utf-8')
+    if completed.returncode != 0:
+        return {'phase': phase, 'error': (completed.stderr.strip().splitlines() or ['未知错误'])[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# ---------------------------------------------------------------------------
+# 报告
+# ---------------------------------------------------------------------------
+
+def _format_bytes(value: Optional[int]) -> str:
+    return 'n/a' if value is None else f'{value / (1024 * 1024):.1f} MB'
+
+
+def format_report(results: List[dict]) -> str:
+    """把各阶段结果整理成文本表格"""
+    header = ['phase', 'runs', 'wall min', 'wall median', 'git spawns', 'peak RSS', 'detail']
+    rows = []
+    for result in results:
+        if 'error' in result:
+            rows.append([result['phase'], '-', '-', '-', '-', '-', f'失败: {result["error"]}'])
+            continue
+        walls = result['wall']
+        rows.append([
+            result['phase'], str(len(walls)), f'{min(walls):.3f}s', f'{statistics.median(walls):.3f}s',
+            '/'.join(str(n) for n in sorted(set(result['spawns']))),
+            _format_bytes(result['peak_rss']),
+            ' '.join(f'{k}={v}' for k, v in result['detail'].items()),
+        ])
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = ['  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in [header] + rows]
+    lines.insert(1, '  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='在合成仓库上测量 cherry-pick 列表、预检和执行的性能')
+    parser.add_argument('--files', type=int, default=1000, help='文件数（默认 1000）')
+    parser.add_argument('--depth', type=int, default=200, help='main 分支的历史提交数（默认 200）')
+    parser.add_argument('--branches', type=int, default=3, help='目标分支数（默认 3）')
+    parser.add_argument('--commits', type=int, default=20, help='要 cherry-pick 的提交数（默认 20）')
+    parser.add_argument('--target-commits', type=int, default=20, help='每个目标分支自己的提交数（默认 20）')
+    parser.add_argument('--conflict-density', type=float, default=0.1,
+                        help='会与目标分支冲突的提交比例，0 到 1（默认 0.1）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认 0）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复的次数（默认 3）')
+    parser.add_argument('--phases', default=','.join(PHASES), help=f'要运行的阶段，逗号分隔（默认全部: {",".join(PHASES)}）')
+    parser.add_argument('--workdir', help='生成合成仓库的目录（需为空或不存在，结束后保留），默认使用临时目录')
+    parser.add_argument('--keep', action='store_true', help='结束后保留合成仓库')
+    parser.add_argument('--json', dest='json_path', help='把结果另存为 JSON 文件')
+    # 内部使用：在子进程中运行单个阶段
+    parser.add_argument('--phase', choices=PHASES, help=argparse.SUPPRESS)
+    parser.add_argument('--context', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.phase is None:
+        phases = [p.strip() for p in args.phases.split(',') if p.strip()]
+        unknown = [p for p in phases if p not in PHASES]
+        if unknown:
+            parser.error(f'未知的阶段: {", ".join(unknown)}')
+        args.phases = phases
+        if not 0 <= args.conflict_density <= 1:
+            parser.error('--conflict-density 必须在 0 到 1 之间')
+        if args.branches < 1 or args.commits < 1 or args.files < 1 or args.repeat < 1:
+            parser.error('--files、--branches、--commits、--repeat 必须大于 0')
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    if args.phase is not None:
+        print(json.dumps(run_phase(args.phase, json.loads(args.context), args.repeat)))
+        return 0
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='qmr-benchmark-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        start = time.perf_counter()
+        ctx = generate_repo(workdir, args.files, args.depth, args.branches, args.commits, args.target_commits,
+                            args.conflict_density, args.seed)
+        print(f'合成仓库: {ctx["repo"]}（{args.files} 个文件，main {args.depth} 个提交，{args.branches} 个目标分支，'
+              f'{args.commits} 个待 cherry-pick 的提交，其中 {ctx["conflict_files"]} 个会冲突），'
+              f'生成耗时 {time.perf_counter() - start:.2f}s\n')
+
+        results = []
+        for phase in args.phases:
+            results.append(_run_phase_in_subprocess(phase, ctx, args.repeat, workdir))
+        print(format_report(results))
+
+        if args.json_path:
+            with open(args.json_path, 'w', encoding='utf-8') as f:
+                json.dump({'config': {k: v for k, v in vars(args).items() if k not in ('phase', 'context')},
+                           'results': results}, f, ensure_ascii=False, indent=2)
+        return 1 if any('error' in r for r in results) else 0
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,68 +1,133 @@
-import subprocess
+from app.fetch_coordinator import get_fetch_coordinator
+from app.git_refs import HEADS_PREFIX, REMOTES_PREFIX, get_ref_store
+from app.git_runner import run_git
 
-def run_command(command, directory):
-    try:
-        result = subprocess.run(command, cwd=directory, capture_output=True, text=True, check=True, shell=True)
-        return True, result.stdout, result.stderr
-    except subprocess.CalledProcessError as e:
-        return False, e.stdout, e.stderr
 
-def create_branch(directory, target_branch, new_branch):
+def build_branch_name(new_branch, target_branch):
+    """根据新分支名和目标分支生成 <name>__from__<target> 形式的分支名"""
+    return new_branch + '__from__' + target_branch.replace('/', '@')
+
+
+def find_missing_remote_branches(directory, branches):
+    """用 ls-remote 查询哪些分支在 origin 上不存在，查询失败时返回 None"""
+    result = run_git(['ls-remote', '--heads', 'origin', *(HEADS_PREFIX + b for b in branches)], directory)
+    if not result.ok:
+        return None
+    existing = {line.split('\t', 1)[1] for line in result.stdout.splitlines() if '\t' in line}
+    return [b for b in branches if HEADS_PREFIX + b not in existing]
+
+
+def create_branches(directory, target_branches, new_branch, max_age=0, targeted=True):
+    """
+    批量创建分支：只 fetch 一次，然后在一个 git update-ref --stdin 事务中创建所有
+    <new_branch>__from__<target> 分支，要么全部创建成功，要么一个都不创建
+
+    update-ref 不会像 git branch 那样设置 upstream，因此无需再 --unset-upstream。
+
+    Args:
+        directory: 仓库目录
+        target_branches: 目标分支列表（不带 origin/ 前缀）
+        new_branch: 新分支名前缀
+        max_age: 可接受的远程分支数据年龄（秒），默认 0 表示总是 fetch（可共享进行中的 fetch）
+        targeted: 为 True 时只定向 fetch 目标分支，否则全量 fetch origin
+
+    Returns:
+        (results, output)：results 为每个目标分支一项的列表，包含
+        target, branch, sha, success, message；output 为 fetch 和事务的日志文本
+    """
     outputs = []
+    results = []
+    for target_branch in dict.fromkeys(target_branches):
+        results.append({
+            'target': target_branch,
+            'branch': build_branch_name(new_branch, target_branch),
+            'sha': None,
+            'success': False,
+            'message': '',
+        })
+
+    def fail_all(message):
+        for item in results:
+            if not item['message']:
+                item['message'] = message
+        outputs.append(message)
+        return results, '\n'.join(outputs)
 
-    # 1. Fetch
-    outputs.append('Running git fetch...')
-    success, stdout, stderr = run_command(['git', 'fetch', 'origin'], directory)
-    outputs.append(f'STDOUT:\n{stdout}')
-    outputs.append(f'STDERR:\n{stderr}')
-    if not success:
-        outputs.append('Fetch failed!')
-        return '\n'.join(outputs)
+    if not new_branch:
+        return fail_all('新分支名不能为空')
+
+    # 1. Fetch（所有目标分支共用一次）
+    coordinator = get_fetch_coordinator(directory)
+    if targeted:
+        outputs.append(f'Running git fetch for {len(results)} target branch(es)...')
+        fetch_result = coordinator.fetch_branches([item['target'] for item in results], max_age=max_age)
+    else:
+        outputs.append('Running git fetch...')
+        fetch_result = coordinator.fetch(max_age=max_age)
+    if fetch_result.from_cache:
+        outputs.append('Remote branches are fresh, fetch skipped.')
+    else:
+        outputs.append(f'STDOUT:\n{fetch_result.stdout}')
+        outputs.append(f'STDERR:\n{fetch_result.stderr}')
+    if not fetch_result.ok:
+        # 定向 fetch 中只要有一个远程分支不存在整次 fetch 就会失败，查出是哪些分支
+        missing = find_missing_remote_branches(directory, [item['target'] for item in results]) if targeted else None
+        if missing:
+            for item in results:
+                if item['target'] in missing:
+                    item['message'] = f'远程分支 origin/{item["target"]} 不存在'
+            return fail_all('存在无法创建的分支，未创建任何分支')
+        return fail_all('Fetch failed!')
     outputs.append('Fetch successful!')
 
-    # 2. Create branch
-    new_branch_name = new_branch + '__from__' + target_branch.replace('/', '@')
-    outputs.append(f'Creating branch {new_branch_name}...')
-    branch_command = ['git', 'branch', new_branch_name, f'origin/{target_branch}']
-    success, stdout, stderr = run_command(branch_command, directory)
-    outputs.append(f'STDOUT:\n{stdout}')
-    outputs.append(f'STDERR:\n{stderr}')
-    if not success:
-        outputs.append('Branch creation failed!')
-        return '\n'.join(outputs)
+    # 2. 事务前校验：远程分支必须存在，本地分支不能已存在
+    refs = get_ref_store(directory).refs()
+    invalid = False
+    for item in results:
+        sha = refs.get(f'{REMOTES_PREFIX}origin/{item["target"]}')
+        if sha is None:
+            item['message'] = f'远程分支 origin/{item["target"]} 不存在'
+            invalid = True
+        elif HEADS_PREFIX + item['branch'] in refs:
+            item['message'] = f'本地分支 {item["branch"]} 已存在'
+            invalid = True
+        item['sha'] = sha
+    if invalid:
+        return fail_all('存在无法创建的分支，未创建任何分支')
+
+    # 3. 在一个事务中创建全部分支
+    outputs.append(f'Creating branches {", ".join(item["branch"] for item in results)}...')
+    commands = ''.join(f'create {HEADS_PREFIX}{item["branch"]} {item["sha"]}\n' for item in results)
+    result = run_git(
+        ['update-ref', '-m', f'branch: Created by quick create branch ({new_branch})', '--stdin'],
+        directory,
+        input='start\n' + commands + 'prepare\ncommit\n'
+    )
+    outputs.append(f'STDOUT:\n{result.stdout}')
+    outputs.append(f'STDERR:\n{result.stderr}')
+    if not result.ok:
+        return fail_all(f'Branch creation failed! {result.stderr.strip()}')
+
+    for item in results:
+        item['success'] = True
+        item['message'] = f'已从 origin/{item["target"]} ({item["sha"][:8]}) 创建'
     outputs.append('Branch created successfully!')
+    return results, '\n'.join(outputs)
 
-    set_branch_upstream_command = [
-        'git',
-        'branch',
-        '--unset-upstream',
-        new_branch_name
-    ]
-        # 设置upstream
-    set_upstream_branch_result = subprocess.run(set_branch_upstream_command, cwd=directory, capture_output=True, text=True)
-
-    # 输出 branch 命令的结果
-    outputs.append("Branch STDOUT:")
-    outputs.append(set_upstream_branch_result.stdout)
-    outputs.append("Branch STDERR:")
-    outputs.append(set_upstream_branch_result.stderr)
-
-    # 检查 branch 命令是否成功
-    if set_upstream_branch_result.returncode == 0:
-        outputs.append("Branch 设置upstream成功!")
-    else:
-        outputs.append("Branch 设置upstream失败!")
-    
-    return '\n'.join(outputs)
+
+def create_branch(directory, target_branch, new_branch):
+    """为单个目标分支创建分支，返回日志文本，参见 create_branches"""
+    results, output = create_branches(directory, [target_branch], new_branch)
+    return output
 
 def get_remote_branches(directory):
-    success, stdout, stderr = run_command(['git', 'branch', '-r'], directory)
-    if not success:
-        return [], f"Error loading remote branches:\n{stderr}"
-    
-    branches = stdout.strip().split('\n')
-    # Clean up branch names (e.g., "  origin/master" -> "master")
-    remote_branches = [b.strip().replace('origin/', '') for b in branches if 'HEAD' not in b]
+    try:
+        branches = get_ref_store(directory).remote_branches()
+    except Exception as e:
+        return [], f"Error loading remote branches:\n{e}"
+
+    # Clean up branch names (e.g., "origin/master" -> "master")
+    remote_branches = [b.replace('origin/', '', 1) if b.startswith('origin/') else b for b in sorted(branches)]
     return remote_branches, "Remote branches loaded."
 
 if __name__ == '__main__':
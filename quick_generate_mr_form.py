@@ -1,47 +1,44 @@
-import gitlab
 import re
-from urllib.parse import urlparse
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def run_command(command, directory):
-    try:
-        result = subprocess.run(command, cwd=directory, capture_output=True, text=True, check=True, shell=False, encoding='utf-8', errors='replace')
-        return result.stdout, None
-    except subprocess.CalledProcessError as e:
-        return None, e.stderr
-
-def _clean_branch_name(branch):
-    """清理分支名，去除 git branch 输出的前缀标记"""
-    branch = branch.strip()
-    # 去除当前分支标记 (*) 和 worktree 检出分支标记 (+)
-    if branch.startswith('* '):
-        branch = branch[2:]
-    elif branch.startswith('+ '):
-        branch = branch[2:]
-    return branch
+from app.fetch_coordinator import get_fetch_coordinator
+from app.git_log import get_log_records_or_error
+from app.git_refs import get_ref_store
+from app.git_runner import run_git
+from app.gitlab_clients import get_gitlab_client, invalidate_gitlab_client, is_authentication_error
+from app.gitlab_projects import ProjectResolveError, get_project_resolver
+from app.gitlab_user_ids import get_user_id_cache
+from app.gitlab_users import get_user_directory
+
+# 查看提交差异时可接受的远程分支数据年龄（秒）
+COMMITS_FETCH_MAX_AGE = 60
+# 打开界面时可接受的本地用户目录年龄（秒），更旧时在后台同步
+USERS_SYNC_MAX_AGE = 600
+# 批量创建 MR 时默认同时进行的请求数
+MAX_PARALLEL_MRS = 4
 
 def get_local_branches(directory):
-    stdout, stderr = run_command(['git', 'branch'], directory)
-    if stderr:
-        return [], f"Error loading branches:\n{stderr}"
-    branches = stdout.strip().split('\n')
-    valid_branches = [_clean_branch_name(b) for b in branches if '__from__' in b]
+    try:
+        branches = get_ref_store(directory).local_branches()
+    except Exception as e:
+        return [], f"Error loading branches:\n{e}"
+    valid_branches = sorted(b for b in branches if '__from__' in b)
     return valid_branches, "Branches loaded."
 
 def get_all_local_branches(directory):
-    stdout, stderr = run_command(['git', 'branch'], directory)
-    if stderr:
-        return [], f"Error loading branches:\n{stderr}"
-    branches = stdout.strip().split('\n')
-    all_branches = [_clean_branch_name(b) for b in branches if b.strip()]
-    return all_branches, "All branches loaded."
+    try:
+        branches = get_ref_store(directory).local_branches()
+    except Exception as e:
+        return [], f"Error loading branches:\n{e}"
+    return sorted(branches), "All branches loaded."
 
 def get_mr_defaults(project_path, source_branch, title_template, description_template):
     # Get last commit message
-    stdout, stderr = run_command(['git', 'log', source_branch, '-1', '--pretty=%B'], project_path)
-    if stderr:
-        return None, f'Could not get last commit message: {stderr}'
-    last_commit_message = stdout.strip()
+    result = run_git(['log', source_branch, '-1', '--pretty=%B'], project_path)
+    if not result.ok:
+        return None, f'Could not get last commit message: {result.stderr}'
+    last_commit_message = result.stdout.strip()
 
     title = title_template.format(commit_message=last_commit_message)
     match_tg_number = re.search(r'tg-(\d+)', title, re.IGNORECASE)
@@ -62,126 +59,235 @@ def parse_target_branch_from_source(source_branch):
 
 def generate_mr(directory, gitlab_url, token, assignee_user, reviewer_user, source_branch, title, description, target_branch):
     try:
-        gl = gitlab.Gitlab(url=gitlab_url, private_token=token)
-        gl.auth()
+        gl = get_gitlab_client(gitlab_url, token)
     except Exception as e:
         return f'GitLab authentication failed: {e}'
 
     if not source_branch:
         return 'Please select a source branch.'
 
-    
-    # Get project
-    stdout, stderr = run_command(['git', 'remote', '-v'], directory)
-    if stderr:
-        return f'Could not get remote URL: {stderr}'
-    
-    remote_url = re.search(r'https?://[^\s]+', stdout).group(0)
-    project_path = urlparse(remote_url).path.strip('/').replace('.git', '')
-    project = gl.projects.get(project_path)
-
     try:
-        assignee = gl.users.list(username=assignee_user)[0]
-        reviewer = gl.users.list(username=reviewer_user)[0]
-    except IndexError:
-        return "Assignee or Reviewer not found."
-
-    mr_data = {
-        'source_branch': source_branch,
-        'target_branch': target_branch,
-        'title': title,
-        'description': description,
-        'assignee_id': assignee.id,
-        'reviewer_ids': [reviewer.id]
-    }
+        url, error = _create_mr(gl, directory, gitlab_url, token, assignee_user, reviewer_user, source_branch,
+                                title, description, target_branch)
+    except Exception as e:
+        _forget_rejected_client(gitlab_url, token, e)
+        raise
+    return error or f'Successfully created MR!\nURL: {url}'
+
+
+def _forget_rejected_client(gitlab_url, token, error):
+    """GitLab 拒绝了 token（401，如已吊销或轮换）时丢弃缓存的客户端，下次重新认证"""
+    if is_authentication_error(error):
+        invalidate_gitlab_client(gitlab_url, token)
+
+
+def _create_mr(gl, directory, gitlab_url, token, assignee_user, reviewer_user, source_branch, title, description,
+               target_branch):
+    """创建一个 MR，返回 (MR 地址, None) 或 (None, 错误信息)"""
+    projects = get_project_resolver(directory)
+    user_ids = get_user_id_cache()
+    # 先用缓存的项目和用户 id；缓存的 id 已失效时 GitLab 返回 404，清除缓存重新查询后再试一次
+    for use_cache in (True, False):
+        try:
+            project = gl.projects.get(projects.resolve(gl, use_cache), lazy=True)
+        except ProjectResolveError as e:
+            _forget_rejected_client(gitlab_url, token, e)
+            return None, str(e)
+
+        try:
+            assignee_id = _resolve_user_id(gl, gitlab_url, assignee_user, use_cache)
+            reviewer_id = _resolve_user_id(gl, gitlab_url, reviewer_user, use_cache)
+        except IndexError:
+            return None, "Assignee or Reviewer not found."
+
+        mr_data = {
+            'source_branch': source_branch,
+            'target_branch': target_branch,
+            'title': title,
+            'description': description,
+            'assignee_id': assignee_id,
+            'reviewer_ids': [reviewer_id]
+        }
+
+        try:
+            mr = project.mergerequests.create(mr_data)
+            return mr.web_url, None
+        except Exception as e:
+            if not use_cache or getattr(e, 'response_code', None) != 404:
+                _forget_rejected_client(gitlab_url, token, e)
+                return None, f'Failed to create MR: {e}'
+            projects.invalidate()
+            user_ids.invalidate(gitlab_url, assignee_user)
+            user_ids.invalidate(gitlab_url, reviewer_user)
+
+
+def find_bulk_mr_branches(directory, prefix):
+    """本地 __from__ 分支中以 prefix 开头的分支，返回 [(源分支, 解析出的目标分支或 None)]"""
+    branches, _ = get_local_branches(directory)
+    return [(branch, parse_target_branch_from_source(branch)) for branch in branches if branch.startswith(prefix)]
+
 
+def generate_mrs(directory, gitlab_url, token, assignee_user, reviewer_user, source_branches, title_template,
+                 description_template, max_workers=MAX_PARALLEL_MRS, on_result=None):
+    """
+    为多个 __from__ 分支并发创建 MR
+
+    目标分支由分支名解析（parse_target_branch_from_source），标题和描述按各分支最后一个提交渲染模板。
+    项目和用户 id 在开始前解析一次，之后各分支直接使用缓存。
+
+    Args:
+        max_workers: 同时进行的创建请求数上限
+        on_result: 每个分支完成时在工作线程中回调 (result)
+
+    Returns:
+        [{'source_branch', 'target_branch', 'url', 'error'}]，顺序与 source_branches 一致，成功时 error 为 None
+    """
+    def _result(source_branch, target_branch, url=None, error=None):
+        result = {'source_branch': source_branch, 'target_branch': target_branch, 'url': url, 'error': error}
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    source_branches = list(dict.fromkeys(source_branches))
+    error = None
     try:
-        mr = project.mergerequests.create(mr_data)
-        return f'Successfully created MR!\nURL: {mr.web_url}'
+        gl = get_gitlab_client(gitlab_url, token)
     except Exception as e:
-        return f'Failed to create MR: {e}'
+        error = f'GitLab authentication failed: {e}'
+    else:
+        try:
+            get_project_resolver(directory).resolve(gl)
+            _resolve_user_id(gl, gitlab_url, assignee_user)
+            _resolve_user_id(gl, gitlab_url, reviewer_user)
+        except ProjectResolveError as e:
+            _forget_rejected_client(gitlab_url, token, e)
+            error = str(e)
+        except IndexError:
+            error = 'Assignee or Reviewer not found.'
+        except Exception as e:
+            _forget_rejected_client(gitlab_url, token, e)
+            error = f'Failed to look up users: {e}'
+    if error:
+        return [_result(b, parse_target_branch_from_source(b), error=error) for b in source_branches]
+
+    def _create(source_branch):
+        target_branch = parse_target_branch_from_source(source_branch)
+        if not target_branch:
+            return _result(source_branch, None, error='Could not parse target branch from branch name.')
+        # 一个分支出错（模板中有未知字段、网络异常等）只记在该分支上，不影响其他分支
+        try:
+            url = None
+            defaults, error = get_mr_defaults(directory, source_branch, title_template, description_template)
+            if not error:
+                url, error = _create_mr(gl, directory, gitlab_url, token, assignee_user, reviewer_user,
+                                        source_branch, defaults['title'], defaults['description'], target_branch)
+        except Exception as e:
+            _forget_rejected_client(gitlab_url, token, e)
+            url, error = None, f'{type(e).__name__}: {e}'
+        return _result(source_branch, target_branch, url, error)
+
+    if not source_branches:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(source_branches))),
+                            thread_name_prefix='create-mr') as executor:
+        return list(executor.map(_create, source_branches))
+
+
+def _resolve_user_id(gl, gitlab_url, username, use_cache=True):
+    """用户名对应的用户 id，优先使用缓存和本地用户目录；用户不存在时抛出 IndexError"""
+    user_ids = get_user_id_cache()
+    user_id = None
+    if use_cache:
+        user_id = user_ids.get(gitlab_url, username)
+        if user_id is None:
+            user = get_user_directory(gitlab_url).find(username)
+            user_id = user['id'] if user else None
+    if user_id is None:
+        user_id = gl.users.list(username=username)[0].id
+        user_ids.put(gitlab_url, username, user_id)
+    return user_id
+
+def get_gitlab_usernames(gitlab_url, token, max_age=0):
+    """
+    获取 GitLab 用户名列表（本地用户目录，见 app.gitlab_users）
 
-def get_gitlab_usernames(gitlab_url, token):
+    目录距上次同步超过 max_age 秒时先从 GitLab 增量同步；max_age 为 0 时总是同步
+    """
+    directory = get_user_directory(gitlab_url)
+    if max_age and time.time() - directory.synced_at <= max_age:
+        return directory.usernames(), None
     try:
-        gl = gitlab.Gitlab(url=gitlab_url, private_token=token)
-        gl.auth()
+        get_gitlab_client(gitlab_url, token)
     except Exception as e:
         return [], f'GitLab authentication failed: {e}'
     try:
-        users = gl.users.list(all=True)
-        usernames = [u.username for u in users if getattr(u, 'username', None)]
-        return usernames, None
+        directory.sync(token)
+        return directory.usernames(), None
     except Exception as e:
+        _forget_rejected_client(gitlab_url, token, e)
         return [], f'Failed to load users: {e}'
 
 
-def get_branch_diff(directory, feature_branch):
-    """获取feature分支和其对应的source分支之间的差异"""
+def get_cached_gitlab_usernames(gitlab_url):
+    """本地用户目录中的用户名，不访问 GitLab，目录为空时返回空列表"""
+    if not gitlab_url:
+        return []
+    return get_user_directory(gitlab_url).usernames()
+
+
+def fetch_remote_branches(directory, branches, max_age, targeted=True):
+    """更新比较所依赖的远程分支：定向模式只 fetch 给定分支，否则全量 fetch origin"""
+    coordinator = get_fetch_coordinator(directory)
+    if targeted:
+        return coordinator.fetch_branches(branches, max_age=max_age)
+    return coordinator.fetch(max_age=max_age)
+
+
+def get_branch_diff(directory, feature_branch, max_age=None, targeted=True):
+    """
+    获取feature分支和其对应的source分支之间的差异
+
+    max_age 为 None 时不 fetch，直接使用本地的远程跟踪分支；否则先更新 origin/<source>，
+    targeted 为 False 时改为全量 fetch
+    """
     # 检查分支是否包含__from__模式
     if '__from__' not in feature_branch:
         return [], f'分支 {feature_branch} 不包含 __from__ 模式，无法比较差异'
 
-    # 先执行 git fetch 更新远程分支信息
-    # fetch_cmd = ['git', 'fetch', 'origin']
-    # run_command(fetch_cmd, directory)
-
     # 从feature分支名中提取source分支名
     try:
         parts = feature_branch.split('__from__')
         feature_part = parts[0]
         source_part = parts[1].replace('@', '/')  # 将@替换回/
 
-        # 获取feature分支的提交列表
-        feature_cmd = ['git', 'log', '--oneline', f'origin/{source_part}..{feature_branch}']
-        feature_stdout, feature_stderr = run_command(feature_cmd, directory)
-
-        if feature_stderr:
-            return [], f'获取 {feature_branch} 分支差异失败: {feature_stderr}'
-
-        # 解析提交列表
-        commits = []
-        if feature_stdout.strip():
-            for line in feature_stdout.strip().split('\n'):
-                if line.strip():
-                    commit_hash = line.split()[0]
-                    commit_msg = ' '.join(line.split()[1:]) if len(line.split()) > 1 else ''
-                    commits.append({
-                        'hash': commit_hash,
-                        'message': commit_msg,
-                        'branch': feature_branch
-                    })
+        if max_age is not None:
+            fetch_remote_branches(directory, [source_part], max_age, targeted)
+
+        # 单个 git log 进程获取 feature 分支的完整提交信息
+        commits, error = get_log_records_or_error(directory, [f'origin/{source_part}..{feature_branch}'])
+        if error:
+            return [], f'获取 {feature_branch} 分支差异失败: {error}'
+
+        for commit in commits:
+            commit['branch'] = feature_branch
 
         return commits, None
     except Exception as e:
         return [], f'解析分支名失败: {str(e)}'
 
 
-def get_commits_between_branches(directory, source_branch, target_branch):
+def get_commits_between_branches(directory, source_branch, target_branch, max_age=COMMITS_FETCH_MAX_AGE,
+                                 targeted=True):
     """获取源分支相对于目标分支的新提交列表（源分支有但目标分支没有的提交）"""
-    # 先执行 git fetch 更新远程分支信息
-    fetch_cmd = ['git', 'fetch', 'origin']
-    run_command(fetch_cmd, directory)
+    # 先更新 origin/<target>，max_age 秒内更新过则直接使用本地的远程跟踪分支
+    fetch_remote_branches(directory, [target_branch], max_age, targeted)
 
     try:
         # 获取源分支相对于目标分支的新提交
         # 使用 git log target_branch..source_branch 获取source分支有但target分支没有的提交
-        log_cmd = ['git', 'log', '--oneline',  f'origin/{target_branch}..{source_branch}']
-        stdout, stderr = run_command(log_cmd, directory)
-
-        if stderr:
-            return [], f'获取分支间提交失败: {stderr}'
-
-        commits = []
-        if stdout.strip():
-            for line in stdout.strip().split('\n'):
-                if line.strip():
-                    parts = line.split(maxsplit=1)
-                    commit_hash = parts[0] if parts else ''
-                    commit_msg = parts[1] if len(parts) > 1 else ''
-                    commits.append({
-                        'hash': commit_hash,
-                        'message': commit_msg
-                    })
+        commits, error = get_log_records_or_error(directory, [f'origin/{target_branch}..{source_branch}'])
+        if error:
+            return [], f'获取分支间提交失败: {error}'
 
         return commits, None
     except Exception as e: